@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from copy import deepcopy
+import json
+import os.path
+import sys
+from typing import Any, Dict, Generator, List
+
+import pytest
+import yaml
+
+from chaoslib.types import Experiment
+
+ACTIVITY_COUNT = 200
+CONTROL_COUNT = 10
+
+
+def python_activity(name: str, func: str = "echo") -> Dict[str, Any]:
+    activity = {
+        "type": "probe",
+        "name": name,
+        "provider": {
+            "type": "python",
+            "module": "stubs",
+            "func": func
+        }
+    }
+    if func == "echo":
+        activity["provider"]["arguments"] = {
+            "message": "hello ${target} from " + name
+        }
+    return activity
+
+
+def process_activity(name: str) -> Dict[str, Any]:
+    return {
+        "type": "action",
+        "name": name,
+        "provider": {
+            "type": "process",
+            "path": sys.executable,
+            "arguments": ["-c", "print('${target}')"]
+        }
+    }
+
+
+def make_controls(count: int) -> List[Dict[str, Any]]:
+    return [{
+        "name": "control-{}".format(i),
+        "provider": {
+            "type": "python",
+            "module": "stubs"
+        }
+    } for i in range(count)]
+
+
+def make_experiment(activity_count: int) -> Experiment:
+    probes = []
+    for i in range(5):
+        probe = python_activity("steady-probe-{}".format(i))
+        probe["tolerance"] = {
+            "type": "regex",
+            "target": "body",
+            "pattern": "^hello"
+        }
+        probes.append(probe)
+
+    method = [
+        python_activity("activity-{}".format(i))
+        for i in range(activity_count)
+    ]
+
+    return {
+        "title": "benchmarked experiment",
+        "description": "an experiment large enough to be measured",
+        "configuration": {
+            "target": "the benchmark"
+        },
+        "steady-state-hypothesis": {
+            "title": "everything responds",
+            "probes": probes
+        },
+        "method": method,
+        "rollbacks": [
+            python_activity("rollback-{}".format(i), "noop")
+            for i in range(10)
+        ]
+    }
+
+
+@pytest.fixture
+def experiment() -> Experiment:
+    return make_experiment(ACTIVITY_COUNT)
+
+
+@pytest.fixture
+def experiment_with_processes() -> Experiment:
+    experiment = make_experiment(10)
+    experiment["method"].extend(
+        process_activity("process-{}".format(i)) for i in range(10))
+    return experiment
+
+
+@pytest.fixture
+def experiment_with_controls() -> Experiment:
+    experiment = make_experiment(ACTIVITY_COUNT)
+    experiment["controls"] = make_controls(CONTROL_COUNT)
+    return experiment
+
+
+@pytest.fixture
+def large_payload() -> Dict[str, Any]:
+    leaf = {
+        "url": "https://${host}:${port}/api/v1/${path}",
+        "plain": "no placeholder in here",
+        "numbers": list(range(10)),
+        "nested": [{"token": "${token}"}, "static", {"flag": True}]
+    }
+    return {
+        "section-{}".format(i): {
+            "item-{}".format(j): deepcopy(leaf) for j in range(20)
+        } for i in range(50)
+    }
+
+
+@pytest.fixture
+def experiment_files(tmpdir) -> Generator[Dict[str, str], None, None]:
+    experiment = make_experiment(2000)
+    json_path = os.path.join(str(tmpdir), "experiment.json")
+    with open(json_path, "w") as f:
+        json.dump(experiment, f)
+
+    yaml_path = os.path.join(str(tmpdir), "experiment.yaml")
+    with open(yaml_path, "w") as f:
+        yaml.safe_dump(experiment, f, default_flow_style=False)
+
+    yield {"json": json_path, "yaml": yaml_path}
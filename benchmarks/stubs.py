@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Local providers and controls the benchmarks run against so that they only
+measure the time spent in chaoslib.
+"""
+from typing import Any, Dict
+
+from chaoslib.types import Activity, Configuration, Experiment, Run, Secrets
+
+
+def noop() -> bool:
+    return True
+
+
+def echo(message: str, configuration: Configuration = None,
+         secrets: Secrets = None) -> Dict[str, Any]:
+    return {"status": 200, "body": message}
+
+
+def tolerate(value: Any) -> bool:
+    return True
+
+
+def before_activity_control(context: Activity, **kwargs):
+    pass
+
+
+def after_activity_control(context: Activity, state: Run, **kwargs):
+    pass
+
+
+def before_experiment_control(context: Experiment, **kwargs):
+    pass
+
+
+def after_experiment_control(context: Experiment, state: Any, **kwargs):
+    pass
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict
+
+from chaoslib.provider.python import load_python_activity
+from chaoslib.types import Activity
+
+
+def make_activity(arguments: Dict[str, Any]) -> Activity:
+    return {
+        "type": "probe",
+        "name": "echo",
+        "provider": {
+            "type": "python",
+            "module": "stubs",
+            "func": "echo",
+            "arguments": arguments
+        }
+    }
+
+
+def test_load_python_activity(benchmark):
+    activity = make_activity({"message": "hello"})
+    func, arguments = benchmark(load_python_activity, activity, {}, {})
+    assert arguments == {"message": "hello", "configuration": {}}
+
+
+def test_load_python_activity_with_large_arguments(
+        benchmark, large_payload: Dict[str, Any]):
+    activity = make_activity({"message": large_payload})
+    func, arguments = benchmark(load_python_activity, activity, {}, {})
+    assert arguments["message"] == large_payload
+    assert arguments["message"] is not large_payload
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from chaoslib.control import apply_controls, cleanup_controls, \
+    initialize_controls
+from chaoslib.experiment import run_experiment
+from chaoslib.types import Experiment
+
+
+def test_apply_controls(benchmark, experiment_with_controls: Experiment):
+    experiment = experiment_with_controls
+    activity = experiment["method"][0]
+    run = {"activity": activity, "status": "succeeded"}
+    initialize_controls(experiment)
+
+    def apply():
+        apply_controls(
+            level="activity", experiment=experiment, context=activity,
+            scope="before")
+        apply_controls(
+            level="activity", experiment=experiment, context=activity,
+            scope="after", state=run)
+
+    try:
+        benchmark(apply)
+    finally:
+        cleanup_controls(experiment)
+
+
+def test_run_experiment_with_controls(benchmark,
+                                      experiment_with_controls: Experiment):
+    experiment_with_controls["dry"] = True
+    journal = benchmark(run_experiment, experiment_with_controls)
+    assert journal["status"] == "completed"
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from chaoslib.experiment import ensure_experiment_is_valid, run_experiment
+from chaoslib.types import Experiment
+
+
+def test_ensure_experiment_is_valid(benchmark, experiment: Experiment):
+    benchmark(ensure_experiment_is_valid, experiment)
+
+
+def test_run_experiment_in_dry_mode(benchmark, experiment: Experiment):
+    experiment["dry"] = True
+    journal = benchmark(run_experiment, experiment)
+    assert journal["status"] == "completed"
+
+
+def test_run_experiment(benchmark, experiment: Experiment):
+    journal = benchmark(run_experiment, experiment)
+    assert journal["status"] == "completed"
+
+
+def test_run_experiment_with_process_activities(
+        benchmark, experiment_with_processes: Experiment):
+    journal = benchmark.pedantic(
+        run_experiment, args=(experiment_with_processes,), rounds=5)
+    assert journal["status"] == "completed"
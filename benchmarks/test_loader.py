@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import os.path
+from typing import Dict
+
+from chaoslib.loader import load_experiment
+
+
+def test_load_json_experiment(benchmark, experiment_files: Dict[str, str]):
+    experiment = benchmark(load_experiment, experiment_files["json"])
+    assert len(experiment["method"]) == 2000
+
+
+def test_load_yaml_experiment(benchmark, experiment_files: Dict[str, str]):
+    experiment = benchmark(load_experiment, experiment_files["yaml"])
+    assert len(experiment["method"]) == 2000
+
+
+def test_load_cached_yaml_experiment(benchmark, tmpdir,
+                                     experiment_files: Dict[str, str]):
+    settings = {
+        "runtime": {
+            "loader": {
+                "cache_directory": os.path.join(str(tmpdir), "cache")
+            }
+        }
+    }
+    experiment = benchmark(
+        load_experiment, experiment_files["yaml"], settings)
+    assert len(experiment["method"]) == 2000
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict
+
+from chaoslib import substitute
+
+CONFIGURATION = {"host": "example.com", "port": 8443, "path": "health"}
+SECRETS = {"api": {"token": "XYZ"}, "other": {"password": "ABC"}}
+
+
+def test_substitute_large_payload(benchmark, large_payload: Dict[str, Any]):
+    result = benchmark(substitute, large_payload, CONFIGURATION, SECRETS)
+    assert result["section-0"]["item-0"]["nested"][0]["token"] == "XYZ"
+
+
+def test_substitute_string(benchmark):
+    result = benchmark(
+        substitute, "https://${host}:${port}/", CONFIGURATION, SECRETS)
+    assert result == "https://example.com:8443/"
+
+
+def test_substitute_string_without_placeholder(benchmark):
+    benchmark(substitute, "nothing to replace", CONFIGURATION, SECRETS)
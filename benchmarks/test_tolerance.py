@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from chaoslib.hypothesis import ensure_hypothesis_tolerance_is_valid, \
+    within_tolerance
+
+VALUE = {
+    "status": 200,
+    "body": '{"items": [{"name": "a", "count": 1}, {"name": "b"}]}'
+}
+TOLERANCES = {
+    "bool": (True, True),
+    "int": (200, VALUE),
+    "list": ([200, 201], VALUE),
+    "regex": ({
+        "type": "regex",
+        "target": "body",
+        "pattern": "\"name\": \"[a-z]\""
+    }, VALUE),
+    "jsonpath": ({
+        "type": "jsonpath",
+        "target": "body",
+        "path": "$.items[*].name",
+        "expect": ["a", "b"]
+    }, VALUE),
+    "range": ({
+        "type": "range",
+        "target": "status",
+        "range": [200, 299]
+    }, VALUE),
+    "probe": ({
+        "type": "probe",
+        "name": "compare-status",
+        "provider": {
+            "type": "python",
+            "module": "stubs",
+            "func": "tolerate",
+            "arguments": {}
+        }
+    }, VALUE)
+}
+
+
+@pytest.mark.parametrize("name", sorted(TOLERANCES))
+def test_within_tolerance(benchmark, name: str):
+    tolerance, value = TOLERANCES[name]
+    if isinstance(tolerance, dict) and tolerance["type"] != "probe":
+        ensure_hypothesis_tolerance_is_valid(tolerance)
+    assert benchmark(within_tolerance, tolerance, value) is True
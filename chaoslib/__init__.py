@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from collections import ChainMap
+from functools import lru_cache
 from string import Template
 from typing import Any, Dict, List, Mapping, Union
 
@@ -13,11 +14,15 @@ except ImportError:
         HAS_CHARDET = False
 from logzero import logger
 
-from chaoslib.exceptions import ActivityFailed
 from chaoslib.types import Configuration, Secrets
 
 __all__ = ["__version__", "decode_bytes", "substitute"]
 __version__ = '1.6.0'
+DETECTION_SAMPLE_SIZE = 64 * 1024
+
+# encodings detected per source of bytes, tools tend to always print their
+# output with the same encoding
+_detected_encodings = {}  # type: Dict[str, str]
 
 
 def substitute(data: Union[None, str, Dict[str, Any], List],
@@ -56,14 +61,26 @@ def substitute(data: Union[None, str, Dict[str, Any], List],
 
 
 def substitute_string(data: str, mapping: Mapping[str, Any]) -> str:
-    return Template(data).safe_substitute(mapping)
+    # most strings of a payload have no placeholder at all
+    if "$" not in data:
+        return data
+    return get_template(data).safe_substitute(mapping)
+
+
+@lru_cache(maxsize=1024)
+def get_template(data: str) -> Template:
+    """
+    Template of the given string. Templates are cached so that the same
+    strings, such as the arguments of an activity run many times, are not
+    parsed again.
+    """
+    return Template(data)
 
 
 def substitute_dict(data: Dict[str, Any],
                     mapping: Mapping[str, Any]) -> Dict[str, Any]:
-    if not data:
-        return data
-
+    # new containers are always built, empty ones included, so the result
+    # can be altered without altering the substituted data
     args = {}
     for key, value in data.items():
         if isinstance(value, str):
@@ -79,9 +96,6 @@ def substitute_dict(data: Dict[str, Any],
 
 def substitute_in_sequence(data: List[Any],
                            mapping: Mapping[str, Any]) -> List[Any]:
-    if not data:
-        return data
-
     new_value = []
     for v in data:
         if isinstance(v, str):
@@ -95,27 +109,83 @@ def substitute_in_sequence(data: List[Any],
     return new_value
 
 
-def decode_bytes(data: bytes, default_encoding: str = 'utf-8') -> str:
+def copy_containers(data: Any) -> Any:
+    """
+    Copy the dicts and lists of the given data all the way down. Strings,
+    numbers and any other value are shared with the copy so a flat mapping
+    costs a single shallow copy.
     """
-    Decode the given bytes and return the decoded unicode string or raises
-    `ActivityFailed`.
+    if isinstance(data, dict):
+        copied = dict(data)
+        for key, value in data.items():
+            if isinstance(value, (dict, list)):
+                copied[key] = copy_containers(value)
+        return copied
+    if isinstance(data, list):
+        return [
+            copy_containers(v) if isinstance(v, (dict, list)) else v
+            for v in data]
+    return data
+
 
-    When the chardet, or cchardet, packages are installed, we try to detect
-    the encoding and use that instead of the default one (when the confidence
-    is greater or equal than 50%).
+def decode_bytes(data: bytes, default_encoding: str = 'utf-8',
+                 source: str = None) -> str:
     """
-    encoding = default_encoding
-    if HAS_CHARDET:
-        detected = chardet.detect(data) or {}
-        confidence = detected.get('confidence') or 0
-        if confidence >= 0.5:
-            encoding = detected['encoding']
-            logger.debug(
-                "Data encoding detected as '{}' "
-                "with a confidence of {}".format(encoding, confidence))
+    Decode the given bytes and return the decoded unicode string.
+
+    The bytes are decoded with the default encoding first. Only when that
+    fails, and the chardet, or cchardet, packages are installed, we try to
+    detect the encoding and use that instead (when the confidence is greater
+    or equal than 50%). Detection only runs over a bounded sample of the
+    bytes. When the detected encoding does not fit all of them either, they
+    are decoded with it, or the default one, replacing the invalid bytes.
+
+    When given a `source`, such as the path of the executable which printed
+    the bytes, the encoding detected for it is remembered and tried before
+    detecting it again for the next bytes of the same source.
+    """
+    try:
+        return data.decode(default_encoding)
+    except UnicodeDecodeError:
+        pass
 
+    encoding = _detected_encodings.get(source) if source else None
+    if encoding:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            _detected_encodings.pop(source, None)
+
+    encoding = detect_encoding(
+        data[:DETECTION_SAMPLE_SIZE]) or default_encoding
     try:
-        return data.decode(encoding)
+        decoded = data.decode(encoding)
     except UnicodeDecodeError:
-        raise ActivityFailed(
-            "Failed to decode bytes using encoding '{}'".format(encoding))
+        logger.debug(
+            "Bytes do not fit encoding '{}', replacing the invalid "
+            "ones".format(encoding))
+        return data.decode(encoding, errors="replace")
+
+    if source and encoding != default_encoding:
+        _detected_encodings[source] = encoding
+    return decoded
+
+
+def detect_encoding(data: bytes) -> Union[str, None]:
+    """
+    Detect the encoding of the given bytes, when the chardet, or cchardet,
+    packages are installed and they are confident enough about it.
+    """
+    if not HAS_CHARDET:
+        return None
+
+    detected = chardet.detect(data) or {}
+    confidence = detected.get('confidence') or 0
+    if confidence < 0.5:
+        return None
+
+    encoding = detected['encoding']
+    logger.debug(
+        "Data encoding detected as '{}' "
+        "with a confidence of {}".format(encoding, confidence))
+    return encoding
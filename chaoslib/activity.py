@@ -1,26 +1,31 @@
 # -*- coding: utf-8 -*-
+import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import numbers
 import time
 import traceback
-from typing import Any, Iterator, List
+from typing import Any, Iterator, List, Union
 
 from logzero import logger
 
 from chaoslib.caching import lookup_activity
-from chaoslib.control import controls
-from chaoslib.exceptions import ActivityFailed, InvalidActivity
-from chaoslib.provider.http import run_http_activity, validate_http_activity
+from chaoslib.control import controls, controls_async
+from chaoslib.deadline import activity_deadline
+from chaoslib.exceptions import ActivityFailed, ActivityTimeout, \
+    InvalidActivity
+from chaoslib.journal import journal_position, record_run
+from chaoslib.provider.http import run_http_activity, \
+    run_http_activity_async, validate_http_activity
 from chaoslib.provider.python import run_python_activity, \
-    validate_python_activity
+    run_python_activity_async, validate_python_activity
 from chaoslib.provider.process import run_process_activity, \
-    validate_process_activity
+    run_process_activity_async, validate_process_activity
 from chaoslib.types import Activity, Configuration, Experiment, Run, Secrets
 
 
 __all__ = ["ensure_activity_is_valid", "get_all_activities_in_experiment",
-           "run_activities"]
+           "run_activities", "run_activities_async"]
 
 
 def ensure_activity_is_valid(activity: Activity):
@@ -78,6 +83,12 @@ def ensure_activity_is_valid(activity: Activity):
         if not isinstance(timeout, numbers.Number):
             raise InvalidActivity("activity timeout must be a number")
 
+    max_output_size = activity.get("max_output_size")
+    if max_output_size is not None:
+        if not isinstance(max_output_size, int) or max_output_size < 1:
+            raise InvalidActivity(
+                "activity max_output_size must be a positive integer")
+
     pauses = activity.get("pauses")
     if pauses is not None:
         before = pauses.get("before")
@@ -109,16 +120,47 @@ def run_activities(experiment: Experiment, configuration: Configuration,
     """
     method = experiment.get("method")
 
-    for activity in method:
-        if activity.get("background"):
-            logger.debug("activity will run in the background")
-            yield pool.submit(
-                execute_activity, experiment=experiment, activity=activity,
-                configuration=configuration, secrets=secrets, dry=dry)
-        else:
-            yield execute_activity(
-                experiment=experiment, activity=activity,
-                configuration=configuration, secrets=secrets, dry=dry)
+    for index, activity in enumerate(method):
+        with journal_position("run", index):
+            if activity.get("background"):
+                logger.debug("activity will run in the background")
+                run = pool.submit(
+                    execute_activity, experiment=experiment,
+                    activity=activity, configuration=configuration,
+                    secrets=secrets, dry=dry)
+            else:
+                run = execute_activity(
+                    experiment=experiment, activity=activity,
+                    configuration=configuration, secrets=secrets, dry=dry)
+        yield run
+
+
+async def run_activities_async(experiment: Experiment,
+                               configuration: Configuration,
+                               secrets: Secrets,
+                               dry: bool = False) \
+                               -> List[Union[Run, asyncio.Future]]:
+    """
+    Execute all activities from within an event loop and return, in their
+    declaration order, either the result of the run or a
+    :class:`asyncio.Future` if the activity was set to run in the
+    `background`.
+    """
+    method = experiment.get("method")
+
+    runs = []
+    for index, activity in enumerate(method):
+        with journal_position("run", index):
+            if activity.get("background"):
+                logger.debug("activity will run in the background")
+                runs.append(asyncio.ensure_future(execute_activity_async(
+                    experiment=experiment, activity=activity,
+                    configuration=configuration, secrets=secrets, dry=dry)))
+            else:
+                runs.append(await execute_activity_async(
+                    experiment=experiment, activity=activity,
+                    configuration=configuration, secrets=secrets, dry=dry))
+    return runs
 
 
 ###############################################################################
@@ -131,13 +173,15 @@ def execute_activity(experiment: Experiment, activity: Activity,
     Low-level wrapper around the actual activity provider call to collect
     some meta data (like duration, start/end time, exceptions...) during
     the run.
+
+    When the activity declares a `timeout`, in seconds, it fails once that
+    deadline is over and its run is flagged as `"timed_out"`. Processes,
+    including the worker processes of Python activities, are killed and
+    HTTP calls are aborted. Python functions run in threads cannot be
+    interrupted, they fail when they return past the deadline, see
+    :func:`chaoslib.deadline.check_deadline`.
     """
-    ref = activity.get("ref")
-    if ref:
-        activity = lookup_activity(ref)
-        if not activity:
-            raise ActivityFailed(
-                "could not find referenced activity '{r}'".format(r=ref))
+    activity = resolve_activity(activity)
 
     with controls(level="activity", experiment=experiment, context=activity,
                   configuration=configuration, secrets=secrets) as control:
@@ -150,44 +194,22 @@ def execute_activity(experiment: Experiment, activity: Activity,
             if not dry:
                 time.sleep(pause_before)
 
-        if activity.get("background"):
-            logger.info("{t}: {n} [in background]".format(
-                t=activity["type"].title(), n=activity.get("name")))
-        else:
-            logger.info("{t}: {n}".format(
-                t=activity["type"].title(), n=activity.get("name")))
-
+        run = initialize_run(activity)
         start = datetime.utcnow()
 
-        run = {
-            "activity": activity.copy(),
-            "output": None
-        }
-
         result = None
         interrupted = False
         try:
             # only run the activity itself when not in dry-mode
             if not dry:
-                result = run_activity(activity, configuration, secrets)
-            run["output"] = result
-            run["status"] = "succeeded"
-            if result is not None:
-                logger.debug("  => succeeded with '{r}'".format(r=result))
-            else:
-                logger.debug("  => succeeded without any result value")
+                with activity_deadline(activity.get("timeout")):
+                    result = run_activity(activity, configuration, secrets)
+            complete_run(run, result)
         except ActivityFailed as x:
-            error_msg = str(x)
-            run["status"] = "failed"
-            run["output"] = result
-            run["exception"] = traceback.format_exception(type(x), x, None)
-            logger.error("  => failed: {x}".format(x=error_msg))
+            fail_run(run, result, x)
         finally:
             # capture the end time before we pause
-            end = datetime.utcnow()
-            run["start"] = start.isoformat()
-            run["end"] = end.isoformat()
-            run["duration"] = (end - start).total_seconds()
+            finalize_run(run, start)
 
             pause_after = pauses.get("after")
             if pause_after and not interrupted:
@@ -199,7 +221,62 @@ def execute_activity(experiment: Experiment, activity: Activity,
 
         control.with_state(run)
 
-    return run
+    return record_run(run)
+
+
+async def execute_activity_async(experiment: Experiment, activity: Activity,
+                                 configuration: Configuration,
+                                 secrets: Secrets, dry: bool = False) -> Run:
+    """
+    Counterpart of :func:`execute_activity` to be awaited from within an
+    event loop. The returned run has the exact same shape.
+
+    An activity going over its `timeout` is cancelled when it can be, the
+    same way as with :func:`execute_activity`, coroutine functions of Python
+    activities included.
+    """
+    activity = resolve_activity(activity)
+
+    async with controls_async(
+            level="activity", experiment=experiment, context=activity,
+            configuration=configuration, secrets=secrets) as control:
+        pauses = activity.get("pauses", {})
+        pause_before = pauses.get("before")
+        if pause_before:
+            logger.info("Pausing before next activity for {d}s...".format(
+                d=pause_before))
+            # only pause when not in dry-mode
+            if not dry:
+                await asyncio.sleep(pause_before)
+
+        run = initialize_run(activity)
+        start = datetime.utcnow()
+
+        result = None
+        try:
+            # only run the activity itself when not in dry-mode
+            if not dry:
+                with activity_deadline(activity.get("timeout")):
+                    result = await run_activity_async(
+                        activity, configuration, secrets)
+            complete_run(run, result)
+        except ActivityFailed as x:
+            fail_run(run, result, x)
+        finally:
+            # capture the end time before we pause
+            finalize_run(run, start)
+
+            pause_after = pauses.get("after")
+            if pause_after:
+                logger.info("Pausing after activity for {d}s...".format(
+                    d=pause_after))
+                # only pause when not in dry-mode
+                if not dry:
+                    await asyncio.sleep(pause_after)
+
+        control.with_state(run)
+
+    return record_run(run)
 
 
 def run_activity(activity: Activity, configuration: Configuration,
@@ -233,6 +310,88 @@ def run_activity(activity: Activity, configuration: Configuration,
     return result
 
 
+async def run_activity_async(activity: Activity,
+                             configuration: Configuration,
+                             secrets: Secrets) -> Any:
+    """
+    Run the given activity from within an event loop and return its result.
+
+    See :func:`run_activity` for the same warnings.
+    """
+    try:
+        provider = activity["provider"]
+        activity_type = provider["type"]
+        if activity_type == "python":
+            result = await run_python_activity_async(
+                activity, configuration, secrets)
+        elif activity_type == "process":
+            result = await run_process_activity_async(
+                activity, configuration, secrets)
+        elif activity_type == "http":
+            result = await run_http_activity_async(
+                activity, configuration, secrets)
+    except Exception:
+        # just make sure we have a full traceback
+        logger.debug("Activity failed", exc_info=True)
+        raise
+
+    return result
+
+
+def resolve_activity(activity: Activity) -> Activity:
+    """
+    Return the activity referenced by `activity` when it is a reference,
+    or the activity itself otherwise.
+    """
+    ref = activity.get("ref")
+    if ref:
+        activity = lookup_activity(ref)
+        if not activity:
+            raise ActivityFailed(
+                "could not find referenced activity '{r}'".format(r=ref))
+    return activity
+
+
+def initialize_run(activity: Activity) -> Run:
+    if activity.get("background"):
+        logger.info("{t}: {n} [in background]".format(
+            t=activity["type"].title(), n=activity.get("name")))
+    else:
+        logger.info("{t}: {n}".format(
+            t=activity["type"].title(), n=activity.get("name")))
+
+    return {
+        "activity": activity.copy(),
+        "output": None
+    }
+
+
+def complete_run(run: Run, result: Any):
+    run["output"] = result
+    run["status"] = "succeeded"
+    if result is not None:
+        logger.debug("  => succeeded with '{r}'".format(r=result))
+    else:
+        logger.debug("  => succeeded without any result value")
+
+
+def fail_run(run: Run, result: Any, x: ActivityFailed):
+    error_msg = str(x)
+    run["status"] = "failed"
+    run["output"] = result
+    run["exception"] = traceback.format_exception(type(x), x, None)
+    if isinstance(x, ActivityTimeout):
+        run["timed_out"] = True
+    logger.error("  => failed: {x}".format(x=error_msg))
+
+
+def finalize_run(run: Run, start: datetime):
+    end = datetime.utcnow()
+    run["start"] = start.isoformat()
+    run["end"] = end.isoformat()
+    run["duration"] = (end - start).total_seconds()
+
+
 def get_all_activities_in_experiment(experiment: Experiment) -> List[Activity]:
     """
     Handy function to return all activities from a given experiment. Useful
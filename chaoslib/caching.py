@@ -1,38 +1,125 @@
 # -*- coding: utf-8 -*-
-# Builds an in-memory cache of all declared activities so they can be
-# referenced from other places in the experiment
+# Builds an index of all declared activities so they can be referenced from
+# other places in the experiment
+from contextlib import contextmanager
 from functools import wraps
 import inspect
-from typing import List, Union
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Tuple, Union
 
+import contextvars
 from logzero import logger
 
-from chaoslib.types import Activity, Experiment, Settings
+from chaoslib.types import Activity, Experiment
 
 
-__all__ = ["cache_activities", "clear_cache", "lookup_activity", "with_cache"]
+__all__ = ["ActivityIndex", "cache_activities", "clear_cache",
+           "get_activity_index", "lookup_activity", "with_cache"]
+SECTIONS = ("rollbacks", "method", "steady-state-hypothesis")
 
+# the index is bound to the context of the run so that experiments run
+# concurrently, in threads or asyncio tasks, each see their own, while
+# background activities of a run see the index of that run
+current_index = contextvars.ContextVar('activity_index', default=None)
 
-# global objects are frown upon but as we write to it once
-# (from a single place) and we only read afterwards, that's likely okay.
-_cache = {}
 
+class ActivityIndex:
+    """
+    Read-only index of the activities declared in an experiment, by name,
+    along with where each of them is referenced from.
 
-def cache_activities(experiment: Experiment) -> List[Activity]:
+    Activities of the rollbacks, the method and the steady state hypothesis
+    are indexed in that order so that, when names clash, probes of the
+    hypothesis win over activities of the method which win over rollbacks.
+    """
+    def __init__(self, experiment: Experiment):
+        self.experiment = experiment
+
+        activities = {}
+        references = {}
+        for (section, position, activity) in iter_activities(experiment):
+            name = activity.get("name")
+            if name:
+                activities[name] = activity
+
+            ref = activity.get("ref")
+            if ref:
+                references.setdefault(ref, []).append((section, position))
+
+        self.activities = MappingProxyType(
+            activities)  # type: Mapping[str, Activity]
+        self.references = MappingProxyType({
+            ref: tuple(r) for (ref, r) in references.items()
+        })  # type: Mapping[str, Tuple[Tuple[str, int], ...]]
+        # compiled tolerances of the experiment's probes, keyed by the
+        # identifier of the tolerance they were compiled from, which they
+        # hold so that it cannot be reused by another object, see
+        # chaoslib.hypothesis.get_compiled_tolerance
+        self.tolerances = {}  # type: Dict[int, Any]
+
+    def __len__(self) -> int:
+        return len(self.activities)
+
+    def get(self, name: str) -> Union[Activity, None]:
+        return self.activities.get(name)
+
+    def referenced_by(self, name: str) -> Tuple[Tuple[str, int], ...]:
+        """
+        Sections and positions of the references to the activity `name`.
+        """
+        return self.references.get(name, ())
+
+    def is_index_of(self, experiment: Experiment) -> bool:
+        return experiment is self.experiment
+
+
+def iter_activities(experiment: Experiment):
+    for section in SECTIONS:
+        if section == "steady-state-hypothesis":
+            activities = (experiment.get(section) or {}).get("probes", [])
+        else:
+            activities = experiment.get(section, [])
+
+        for (position, activity) in enumerate(activities or []):
+            if activity:
+                yield (section, position, activity)
+
+
+def get_activity_index() -> Union[ActivityIndex, None]:
     """
-    Cache all activities into a map so we can quickly lookup ref.
+    Index of the activities of the experiment being validated or run in the
+    current context, if any.
     """
-    logger.debug("Building activity cache...")
+    return current_index.get()
 
-    lot = experiment.get("method", []) + \
-        experiment.get("steady-state-hypothesis", {}).get("probes", [])
 
-    for activity in lot:
-        name = activity.get("name")
-        if name:
-            _cache[name] = activity
+@contextmanager
+def activity_index(experiment: Experiment, index: ActivityIndex = None):
+    """
+    Bind the index of the activities of `experiment` to the current context,
+    building it unless `index` is already the index of that experiment.
+    """
+    if index is None or not index.is_index_of(experiment):
+        logger.debug("Building activity index...")
+        index = ActivityIndex(experiment)
+        logger.debug("Indexed {d} activities".format(d=len(index)))
 
-    logger.debug("Cached {d} activities".format(d=len(_cache)))
+    token = current_index.set(index)
+    try:
+        yield index
+    finally:
+        current_index.reset(token)
+
+
+def cache_activities(experiment: Experiment) -> List[Activity]:
+    """
+    Index all activities of the experiment in the current context so we can
+    quickly lookup ref.
+    """
+    index = ActivityIndex(experiment)
+    current_index.set(index)
+    logger.debug("Cached {d} activities".format(d=len(index)))
+    return list(index.activities.values())
 
 
 def clear_cache():
@@ -40,29 +127,48 @@ def clear_cache():
     Clear the cache
     """
     logger.debug("Clearing activities cache")
-    _cache.clear()
+    current_index.set(None)
 
 
 def with_cache(f):
     """
-    Ensure the activities cache is populated before calling the wrapped
-    function.
+    Ensure the activities index is bound to the context before calling the
+    wrapped function. Coroutine functions are supported too, in which case
+    the index is bound until the coroutine completes. Arguments are passed
+    through as-is, positionally or by keyword, except `settings` which is
+    dropped for functions that do not declare it.
+
+    When given an `experiment_context` argument holding the index of the
+    same experiment, that index is reused rather than built again.
     """
+    sig = inspect.signature(f)
+
+    def bind_arguments(experiment: Experiment, args: Tuple[Any, ...],
+                       kwargs: Dict[str, Any]) -> inspect.BoundArguments:
+        if "settings" not in sig.parameters:
+            # settings are accepted but not passed through to functions
+            # which do not declare them
+            args = args[1:]
+            kwargs.pop("settings", None)
+        return sig.bind(experiment, *args, **kwargs)
+
+    def get_index(arguments: inspect.BoundArguments) -> Any:
+        experiment_context = arguments.arguments.get("experiment_context")
+        return getattr(experiment_context, "activities", None)
+
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def wrapped_async(experiment: Experiment, *args, **kwargs):
+            arguments = bind_arguments(experiment, args, kwargs)
+            with activity_index(experiment or {}, get_index(arguments)):
+                return await f(*arguments.args, **arguments.kwargs)
+        return wrapped_async
+
     @wraps(f)
-    def wrapped(experiment: Experiment, settings: Settings = None):
-        try:
-            if experiment:
-                cache_activities(experiment)
-
-            sig = inspect.signature(f)
-            arguments = {
-                "experiment": experiment
-            }
-            if "settings" in sig.parameters:
-                arguments["settings"] = settings
-            return f(**arguments)
-        finally:
-            clear_cache()
+    def wrapped(experiment: Experiment, *args, **kwargs):
+        arguments = bind_arguments(experiment, args, kwargs)
+        with activity_index(experiment or {}, get_index(arguments)):
+            return f(*arguments.args, **arguments.kwargs)
     return wrapped
 
 
@@ -70,7 +176,8 @@ def lookup_activity(ref: str) -> Union[Activity, None]:
     """
     Lookup an activity by name and return it or `None`.
     """
-    activity = _cache.get(ref)
+    index = current_index.get()
+    activity = index.get(ref) if index else None
     if not activity:
         logger.debug("cache miss for '{r}'".format(r=ref))
     return activity
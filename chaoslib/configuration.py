@@ -1,13 +1,18 @@
 # -*- coding: utf-8 -*-
 import os
-from typing import Dict
+from typing import Any, Callable, Dict, Optional
 
 from logzero import logger
 
 from chaoslib.exceptions import InvalidExperiment
 from chaoslib.types import Configuration
 
-__all__ = ["load_configuration"]
+__all__ = ["load_configuration", "register_configuration_backend"]
+CONFIGURATION_BACKENDS_GROUP = "chaostoolkit.configuration_backends"
+
+ConfigurationLoader = Callable[[Dict[str, Any]], Any]
+_configuration_backends = {}  # type: Dict[str, ConfigurationLoader]
+_entry_points_discovered = False
 
 
 def load_configuration(config_info: Dict[str, str]) -> Configuration:
@@ -32,21 +37,95 @@ def load_configuration(config_info: Dict[str, str]) -> Configuration:
     The `cert` configuration key is set to its string value whereas the `token`
     configuration key is dynamically fetched from the `MY_TOKEN` environment
     variable.
+
+    Other types of values can be supported by registering their backend with
+    :func:`register_configuration_backend` or through the
+    `chaostoolkit.configuration_backends` entry point group.
     """
     logger.debug("Loading configuration...")
-    env = os.environ
     conf = {}
 
     for (key, value) in config_info.items():
         if isinstance(value, dict) and "type" in value:
-            if value["type"] == "env":
-                env_key = value["key"]
-                if env_key not in env:
-                    raise InvalidExperiment(
-                        "Configuration makes reference to an environment key"
-                        " that does not exist: {}".format(env_key))
-                conf[key] = env.get(env_key)
+            loader = get_configuration_backend(value["type"])
+            if loader is None:
+                logger.debug(
+                    "No backend for the '{t}' type of configuration "
+                    "'{k}'".format(t=value["type"], k=key))
+                continue
+            conf[key] = loader(value)
         else:
             conf[key] = value
 
     return conf
+
+
+def register_configuration_backend(name: str, loader: ConfigurationLoader):
+    """
+    Register the loader of the configuration values declared with
+    `"type": name`. The loader is called with the declaration of the value
+    and returns the value.
+    """
+    _configuration_backends[name] = loader
+
+
+def get_configuration_backend(name: str) -> Optional[ConfigurationLoader]:
+    """
+    Return the loader registered for that type of configuration or `None`.
+    Backends declared as entry points are discovered the first time an
+    unknown type is met.
+    """
+    loader = _configuration_backends.get(name)
+    if loader is None and not _entry_points_discovered:
+        discover_configuration_backends()
+        loader = _configuration_backends.get(name)
+    return loader
+
+
+def load_configuration_from_env(value: Dict[str, Any]) -> Any:
+    env_key = value["key"]
+    if env_key not in os.environ:
+        raise InvalidExperiment(
+            "Configuration makes reference to an environment key"
+            " that does not exist: {}".format(env_key))
+    return os.environ.get(env_key)
+
+
+###############################################################################
+# Internals
+###############################################################################
+def discover_configuration_backends():
+    """
+    Register the backends declared in the
+    `chaostoolkit.configuration_backends` entry point group. Their module is
+    only imported once they are used.
+    """
+    global _entry_points_discovered
+    _entry_points_discovered = True
+
+    try:
+        # only needed, and so imported, once backends are looked up
+        import pkg_resources
+    except ImportError:
+        logger.debug(
+            "setuptools is not installed, {k} backends cannot be "
+            "discovered".format(k="configuration"))
+        return
+
+    group = CONFIGURATION_BACKENDS_GROUP
+    for entry_point in pkg_resources.iter_entry_points(group):
+        if entry_point.name in _configuration_backends:
+            continue
+        logger.debug("Found '{n}' configuration backend from '{e}'".format(
+            n=entry_point.name, e=entry_point.module_name))
+        register_configuration_backend(
+            entry_point.name, make_entry_point_loader(entry_point))
+
+
+def make_entry_point_loader(entry_point) -> ConfigurationLoader:
+    def load(value: Dict[str, Any]) -> Any:
+        return entry_point.load()(value)
+    return load
+
+
+register_configuration_backend("env", load_configuration_from_env)
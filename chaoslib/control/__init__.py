@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 from contextlib import contextmanager
-from copy import copy, deepcopy
-from typing import List, Union
+from copy import copy
+from typing import Any, Dict, List, Tuple, Union
 
+import contextvars
 from logzero import logger
 
-from chaoslib.control.python import apply_python_control, cleanup_control, \
-    initialize_control, validate_python_control, import_control
+from chaoslib.control.python import ControlHook, call_control_hook, \
+    call_control_hook_async, cleanup_control, initialize_control, \
+    load_control_hook, validate_python_control, import_control
 from chaoslib.exceptions import InterruptExecution, InvalidControl
 from chaoslib.settings import get_loaded_settings
 from chaoslib.types import Settings
@@ -14,14 +16,18 @@ from chaoslib.types import Activity, Configuration, Control as ControlType, \
     Experiment, Hypothesis, Journal, Run, Secrets
 
 
-__all__ = ["controls", "initialize_controls", "cleanup_controls",
-           "validate_controls", "Control", "initialize_global_controls",
-           "cleanup_global_controls", "load_global_controls"]
+__all__ = ["controls", "controls_async", "initialize_controls",
+           "cleanup_controls", "validate_controls", "Control",
+           "initialize_global_controls", "cleanup_global_controls",
+           "load_global_controls"]
 
-# Should this be protected in some fashion? chaoslib isn't meant to be used
-# concurrently so there is little promise we can support several instances
-# at once. When the day comes...
-global_controls = []
+# both are context variables so that experiments run concurrently, in
+# threads or asyncio tasks started from their own context, do not see each
+# other's global controls and dispatch plans
+global_controls = contextvars.ContextVar('global_controls', default=())
+# dispatch plans of the experiments whose controls have been initialized,
+# keyed by the identifier of the experiment
+_plans = contextvars.ContextVar('control_plans', default=None)
 
 
 def initialize_controls(experiment: Experiment,
@@ -58,6 +64,10 @@ def initialize_controls(experiment: Experiment,
                         control['name']),
                     exc_info=True)
 
+    plans = dict(_plans.get() or {})
+    plans[id(experiment)] = ControlPlan(experiment)
+    _plans.set(plans)
+
 
 def cleanup_controls(experiment: Experiment):
     """
@@ -70,6 +80,11 @@ def cleanup_controls(experiment: Experiment):
     times in the experiment with the same name.
     """
     logger.debug("Cleaning up controls")
+    plans = _plans.get()
+    if plans and id(experiment) in plans:
+        plans = dict(plans)
+        plans.pop(id(experiment))
+        _plans.set(plans)
     controls = get_controls(experiment)
 
     seen = []
@@ -201,7 +216,7 @@ def get_global_controls() -> List[ControlType]:
     """
     All the controls loaded from the settings.
     """
-    return global_controls[:]
+    return list(global_controls.get())
 
 
 class Control:
@@ -226,6 +241,26 @@ class Control:
             secrets=secrets)
         self.state = None
 
+    async def begin_async(self, level: str, experiment: Experiment,
+                          context: Union[Activity, Hypothesis, Experiment],
+                          configuration: Configuration = None,
+                          secrets: Secrets = None):
+        self.state = None
+        await apply_controls_async(
+            level=level, experiment=experiment, context=context,
+            scope="before", configuration=configuration, secrets=secrets)
+
+    async def end_async(self, level: str, experiment: Experiment,
+                        context: Union[Activity, Hypothesis, Experiment],
+                        configuration: Configuration = None,
+                        secrets: Secrets = None):
+        state = self.state
+        await apply_controls_async(
+            level=level, experiment=experiment, context=context,
+            scope="after", state=state, configuration=configuration,
+            secrets=secrets)
+        self.state = None
+
 
 @contextmanager
 def controls(level: str, experiment: Experiment = None,
@@ -242,6 +277,38 @@ def controls(level: str, experiment: Experiment = None,
         c.end(level, experiment, context, configuration, secrets)
 
 
+class controls_async:
+    """
+    Asynchronous context manager for a block, running within an event loop,
+    that needs to be wrapped by controls.
+    """
+    def __init__(self, level: str, experiment: Experiment = None,
+                 context: Union[Activity, Hypothesis, Experiment, str] = None,
+                 configuration: Configuration = None,
+                 secrets: Secrets = None):
+        self.level = level
+        self.experiment = experiment
+        self.context = context
+        self.configuration = configuration
+        self.secrets = secrets
+        self.control = Control()
+
+    async def __aenter__(self) -> Control:
+        try:
+            await self.control.begin_async(
+                self.level, self.experiment, self.context,
+                self.configuration, self.secrets)
+        except BaseException:
+            await self.__aexit__(None, None, None)
+            raise
+        return self.control
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.control.end_async(
+            self.level, self.experiment, self.context, self.configuration,
+            self.secrets)
+
+
 ###############################################################################
 # Internals
 ###############################################################################
@@ -271,15 +338,14 @@ def set_global_controls(controls: List[ControlType]):
     """
     Set the controls loaded from the settings.
     """
-    global_controls.clear()
-    global_controls.extend(controls)
+    global_controls.set(tuple(controls))
 
 
 def reset_global_controls():
     """
     Invalidate all loaded global controls.
     """
-    global_controls.clear()
+    global_controls.set(())
 
 
 def get_context_controls(level: str, experiment: Experiment = None,
@@ -291,6 +357,9 @@ def get_context_controls(level: str, experiment: Experiment = None,
 
     If a control is declared at the current level, do override it with an
     top-level ine.
+
+    Controls are only read when applied so the returned ones are not copies
+    of the declared ones.
     """
     glbl_controls = get_global_controls()
     if not experiment:
@@ -305,24 +374,16 @@ def get_context_controls(level: str, experiment: Experiment = None,
         return controls
 
     if not controls:
-        return [
-            deepcopy(c)
-            for c in top_level_controls
-            if c.get("automatic", True)
-        ]
+        return [c for c in top_level_controls if c.get("automatic", True)]
 
     if level in ["method", "rollback"]:
-        return [
-            deepcopy(c)
-            for c in top_level_controls
-            if c.get("automatic", True)
-        ]
+        return [c for c in top_level_controls if c.get("automatic", True)]
 
     for c in controls:
         if "ref" in c:
             for top_level_control in top_level_controls:
                 if c["ref"] == top_level_control["name"]:
-                    controls.append(deepcopy(top_level_control))
+                    controls.append(top_level_control)
                     break
         else:
             for tc in top_level_controls:
@@ -330,7 +391,7 @@ def get_context_controls(level: str, experiment: Experiment = None,
                     break
             else:
                 if tc.get("automatic", True):
-                    controls.append(deepcopy(tc))
+                    controls.append(tc)
 
     return controls
 
@@ -350,31 +411,52 @@ def apply_controls(level: str, experiment: Experiment,
     `"after"` scope.
     """
     settings = get_loaded_settings() or None
-    controls = get_context_controls(level, experiment, context)
-    if not controls:
-        logger.debug("No controls to apply on '{}'".format(level))
-        return
+    for hook in get_control_hooks(level, experiment, context, scope):
+        control_name = hook.control.get("name")
+        logger.debug(
+            "Applying {}-control '{}' on '{}'".format(
+                scope, control_name, level))
 
-    for control in controls:
-        control_name = control.get("name")
-        target_scope = control.get("scope")
+        try:
+            call_control_hook(
+                hook, context=context, experiment=experiment, state=state,
+                configuration=configuration, secrets=secrets,
+                settings=settings)
+        except InterruptExecution:
+            logger.debug(
+                "{}-control '{}' interrupted the execution".format(
+                    scope.title(), control_name), exc_info=True)
+            raise
+        except Exception:
+            logger.debug(
+                "{}-control '{}' failed".format(
+                    scope.title(), control_name), exc_info=True)
 
-        if target_scope and target_scope != scope:
-            continue
 
+async def apply_controls_async(level: str, experiment: Experiment,
+                               context: Union[Activity, Hypothesis,
+                                              Experiment],
+                               scope: str,
+                               state: Union[Journal, Run, List[Run]] = None,
+                               configuration: Configuration = None,
+                               secrets: Secrets = None):
+    """
+    Apply the controls at given level from within an event loop.
+
+    See :func:`apply_controls` for the meaning of the parameters.
+    """
+    settings = get_loaded_settings() or None
+    for hook in get_control_hooks(level, experiment, context, scope):
+        control_name = hook.control.get("name")
         logger.debug(
             "Applying {}-control '{}' on '{}'".format(
                 scope, control_name, level))
-        provider = control.get("provider", {})
-        provider_type = provider.get("type")
 
         try:
-            if provider_type == "python":
-                apply_python_control(
-                    level="{}-{}".format(level, scope), control=control,
-                    context=context, state=state, experiment=experiment,
-                    configuration=configuration, secrets=secrets,
-                    settings=settings)
+            await call_control_hook_async(
+                hook, context=context, experiment=experiment, state=state,
+                configuration=configuration, secrets=secrets,
+                settings=settings)
         except InterruptExecution:
             logger.debug(
                 "{}-control '{}' interrupted the execution".format(
@@ -384,3 +466,85 @@ def apply_controls(level: str, experiment: Experiment,
             logger.debug(
                 "{}-control '{}' failed".format(
                     scope.title(), control_name), exc_info=True)
+
+
+def get_scoped_controls(level: str, experiment: Experiment,
+                        context: Union[Activity, Hypothesis, Experiment],
+                        scope: str) -> List[ControlType]:
+    """
+    Get the controls to apply at the given level and for the given scope.
+    """
+    controls = get_context_controls(level, experiment, context)
+    if not controls:
+        logger.debug("No controls to apply on '{}'".format(level))
+        return []
+
+    scoped = []
+    for control in controls:
+        target_scope = control.get("scope")
+        if target_scope and target_scope != scope:
+            continue
+        scoped.append(control)
+    return scoped
+
+
+def get_control_hooks(level: str, experiment: Experiment,
+                      context: Union[Activity, Hypothesis, Experiment],
+                      scope: str) -> List[ControlHook]:
+    """
+    Get the resolved control functions to call at the given level and for
+    the given scope, in their order. They come from the dispatch plan of the
+    experiment once its controls have been initialized.
+    """
+    plans = _plans.get()
+    plan = plans.get(id(experiment)) if plans and experiment else None
+    if plan is not None and plan.experiment is experiment:
+        return plan.get_hooks(level, context, scope)
+    return build_control_hooks(level, experiment, context, scope)
+
+
+def build_control_hooks(level: str, experiment: Experiment,
+                        context: Union[Activity, Hypothesis, Experiment],
+                        scope: str) -> List[ControlHook]:
+    hooks = []
+    for control in get_scoped_controls(level, experiment, context, scope):
+        provider = control.get("provider", {})
+        if provider.get("type") != "python":
+            continue
+
+        try:
+            hook = load_control_hook("{}-{}".format(level, scope), control)
+        except Exception:
+            logger.debug(
+                "{}-control '{}' failed".format(
+                    scope.title(), control.get("name")), exc_info=True)
+            continue
+
+        if hook:
+            hooks.append(hook)
+    return hooks
+
+
+class ControlPlan:
+    """
+    Control functions to call for each level, scope and context of an
+    experiment. They are resolved the first time they are needed and then
+    reused, so applying controls is only a walk through a list.
+    """
+    def __init__(self, experiment: Experiment):
+        self.experiment = experiment
+        self._hooks = {}  # type: Dict[Tuple[str, str, int], Tuple[Any, Any]]
+
+    def get_hooks(self, level: str,
+                  context: Union[Activity, Hypothesis, Experiment],
+                  scope: str) -> List[ControlHook]:
+        key = (level, scope, id(context))
+        entry = self._hooks.get(key)
+        # the context is kept along the hooks so its identifier cannot be
+        # reused by another object
+        if entry is not None and entry[0] is context:
+            return entry[1]
+
+        hooks = build_control_hooks(level, self.experiment, context, scope)
+        self._hooks[key] = (context, hooks)
+        return hooks
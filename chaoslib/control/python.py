@@ -1,19 +1,25 @@
 # -*- coding: utf-8 -*-
-from copy import deepcopy
+from collections import namedtuple
 import importlib
 import inspect
-from typing import Any, Callable, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from logzero import logger
 
-from chaoslib import substitute
+from chaoslib import copy_containers, substitute
 from chaoslib.exceptions import InvalidActivity
+from chaoslib.secret import resolve_secrets
 from chaoslib.types import Activity, Configuration, Control, Experiment, \
     Journal, Run, Secrets, Settings
 
 
-__all__ = ["apply_python_control", "cleanup_control", "initialize_control",
-           "validate_python_control", "import_control"]
+__all__ = ["apply_python_control", "apply_python_control_async",
+           "cleanup_control", "initialize_control", "validate_python_control",
+           "import_control"]
+# a control function resolved for a given level, with the names of the
+# parameters it declares so its arguments can be built without inspecting it
+ControlHook = namedtuple(
+    "ControlHook", ["control", "func", "parameters", "is_coroutine"])
 _level_mapping = {
     "experiment-before": "before_experiment_control",
     "experiment-after": "after_experiment_control",
@@ -55,14 +61,14 @@ def initialize_control(control: Control, experiment: Experiment,
         return
 
     provider = control["provider"]
-    arguments = deepcopy(provider.get("arguments", {}))
+    arguments = copy_arguments(provider)
     sig = inspect.signature(func)
 
     if "experiment" in sig.parameters:
         arguments["experiment"] = experiment
 
     if "secrets" in sig.parameters:
-        arguments["secrets"] = secrets
+        arguments["secrets"] = resolve_secrets(secrets)
 
     if "configuration" in sig.parameters:
         arguments["configuration"] = configuration
@@ -112,39 +118,75 @@ def apply_python_control(level: str, control: Control,  # noqa: C901
     """
     Apply a control by calling a function matching the given level.
     """
-    provider = control["provider"]
-    func_name = _level_mapping.get(level)
-    func = load_func(control, func_name)
-    if not func:
-        return
-
-    arguments = deepcopy(provider.get("arguments", {}))
-
-    if configuration or secrets:
-        arguments = substitute(arguments, configuration, secrets)
-
-    sig = inspect.signature(func)
-    if "secrets" in provider and "secrets" in sig.parameters:
-        arguments["secrets"] = {}
-        for s in provider["secrets"]:
-            arguments["secrets"].update(secrets.get(s, {}).copy())
-
-    if "configuration" in sig.parameters:
-        arguments["configuration"] = configuration.copy()
+    hook = load_control_hook(level, control)
+    if hook:
+        call_control_hook(
+            hook, context, experiment, state, configuration, secrets,
+            settings)
+
+
+async def apply_python_control_async(level: str, control: Control,
+                                     experiment: Experiment,
+                                     context: Union[Activity, Experiment],
+                                     state: Union[Journal, Run,
+                                                  List[Run]] = None,
+                                     configuration: Configuration = None,
+                                     secrets: Secrets = None,
+                                     settings: Settings = None):
+    """
+    Apply a control from within an event loop. When the function matching
+    the given level is a coroutine function, it is awaited. Otherwise, it
+    is called directly.
+    """
+    hook = load_control_hook(level, control)
+    if hook:
+        await call_control_hook_async(
+            hook, context, experiment, state, configuration, secrets,
+            settings)
 
-    if "state" in sig.parameters:
-        arguments["state"] = state
 
-    if "experiment" in sig.parameters:
-        arguments["experiment"] = experiment
+def load_control_hook(level: str, control: Control) -> Optional[ControlHook]:
+    """
+    Resolve the function of the control matching the given level, or `None`
+    when the control does not implement it.
+    """
+    func = load_func(control, _level_mapping.get(level))
+    if not func:
+        return None
 
-    if "extensions" in sig.parameters:
-        arguments["extensions"] = experiment.get("extensions")
+    return ControlHook(
+        control, func, frozenset(inspect.signature(func).parameters),
+        inspect.iscoroutinefunction(func))
 
-    if "settings" in sig.parameters:
-        arguments["settings"] = settings
 
-    func(context=context, **arguments)
+def call_control_hook(hook: ControlHook,
+                      context: Union[Activity, Experiment],
+                      experiment: Experiment,
+                      state: Union[Journal, Run, List[Run]] = None,
+                      configuration: Configuration = None,
+                      secrets: Secrets = None, settings: Settings = None):
+    """
+    Call a resolved control function. A coroutine function is not awaited
+    here, use :func:`call_control_hook_async` from within an event loop.
+    """
+    arguments = build_control_arguments(
+        hook, experiment, state, configuration, secrets, settings)
+    hook.func(context=context, **arguments)
+
+
+async def call_control_hook_async(hook: ControlHook,
+                                  context: Union[Activity, Experiment],
+                                  experiment: Experiment,
+                                  state: Union[Journal, Run, List[Run]] = None,
+                                  configuration: Configuration = None,
+                                  secrets: Secrets = None,
+                                  settings: Settings = None):
+    arguments = build_control_arguments(
+        hook, experiment, state, configuration, secrets, settings)
+    if hook.is_coroutine:
+        await hook.func(context=context, **arguments)
+    else:
+        hook.func(context=context, **arguments)
 
 
 ###############################################################################
@@ -171,3 +213,54 @@ def load_func(control: Control, func_name: str) -> Callable:
         pass
 
     return func
+
+
+def build_control_arguments(hook: ControlHook, experiment: Experiment,
+                            state: Union[Journal, Run, List[Run]] = None,
+                            configuration: Configuration = None,
+                            secrets: Secrets = None,
+                            settings: Settings = None) -> Dict[str, Any]:
+    """
+    Build the arguments a resolved control function should be called with,
+    except for the `context`.
+    """
+    provider = hook.control["provider"]
+    parameters = hook.parameters
+
+    arguments = provider.get("arguments")
+    if arguments and (configuration or secrets):
+        # the substitution already builds new containers all the way down
+        # so the declared arguments cannot be altered by the control
+        arguments = substitute(arguments, configuration, secrets)
+    else:
+        arguments = copy_arguments(provider)
+
+    if "secrets" in provider and "secrets" in parameters:
+        arguments["secrets"] = {}
+        for s in provider["secrets"]:
+            # lazily loaded secrets are loaded and copied here
+            arguments["secrets"].update(secrets.get(s, {}))
+
+    if "configuration" in parameters:
+        arguments["configuration"] = configuration.copy()
+
+    if "state" in parameters:
+        arguments["state"] = state
+
+    if "experiment" in parameters:
+        arguments["experiment"] = experiment
+
+    if "extensions" in parameters:
+        arguments["extensions"] = experiment.get("extensions")
+
+    if "settings" in parameters:
+        arguments["settings"] = settings
+
+    return arguments
+
+
+def copy_arguments(provider: Dict[str, Any]) -> Dict[str, Any]:
+    arguments = provider.get("arguments")
+    if not arguments:
+        return {}
+    return copy_containers(arguments)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from contextlib import contextmanager
+import numbers
+import time
+from typing import Any, Awaitable, Optional
+
+import contextvars
+
+from chaoslib.exceptions import ActivityTimeout
+
+__all__ = ["activity_deadline", "get_remaining_time", "get_timeout",
+           "check_deadline", "wait_until_deadline"]
+
+# the deadline of the activity being executed, as a monotonic time, so that
+# providers and the functions they call can bound their own waits with it
+current_deadline = contextvars.ContextVar('activity_deadline', default=None)
+
+
+@contextmanager
+def activity_deadline(timeout: Optional[float]):
+    """
+    Set the deadline of the activity executed within this context to
+    `timeout` seconds from now. Without a timeout, the activity keeps the
+    deadline it may already have.
+    """
+    if not timeout:
+        yield
+        return
+
+    deadline = time.monotonic() + timeout
+    current = current_deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+
+    token = current_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+def get_remaining_time() -> Optional[float]:
+    """
+    Seconds left before the deadline of the current activity, or `None` when
+    it has none. Long running Python activities may call it to stop on their
+    own once their time is up.
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def get_timeout(timeout: Any = None) -> Any:
+    """
+    Bound a provider's own timeout, a number or a sequence of numbers such as
+    the connect and read timeouts of a HTTP call, by the time left before
+    the deadline of the current activity.
+    """
+    remaining = get_remaining_time()
+    if remaining is None:
+        return timeout
+    if timeout is None:
+        return remaining
+    if isinstance(timeout, numbers.Number):
+        return min(timeout, remaining)
+    return type(timeout)(
+        remaining if t is None else min(t, remaining) for t in timeout)
+
+
+def check_deadline():
+    """
+    Raise :exc:`ActivityTimeout` when the deadline of the current activity
+    is over.
+
+    Python functions run in threads cannot be interrupted so their timeout
+    is only enforced on a best-effort basis: they run to completion and
+    their activity fails afterwards when they returned too late. They can
+    stop on their own by watching :func:`get_remaining_time`.
+    """
+    deadline = current_deadline.get()
+    if deadline is not None and time.monotonic() >= deadline:
+        raise ActivityTimeout("activity took too long to complete")
+
+
+async def wait_until_deadline(awaitable: Awaitable) -> Any:
+    """
+    Await `awaitable` and return its result. It is cancelled, and
+    :exc:`ActivityTimeout` raised, once the deadline of the current activity
+    is over.
+    """
+    remaining = get_remaining_time()
+    if remaining is None:
+        return await awaitable
+
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError:
+        if get_remaining_time():
+            # not ours, raised by the awaitable itself
+            raise
+        raise ActivityTimeout("activity took too long to complete")
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 
 __all__ = ["ChaosException", "InvalidExperiment", "InvalidActivity",
-           "ActivityFailed", "DiscoveryFailed", "InvalidSource",
+           "ActivityFailed", "ActivityTimeout", "DiscoveryFailed",
+           "InvalidSource",
            "InterruptExecution", "ControlPythonFunctionLoadingError",
            "InvalidControl"]
 
@@ -22,6 +23,10 @@ class ActivityFailed(ChaosException):
     pass
 
 
+class ActivityTimeout(ActivityFailed):
+    pass
+
+
 # please use ActivityFailed rather than the old name for this exception
 FailedActivity = ActivityFailed
 
@@ -1,37 +1,68 @@
 # -*- coding: utf-8 -*-
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor, wait
 from datetime import datetime
+import os
 import platform
 import time
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 from logzero import logger
 
 from chaoslib import __version__
-from chaoslib.activity import ensure_activity_is_valid, run_activities
-from chaoslib.caching import with_cache, lookup_activity
+from chaoslib.activity import ensure_activity_is_valid, run_activities, \
+    run_activities_async
+from chaoslib.caching import ActivityIndex, get_activity_index, \
+    with_cache, lookup_activity
 from chaoslib.control import initialize_controls, controls, cleanup_controls, \
     validate_controls, Control, initialize_global_controls, \
-    cleanup_global_controls
+    cleanup_global_controls, controls_async, load_global_controls
 from chaoslib.deprecation import warn_about_deprecated_features
 from chaoslib.exceptions import ActivityFailed, ChaosException, \
     InterruptExecution, InvalidActivity, InvalidExperiment
 from chaoslib.extension import validate_extensions
 from chaoslib.configuration import load_configuration
 from chaoslib.hypothesis import ensure_hypothesis_is_valid, \
-    run_steady_state_hypothesis
+    run_steady_state_hypothesis, run_steady_state_hypothesis_async
+from chaoslib.journal import close_journal, discard_journal, \
+    get_journal_path, open_journal, record_steady_state, \
+    should_assemble_journal
 from chaoslib.loader import load_experiment
-from chaoslib.rollback import run_rollbacks
-from chaoslib.secret import load_secrets
-from chaoslib.settings import get_loaded_settings
+from chaoslib.pool import DEFAULT_MAX_WORKERS, WorkerPool, get_max_workers
+from chaoslib.provider.http import close_async_http_sessions, \
+    close_http_sessions, open_http_sessions
+from chaoslib.rollback import run_rollbacks, run_rollbacks_async
+from chaoslib.secret import clear_vault_cache, load_secrets
+from chaoslib.settings import get_loaded_settings, loaded_settings
 from chaoslib.types import Configuration, Experiment, Journal, Run, Secrets, \
     Settings
 
 initialize_global_controls
-__all__ = ["ensure_experiment_is_valid", "run_experiment", "load_experiment"]
+__all__ = ["ensure_experiment_is_valid", "validate_experiment",
+           "ExperimentContext", "run_experiment", "run_experiment_async",
+           "run_experiments", "load_experiment"]
+EXECUTORS = ("thread", "process", "asyncio")
+
+
+class ExperimentContext:
+    """
+    An experiment which was validated, with the configuration and secrets
+    loaded while validating it and the index of its activities.
+
+    Pass it to :func:`run_experiment` or :func:`run_experiment_async` along
+    with the same experiment so that its configuration and secrets, which
+    may come from external sources such as Vault, are not loaded again and
+    its activities are not indexed again.
+    """
+    def __init__(self, experiment: Experiment, configuration: Configuration,
+                 secrets: Secrets, activities: ActivityIndex = None):
+        self.experiment = experiment
+        self.configuration = configuration
+        self.secrets = secrets
+        self.activities = activities
 
 
-@with_cache
 def ensure_experiment_is_valid(experiment: Experiment):
     """
     A chaos experiment consists of a method made of activities to carry
@@ -51,6 +82,15 @@ def ensure_experiment_is_valid(experiment: Experiment):
     This function raises :exc:`InvalidExperiment`, :exc:`InvalidProbe` or
     :exc:`InvalidAction` depending on where it fails.
     """
+    validate_experiment(experiment)
+
+
+@with_cache
+def validate_experiment(experiment: Experiment) -> ExperimentContext:
+    """
+    Validate the experiment like :func:`ensure_experiment_is_valid` and
+    return its context, holding the configuration and secrets it loaded.
+    """
     logger.info("Validating the experiment's syntax")
 
     if not experiment:
@@ -70,8 +110,15 @@ def ensure_experiment_is_valid(experiment: Experiment):
 
     validate_extensions(experiment)
 
+    max_workers = experiment.get("runtime", {}).get(
+        "background", {}).get("max_workers")
+    if max_workers is not None:
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise InvalidExperiment(
+                "runtime background max_workers must be a positive integer")
+
     config = load_configuration(experiment.get("configuration", {}))
-    load_secrets(experiment.get("secrets", {}), config)
+    secrets = load_secrets(experiment.get("secrets", {}), config)
 
     ensure_hypothesis_is_valid(experiment)
 
@@ -99,6 +146,9 @@ def ensure_experiment_is_valid(experiment: Experiment):
 
     logger.info("Experiment looks valid")
 
+    return ExperimentContext(
+        experiment, config, secrets, activities=get_activity_index())
+
 
 def initialize_run_journal(experiment: Experiment) -> Journal:
     return {
@@ -118,44 +168,68 @@ def initialize_run_journal(experiment: Experiment) -> Journal:
     }
 
 
-def get_background_pools(experiment: Experiment) -> ThreadPoolExecutor:
+def get_deviating_probe(state: Dict[str, Any]) -> Run:
     """
-    Create a pool for background activities. The pool is as big as the number
-    of declared background activities. If none are declared, returned `None`.
+    Return the first probe run of a steady state that did not meet its
+    tolerance. When probes run in parallel, it may not be the last one.
     """
-    method = experiment.get("method")
-    rollbacks = experiment.get("rollbacks", [])
+    for run in state["probes"]:
+        if not run.get("tolerance_met", True):
+            return run
+    return state["probes"][-1]
 
-    activity_background_count = 0
-    for activity in method:
-        if activity and activity.get("background"):
-            activity_background_count = activity_background_count + 1
 
-    activity_pool = None
-    if activity_background_count:
+def load_configuration_and_secrets(
+        experiment: Experiment,
+        experiment_context: ExperimentContext = None
+) -> Tuple[Configuration, Secrets]:
+    """
+    Return the configuration and secrets of the experiment, from its context
+    when it was validated already.
+    """
+    if experiment_context is not None:
+        if experiment_context.experiment is experiment:
+            return (
+                experiment_context.configuration, experiment_context.secrets)
         logger.debug(
-            "{c} activities will be run in the background".format(
-                c=activity_background_count))
-        activity_pool = ThreadPoolExecutor(activity_background_count)
+            "The experiment context belongs to another experiment, loading "
+            "the configuration and secrets again")
 
-    rollback_background_pool = 0
-    for activity in rollbacks:
+    config = load_configuration(experiment.get("configuration", {}))
+    secrets = load_secrets(experiment.get("secrets", {}), config)
+    return (config, secrets)
+
+
+def get_background_pool(experiment: Experiment,
+                        settings: Settings = None) -> Optional[WorkerPool]:
+    """
+    Create a pool shared by background activities of the method and of the
+    rollbacks. The pool is as big as the number of declared background
+    activities but bounded by the `runtime.background.max_workers` value of
+    the experiment or the settings. If none are declared, returned `None`.
+    """
+    method = experiment.get("method", [])
+    rollbacks = experiment.get("rollbacks", [])
+
+    background_count = 0
+    for activity in method + rollbacks:
         if activity and activity.get("background"):
-            rollback_background_pool = rollback_background_pool + 1
+            background_count = background_count + 1
 
-    rollback_pool = None
-    if rollback_background_pool:
-        logger.debug(
-            "{c} rollbacks will be run in the background".format(
-                c=rollback_background_pool))
-        rollback_pool = ThreadPoolExecutor(rollback_background_pool)
+    if not background_count:
+        return None
 
-    return activity_pool, rollback_pool
+    max_workers = min(
+        background_count, get_max_workers(experiment, settings))
+    logger.debug(
+        "{c} activities will be run in the background with up to {m} "
+        "at once".format(c=background_count, m=max_workers))
+    return WorkerPool(max_workers)
 
 
 @with_cache
-def run_experiment(experiment: Experiment,
-                   settings: Settings = None) -> Journal:
+def run_experiment(experiment: Experiment, settings: Settings = None,
+                   experiment_context: ExperimentContext = None) -> Journal:
     """
     Run the given `experiment` method step by step, in the following sequence:
     steady probe, action, close probe.
@@ -168,6 +242,20 @@ def run_experiment(experiment: Experiment,
     If the experiment has the `"dry"` property set to `False`, the experiment
     runs without actually executing the activities.
 
+    When the `runtime.journal.path` value is set in the experiment or the
+    settings, the journal is streamed to that file as JSON Lines while the
+    experiment runs, rather than kept in memory. It is assembled back from
+    that file once the experiment is done, so the returned journal has the
+    same shape, outputs included, as when it is not streamed. With
+    `runtime.journal.assemble` set to `false`, the returned journal is the
+    one kept in memory instead: the runs of the method, the rollbacks and
+    the steady state probes do not hold their `"output"`, which can only be
+    read from the file. See :func:`chaoslib.journal.should_assemble_journal`.
+
+    When given the `experiment_context` returned by
+    :func:`validate_experiment` for this experiment, the configuration and
+    secrets it holds are used rather than loaded again.
+
     NOTE: Tricky to make a decision whether we should rollback when exiting
     abnormally (Ctrl-C, SIGTERM...). Afterall, there is a chance we actually
     cannot afford to rollback properly. Better bailing to a conservative
@@ -184,16 +272,21 @@ def run_experiment(experiment: Experiment,
 
     started_at = time.time()
     settings = settings if settings is not None else get_loaded_settings()
-    config = load_configuration(experiment.get("configuration", {}))
-    secrets = load_secrets(experiment.get("secrets", {}), config)
+    config, secrets = load_configuration_and_secrets(
+        experiment, experiment_context)
     initialize_global_controls(experiment, config, secrets, settings)
     initialize_controls(experiment, config, secrets)
-    activity_pool, rollback_pool = get_background_pools(experiment)
+    pool = get_background_pool(experiment, settings)
 
     control = Control()
     journal = initialize_run_journal(experiment)
+    open_http_sessions(settings)
 
     try:
+        journal_path = get_journal_path(experiment, settings)
+        if journal_path:
+            open_journal(journal, journal_path)
+
         try:
             control.begin(
                 "experiment", experiment, experiment, config, secrets)
@@ -202,9 +295,10 @@ def run_experiment(experiment: Experiment,
             try:
                 state = run_steady_state_hypothesis(
                     experiment, config, secrets, dry=dry)
+                state = record_steady_state("before", state)
                 journal["steady_states"]["before"] = state
                 if state is not None and not state["steady_state_met"]:
-                    p = state["probes"][-1]
+                    p = get_deviating_probe(state)
                     raise ActivityFailed(
                         "Steady state probe '{p}' is not in the given "
                         "tolerance so failing this experiment".format(
@@ -216,7 +310,7 @@ def run_experiment(experiment: Experiment,
             else:
                 try:
                     journal["run"] = apply_activities(
-                        experiment, config, secrets, activity_pool, dry)
+                        experiment, config, secrets, pool, dry)
                 except InterruptExecution:
                     raise
                 except Exception:
@@ -228,10 +322,11 @@ def run_experiment(experiment: Experiment,
                     try:
                         state = run_steady_state_hypothesis(
                             experiment, config, secrets, dry=dry)
+                        state = record_steady_state("after", state)
                         journal["steady_states"]["after"] = state
                         if state is not None and not state["steady_state_met"]:
                             journal["deviated"] = True
-                            p = state["probes"][-1]
+                            p = get_deviating_probe(state)
                             raise ActivityFailed(
                                 "Steady state probe '{p}' is not in the given "
                                 "tolerance so failing this experiment".format(
@@ -249,10 +344,12 @@ def run_experiment(experiment: Experiment,
         else:
             journal["status"] = journal["status"] or "completed"
             journal["rollbacks"] = apply_rollbacks(
-                experiment, config, secrets, rollback_pool, dry)
+                experiment, config, secrets, pool, dry)
 
         journal["end"] = datetime.utcnow().isoformat()
         journal["duration"] = time.time() - started_at
+        journal = close_journal(
+            journal, should_assemble_journal(experiment, settings))
 
         has_deviated = journal["deviated"]
         status = "deviated" if has_deviated else journal["status"]
@@ -273,12 +370,301 @@ def run_experiment(experiment: Experiment,
             logger.debug("Failed to close controls", exc_info=True)
 
     finally:
+        if pool:
+            pool.shutdown(wait=False)
         cleanup_controls(experiment)
         cleanup_global_controls()
+        close_http_sessions()
+        clear_vault_cache()
+        discard_journal()
 
     return journal
 
 
+@with_cache
+async def run_experiment_async(
+        experiment: Experiment, settings: Settings = None,
+        experiment_context: ExperimentContext = None) -> Journal:
+    """
+    Run the given `experiment` from within an event loop.
+
+    This follows the exact same sequence as :func:`run_experiment` and
+    returns a journal of the same format. However, activities are executed
+    as native coroutines: process activities are run as asyncio subprocesses,
+    HTTP activities are run with `aiohttp` when it is installed and Python
+    activities declared as coroutine functions are awaited. Background
+    activities are scheduled as tasks rather than run in threads, so that
+    many of them can run concurrently without one thread each.
+
+    Blocking Python activities and HTTP activities without `aiohttp` are run
+    in the event loop's default executor.
+
+    A journal streamed to a file is returned with the same shape as with
+    :func:`run_experiment`.
+    """
+    logger.info("Running experiment: {t}".format(t=experiment["title"]))
+
+    dry = experiment.get("dry", False)
+    if dry:
+        logger.warning("Dry mode enabled")
+
+    started_at = time.time()
+    settings = settings if settings is not None else get_loaded_settings()
+    config, secrets = load_configuration_and_secrets(
+        experiment, experiment_context)
+    initialize_global_controls(experiment, config, secrets, settings)
+    initialize_controls(experiment, config, secrets)
+
+    control = Control()
+    journal = initialize_run_journal(experiment)
+    open_http_sessions(settings)
+
+    try:
+        journal_path = get_journal_path(experiment, settings)
+        if journal_path:
+            open_journal(journal, journal_path)
+
+        try:
+            await control.begin_async(
+                "experiment", experiment, experiment, config, secrets)
+            # this may fail the entire experiment right there if any of the
+            # probes fail or fall out of their tolerance zone
+            try:
+                state = await run_steady_state_hypothesis_async(
+                    experiment, config, secrets, dry=dry)
+                state = record_steady_state("before", state)
+                journal["steady_states"]["before"] = state
+                if state is not None and not state["steady_state_met"]:
+                    p = get_deviating_probe(state)
+                    raise ActivityFailed(
+                        "Steady state probe '{p}' is not in the given "
+                        "tolerance so failing this experiment".format(
+                            p=p["activity"]["name"]))
+            except ActivityFailed as a:
+                journal["steady_states"]["before"] = state
+                journal["status"] = "failed"
+                logger.fatal(str(a))
+            else:
+                try:
+                    journal["run"] = await apply_activities_async(
+                        experiment, config, secrets, dry)
+                except InterruptExecution:
+                    raise
+                except Exception:
+                    journal["status"] = "aborted"
+                    logger.fatal(
+                        "Experiment ran into an un expected fatal error, "
+                        "aborting now.", exc_info=True)
+                else:
+                    try:
+                        state = await run_steady_state_hypothesis_async(
+                            experiment, config, secrets, dry=dry)
+                        state = record_steady_state("after", state)
+                        journal["steady_states"]["after"] = state
+                        if state is not None and not state["steady_state_met"]:
+                            journal["deviated"] = True
+                            p = get_deviating_probe(state)
+                            raise ActivityFailed(
+                                "Steady state probe '{p}' is not in the given "
+                                "tolerance so failing this experiment".format(
+                                    p=p["activity"]["name"]))
+                    except ActivityFailed as a:
+                        journal["status"] = "failed"
+                        logger.fatal(str(a))
+        except InterruptExecution as i:
+            journal["status"] = "interrupted"
+            logger.fatal(str(i))
+        except (KeyboardInterrupt, SystemExit, asyncio.CancelledError):
+            journal["status"] = "interrupted"
+            logger.warning("Received an exit signal, "
+                           "leaving without applying rollbacks.")
+        else:
+            journal["status"] = journal["status"] or "completed"
+            journal["rollbacks"] = await apply_rollbacks_async(
+                experiment, config, secrets, dry)
+
+        journal["end"] = datetime.utcnow().isoformat()
+        journal["duration"] = time.time() - started_at
+        journal = close_journal(
+            journal, should_assemble_journal(experiment, settings))
+
+        has_deviated = journal["deviated"]
+        status = "deviated" if has_deviated else journal["status"]
+
+        logger.info(
+            "Experiment ended with status: {s}".format(s=status))
+
+        if has_deviated:
+            logger.info(
+                "The steady-state has deviated, a weakness may have been "
+                "discovered")
+
+        control.with_state(journal)
+
+        try:
+            await control.end_async(
+                "experiment", experiment, experiment, config, secrets)
+        except ChaosException:
+            logger.debug("Failed to close controls", exc_info=True)
+
+    finally:
+        cleanup_controls(experiment)
+        cleanup_global_controls()
+        close_http_sessions()
+        clear_vault_cache()
+        discard_journal()
+        await close_async_http_sessions()
+
+    return journal
+
+
+def run_experiments(experiments: List[Experiment], settings: Settings = None,
+                    executor: str = "thread",
+                    max_workers: int = None) -> Dict[str, Any]:
+    """
+    Run many experiments concurrently within this process and return a
+    report combining their journals, in the order of the experiments.
+
+    The `executor` is one of:
+
+    * `"thread"`: each experiment runs in a thread of a bounded pool
+    * `"process"`: each experiment runs in a process of a bounded pool, the
+      experiments, settings and journals must then be picklable
+    * `"asyncio"`: each experiment runs with :func:`run_experiment_async`
+      as a task of a new event loop
+
+    Each run gets its own copy of the current context, in which the settings
+    are loaded and the controls they declare are loaded anew, so runs do not
+    see each other's controls, activities or streamed journal. Mind that a
+    `runtime.journal.path` set in the settings would be shared by all runs,
+    set it in each experiment instead.
+
+    At most `max_workers` experiments run at once. It defaults to the number
+    of experiments, bounded by 32 or, with processes, by the number of CPUs.
+    """
+    if executor not in EXECUTORS:
+        raise ChaosException(
+            "experiments executor must be one of {}".format(
+                ", ".join(EXECUTORS)))
+
+    started_at = time.time()
+    settings = settings if settings is not None else get_loaded_settings()
+    count = len(experiments)
+    limit = (os.cpu_count() or 1) if executor == "process" \
+        else DEFAULT_MAX_WORKERS
+    max_workers = max(1, min(count, max_workers or limit))
+    logger.info(
+        "Running {c} experiments with up to {m} at once in {e}s".format(
+            c=count, m=max_workers, e=executor))
+
+    if executor == "asyncio":
+        loop = asyncio.new_event_loop()
+        try:
+            outcomes = loop.run_until_complete(
+                run_isolated_experiments_async(
+                    experiments, settings, max_workers))
+        finally:
+            loop.close()
+    else:
+        if executor == "process":
+            pool = ProcessPoolExecutor(max_workers)
+        else:
+            pool = WorkerPool(max_workers, name="experiments")
+        try:
+            futures = [
+                pool.submit(run_isolated_experiment, experiment, settings)
+                for experiment in experiments
+            ]
+            outcomes = [get_run_outcome(f) for f in futures]
+        finally:
+            pool.shutdown(wait=True)
+
+    return make_experiments_report(
+        experiments, outcomes, executor, started_at)
+
+
+def run_isolated_experiment(experiment: Experiment,
+                            settings: Settings = None) -> Journal:
+    """
+    Run the experiment with the given settings loaded in the current
+    context, which must be one of its own.
+    """
+    prepare_isolated_run(settings)
+    return run_experiment(experiment, settings)
+
+
+async def run_isolated_experiments_async(
+        experiments: List[Experiment], settings: Settings,
+        max_workers: int) -> List[Tuple[Journal, Optional[str]]]:
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def run(experiment: Experiment) -> Tuple[Journal, Optional[str]]:
+        async with semaphore:
+            # tasks run in a copy of the context they were created from
+            prepare_isolated_run(settings)
+            try:
+                journal = await run_experiment_async(experiment, settings)
+            except Exception as x:
+                logger.debug("Experiment run failed", exc_info=True)
+                return (None, str(x))
+            return (journal, None)
+
+    loop = asyncio.get_event_loop()
+    tasks = [loop.create_task(run(e)) for e in experiments]
+    return list(await asyncio.gather(*tasks))
+
+
+def prepare_isolated_run(settings: Settings = None):
+    loaded_settings.set(settings or {})
+    if settings:
+        load_global_controls(settings)
+
+
+def get_run_outcome(future: Future) -> Tuple[Journal, Optional[str]]:
+    try:
+        return (future.result(), None)
+    except Exception as x:
+        logger.debug("Experiment run failed", exc_info=True)
+        return (None, str(x))
+
+
+def make_experiments_report(experiments: List[Experiment],
+                            outcomes: List[Tuple[Journal, Optional[str]]],
+                            executor: str,
+                            started_at: float) -> Dict[str, Any]:
+    runs = []
+    statuses = {}
+    for (experiment, (journal, error)) in zip(experiments, outcomes):
+        if journal is None:
+            status = "aborted"
+            run = {"title": experiment.get("title"), "status": status,
+                   "deviated": False, "duration": None, "error": error,
+                   "journal": None}
+        else:
+            status = "deviated" if journal["deviated"] else journal["status"]
+            run = {"title": experiment.get("title"), "status": status,
+                   "deviated": journal["deviated"],
+                   "duration": journal.get("duration"), "journal": journal}
+        statuses[status] = statuses.get(status, 0) + 1
+        runs.append(run)
+
+    logger.info("Experiments ended with statuses: {s}".format(
+        s=", ".join("{} {}".format(c, s) for (s, c) in statuses.items())))
+
+    return {
+        "chaoslib-version": __version__,
+        "platform": platform.platform(),
+        "node": platform.node(),
+        "executor": executor,
+        "start": datetime.utcfromtimestamp(started_at).isoformat(),
+        "end": datetime.utcnow().isoformat(),
+        "duration": time.time() - started_at,
+        "statuses": statuses,
+        "deviated": any(r["deviated"] for r in runs),
+        "runs": runs
+    }
+
+
 def apply_activities(experiment: Experiment, configuration: Configuration,
                      secrets: Secrets, pool: ThreadPoolExecutor,
                      dry: bool = False) -> List[Run]:
@@ -289,7 +675,7 @@ def apply_activities(experiment: Experiment, configuration: Configuration,
 
         if pool:
             logger.debug("Waiting for background activities to complete...")
-            pool.shutdown(wait=True)
+            wait([r for r in runs if isinstance(r, Future)])
 
         result = []
         for run in runs:
@@ -316,7 +702,7 @@ def apply_rollbacks(experiment: Experiment, configuration: Configuration,
 
         if pool:
             logger.debug("Waiting for background rollbacks to complete...")
-            pool.shutdown(wait=True)
+            wait([r for r in rollbacks if isinstance(r, Future)])
 
         result = []
         for rollback in rollbacks:
@@ -330,3 +716,52 @@ def apply_rollbacks(experiment: Experiment, configuration: Configuration,
         control.with_state(result)
 
     return result
+
+
+async def apply_activities_async(experiment: Experiment,
+                                 configuration: Configuration,
+                                 secrets: Secrets,
+                                 dry: bool = False) -> List[Run]:
+    async with controls_async(
+            level="method", experiment=experiment, context=experiment,
+            configuration=configuration, secrets=secrets) as control:
+        runs = await run_activities_async(
+            experiment, configuration, secrets, dry)
+
+        result = []
+        for run in runs:
+            if not run:
+                continue
+            if isinstance(run, dict):
+                result.append(run)
+            else:
+                result.append(await run)
+
+        control.with_state(result)
+
+    return result
+
+
+async def apply_rollbacks_async(experiment: Experiment,
+                                configuration: Configuration,
+                                secrets: Secrets,
+                                dry: bool = False) -> List[Run]:
+    logger.info("Let's rollback...")
+    async with controls_async(
+            level="rollback", experiment=experiment, context=experiment,
+            configuration=configuration, secrets=secrets) as control:
+        rollbacks = await run_rollbacks_async(
+            experiment, configuration, secrets, dry)
+
+        result = []
+        for rollback in rollbacks:
+            if not rollback:
+                continue
+            if isinstance(rollback, dict):
+                result.append(rollback)
+            else:
+                result.append(await rollback)
+
+        control.with_state(result)
+
+    return result
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
+from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import as_completed
+from copy import deepcopy
 from decimal import Decimal, InvalidOperation
 from functools import singledispatch
 import json
 from numbers import Number
 import re
-from typing import Any
+from typing import Any, Dict, List
 
 try:
     from jsonpath2.path import Path as JSONPath
@@ -15,15 +19,19 @@ except ImportError:
 from logzero import logger
 
 from chaoslib.activity import ensure_activity_is_valid, execute_activity, \
-    run_activity
-from chaoslib.control import controls
+    execute_activity_async, run_activity
+from chaoslib.caching import get_activity_index
+from chaoslib.control import controls, controls_async
 from chaoslib.exceptions import ActivityFailed, InvalidActivity, \
     InvalidExperiment
-from chaoslib.types import Configuration, Experiment, \
-    Secrets, Tolerance
+from chaoslib.pool import WorkerPool
+from chaoslib.settings import get_loaded_settings
+from chaoslib.types import Activity, Configuration, Experiment, Hypothesis, \
+    Probe, Run, Secrets, Tolerance
 
 
-__all__ = ["ensure_hypothesis_is_valid", "run_steady_state_hypothesis"]
+__all__ = ["ensure_hypothesis_is_valid", "run_steady_state_hypothesis",
+           "run_steady_state_hypothesis_async"]
 
 
 def ensure_hypothesis_is_valid(experiment: Experiment):
@@ -38,6 +46,9 @@ def ensure_hypothesis_is_valid(experiment: Experiment):
     if not hypo.get("title"):
         raise InvalidExperiment("hypothesis requires a title")
 
+    if "parallel" in hypo and not isinstance(hypo["parallel"], bool):
+        raise InvalidExperiment("hypothesis parallel must be a boolean")
+
     probes = hypo.get("probes")
     if probes:
         for probe in probes:
@@ -81,11 +92,13 @@ def ensure_hypothesis_tolerance_is_valid(tolerance: Tolerance):
                     tolerance_type))
 
 
-def check_regex_pattern(tolerance: Tolerance):
+def check_regex_pattern(tolerance: Tolerance) -> "RegexTolerance":
     """
     Check the regex pattern of a tolerance and raise :exc:`InvalidActivity`
     when the pattern is missing or invalid (meaning, cannot be compiled by
     the Python regex engine).
+
+    Returns the compiled tolerance.
     """
     if "pattern" not in tolerance:
         raise InvalidActivity(
@@ -93,7 +106,7 @@ def check_regex_pattern(tolerance: Tolerance):
 
     pattern = tolerance["pattern"]
     try:
-        re.compile(pattern)
+        return cache_compiled_tolerance(RegexTolerance(tolerance))
     except TypeError:
         raise InvalidActivity(
             "hypothesis probe tolerance pattern {} has an invalid type".format(
@@ -104,11 +117,13 @@ def check_regex_pattern(tolerance: Tolerance):
                 e.pattern, e.msg))
 
 
-def check_json_path(tolerance: Tolerance):
+def check_json_path(tolerance: Tolerance) -> "JSONPathTolerance":
     """
     Check the JSON path of a tolerance and raise :exc:`InvalidActivity`
     when the path is missing or invalid.
 
+    Returns the compiled tolerance.
+
     See: https://github.com/h2non/jsonpath-ng
     """
     if not HAS_JSONPATH:
@@ -125,7 +140,7 @@ def check_json_path(tolerance: Tolerance):
         if not path:
             raise InvalidActivity(
                 "hypothesis probe tolerance JSON path cannot be empty")
-        JSONPath.parse_str(path)
+        return cache_compiled_tolerance(JSONPathTolerance(tolerance))
     except ValueError:
         raise InvalidActivity(
             "hypothesis probe tolerance JSON path {} is invalid".format(
@@ -136,10 +151,12 @@ def check_json_path(tolerance: Tolerance):
             "type".format(path))
 
 
-def check_range(tolerance: Tolerance):
+def check_range(tolerance: Tolerance) -> "RangeTolerance":
     """
     Check a value is within a given range. That range may be set to a min and
     max value or a sequence.
+
+    Returns the compiled tolerance.
     """
     if "range" not in tolerance:
         raise InvalidActivity(
@@ -162,6 +179,8 @@ def check_range(tolerance: Tolerance):
         raise InvalidActivity(
             "hypothesis range upper boundary must be a number")
 
+    return cache_compiled_tolerance(RangeTolerance(tolerance))
+
 
 def run_steady_state_hypothesis(experiment: Experiment,
                                 configuration: Configuration, secrets: Secrets,
@@ -187,35 +206,77 @@ def run_steady_state_hypothesis(experiment: Experiment,
         probes = hypo.get("probes", [])
         control.with_state(state)
 
-        for activity in probes:
-            run = execute_activity(
-                experiment=experiment, activity=activity,
-                configuration=configuration, secrets=secrets, dry=dry)
-
-            state["probes"].append(run)
-
-            if run["status"] == "failed":
-                run["tolerance_met"] = False
+        max_workers = get_parallel_probes_workers(hypo)
+        if max_workers:
+            if not run_probes_in_parallel(
+                    experiment, probes, configuration, secrets, dry, state,
+                    max_workers):
                 state["steady_state_met"] = False
-                logger.warn("Probe terminated unexpectedly, "
-                            "so its tolerance could not be validated")
                 return state
+        else:
+            for activity in probes:
+                run = execute_activity(
+                    experiment=experiment, activity=activity,
+                    configuration=configuration, secrets=secrets, dry=dry)
+
+                state["probes"].append(run)
+
+                if not probe_run_is_within_tolerance(
+                        activity, run, configuration, secrets, dry):
+                    state["steady_state_met"] = False
+                    return state
+
+        state["steady_state_met"] = True
+        logger.info("Steady state hypothesis is met!")
+
+    return state
+
+
+async def run_steady_state_hypothesis_async(experiment: Experiment,
+                                            configuration: Configuration,
+                                            secrets: Secrets,
+                                            dry: bool = False):
+    """
+    Counterpart of :func:`run_steady_state_hypothesis` to be awaited from
+    within an event loop.
+    """
+    state = {
+        "steady_state_met": None,
+        "probes": []
+    }
+    hypo = experiment.get("steady-state-hypothesis")
+    if not hypo:
+        logger.info(
+            "No steady state hypothesis defined. That's ok, just exploring.")
+        return
 
-            run["tolerance_met"] = True
+    logger.info("Steady state hypothesis: {h}".format(h=hypo.get("title")))
 
-            if dry:
-                # do not check for tolerance when dry mode is on
-                continue
+    async with controls_async(
+            level="hypothesis", experiment=experiment, context=hypo,
+            configuration=configuration, secrets=secrets) as control:
+        probes = hypo.get("probes", [])
+        control.with_state(state)
 
-            tolerance = activity.get("tolerance")
-            logger.debug("allowed tolerance is {t}".format(t=str(tolerance)))
-            checked = within_tolerance(
-                tolerance, run["output"], configuration=configuration,
-                secrets=secrets)
-            if not checked:
-                run["tolerance_met"] = False
+        max_workers = get_parallel_probes_workers(hypo)
+        if max_workers:
+            if not await run_probes_concurrently(
+                    experiment, probes, configuration, secrets, dry, state,
+                    max_workers):
                 state["steady_state_met"] = False
                 return state
+        else:
+            for activity in probes:
+                run = await execute_activity_async(
+                    experiment=experiment, activity=activity,
+                    configuration=configuration, secrets=secrets, dry=dry)
+
+                state["probes"].append(run)
+
+                if not probe_run_is_within_tolerance(
+                        activity, run, configuration, secrets, dry):
+                    state["steady_state_met"] = False
+                    return state
 
         state["steady_state_met"] = True
         logger.info("Steady state hypothesis is met!")
@@ -223,6 +284,176 @@ def run_steady_state_hypothesis(experiment: Experiment,
     return state
 
 
+def get_parallel_probes_workers(hypo: Hypothesis) -> int:
+    """
+    Return how many probes of the hypothesis may run at the same time, or `0`
+    when they must run sequentially.
+
+    Probes run in parallel when the hypothesis sets `"parallel": true` or,
+    when the hypothesis does not say, when the settings enable it:
+
+    ```yaml
+    runtime:
+      hypothesis:
+        parallel: true
+        max_workers: 8
+    ```
+    """
+    probes = hypo.get("probes", [])
+    settings = get_loaded_settings() or {}
+    runtime = settings.get("runtime", {}).get("hypothesis", {})
+    parallel = hypo.get("parallel", runtime.get("parallel", False))
+    if not parallel or len(probes) < 2:
+        return 0
+    return min(len(probes), runtime.get("max_workers", 8))
+
+
+def run_probes_in_parallel(experiment: Experiment, probes: List[Probe],
+                           configuration: Configuration, secrets: Secrets,
+                           dry: bool, state: Dict[str, Any],
+                           max_workers: int) -> bool:
+    """
+    Run the hypothesis probes on a bounded pool of threads and check their
+    tolerance as soon as they complete. On the first deviation, the probes
+    that have not started yet are cancelled.
+
+    The runs are recorded into `state` in the probes declaration order.
+    Returns whether all probes are within their tolerance.
+    """
+    logger.debug(
+        "Running {c} hypothesis probes in parallel".format(c=len(probes)))
+    runs = [None] * len(probes)
+    met = True
+    futures = {}
+    pool = WorkerPool(max_workers, name="hypothesis")
+    try:
+        for index, activity in enumerate(probes):
+            future = pool.submit(
+                execute_activity, experiment=experiment, activity=activity,
+                configuration=configuration, secrets=secrets, dry=dry)
+            futures[future] = index
+
+        for future in as_completed(futures):
+            index = futures[future]
+            runs[index] = run = future.result()
+            if not probe_run_is_within_tolerance(
+                    probes[index], run, configuration, secrets, dry):
+                met = False
+                break
+    finally:
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+    # probes that were already running when we bailed are still recorded
+    for future, index in futures.items():
+        if runs[index] is None and not future.cancelled() and \
+                future.exception() is None:
+            runs[index] = future.result()
+            probe_run_is_within_tolerance(
+                probes[index], runs[index], configuration, secrets, dry)
+
+    state["probes"].extend([run for run in runs if run is not None])
+    return met
+
+
+async def run_probes_concurrently(experiment: Experiment,
+                                  probes: List[Probe],
+                                  configuration: Configuration,
+                                  secrets: Secrets, dry: bool,
+                                  state: Dict[str, Any],
+                                  max_workers: int) -> bool:
+    """
+    Counterpart of :func:`run_probes_in_parallel` which runs the probes as
+    concurrent tasks of the current event loop, at most `max_workers` of
+    them at a time. On the first deviation, the probes that have not
+    started yet are cancelled while those already running are still
+    awaited and recorded.
+    """
+    logger.debug(
+        "Running {c} hypothesis probes concurrently".format(c=len(probes)))
+    semaphore = asyncio.Semaphore(max_workers)
+    started = set()
+
+    async def run_probe(index: int, activity: Probe) -> Run:
+        async with semaphore:
+            started.add(index)
+            return await execute_activity_async(
+                experiment=experiment, activity=activity,
+                configuration=configuration, secrets=secrets, dry=dry)
+
+    tasks = [
+        asyncio.ensure_future(run_probe(index, activity))
+        for (index, activity) in enumerate(probes)
+    ]
+    runs = [None] * len(probes)
+    met = True
+    pending = set(tasks)
+    try:
+        while pending and met:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = tasks.index(task)
+                runs[index] = task.result()
+                if not probe_run_is_within_tolerance(
+                        probes[index], runs[index], configuration, secrets,
+                        dry):
+                    met = False
+
+        for task in pending:
+            if tasks.index(task) not in started:
+                task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    # probes that were already running when we bailed are still recorded
+    for task in pending:
+        index = tasks.index(task)
+        if not task.cancelled() and task.exception() is None:
+            runs[index] = task.result()
+            probe_run_is_within_tolerance(
+                probes[index], runs[index], configuration, secrets, dry)
+
+    state["probes"].extend([run for run in runs if run is not None])
+    return met
+
+
+def probe_run_is_within_tolerance(activity: Activity, run: Run,
+                                  configuration: Configuration,
+                                  secrets: Secrets, dry: bool = False) -> bool:
+    """
+    Check the `run` of a hypothesis probe against the probe's tolerance and
+    flag the run accordingly.
+    """
+    if run["status"] == "failed":
+        run["tolerance_met"] = False
+        logger.warning("Probe terminated unexpectedly, "
+                       "so its tolerance could not be validated")
+        return False
+
+    run["tolerance_met"] = True
+
+    if dry:
+        # do not check for tolerance when dry mode is on
+        return True
+
+    tolerance = activity.get("tolerance")
+    logger.debug("allowed tolerance is {t}".format(t=str(tolerance)))
+    checked = within_tolerance(
+        tolerance, run["output"], configuration=configuration,
+        secrets=secrets)
+    if not checked:
+        run["tolerance_met"] = False
+        return False
+
+    return True
+
+
 @singledispatch
 def within_tolerance(tolerance: Any, value: Any,
                      configuration: Configuration = None,
@@ -292,22 +523,77 @@ def _(tolerance: dict, value: Any, configuration: Configuration = None,
                 return False
         except ActivityFailed:
             return False
-    elif tolerance_type == "regex":
-        target = tolerance.get("target")
-        pattern = tolerance.get("pattern")
-        rx = re.compile(pattern)
-        if target:
-            value = value.get(target, value)
-        return rx.search(value) is not None
-    elif tolerance_type == "jsonpath":
-        target = tolerance.get("target")
-        path = tolerance.get("path")
-        count_value = tolerance.get("count", None)
-        px = JSONPath.parse_str(path)
 
-        if target:
+    compiled = get_compiled_tolerance(tolerance)
+    if compiled is not None:
+        return compiled.check(value)
+
+
+###############################################################################
+# Compiled tolerances
+###############################################################################
+class CompiledTolerance(ABC):
+    """
+    A dictionary tolerance turned into a reusable checker so that its
+    pattern, path or boundaries are parsed once only.
+
+    The keys the checker was built from are kept aside so that a tolerance
+    changed after its compilation is not checked against stale values.
+    """
+    keys = ("type", "target")
+
+    def __init__(self, tolerance: Tolerance):
+        self.tolerance = tolerance
+        self.source = deepcopy(self.get_source(tolerance))
+        self.target = tolerance.get("target")
+
+    def get_source(self, tolerance: Tolerance) -> Dict[str, Any]:
+        return {k: tolerance[k] for k in self.keys if k in tolerance}
+
+    def is_compiled_from(self, tolerance: Tolerance) -> bool:
+        return tolerance is self.tolerance and \
+            self.get_source(tolerance) == self.source
+
+    def get_target_value(self, value: Any) -> Any:
+        if self.target:
             # if no target was provided, we use the tested value as-is
-            value = value.get(target, value)
+            value = value.get(self.target, value)
+        return value
+
+    @abstractmethod
+    def check(self, value: Any) -> bool:
+        """
+        Whether the given value is within the tolerance.
+        """
+
+
+class RegexTolerance(CompiledTolerance):
+    keys = ("type", "target", "pattern")
+
+    def __init__(self, tolerance: Tolerance):
+        CompiledTolerance.__init__(self, tolerance)
+        self.rx = re.compile(tolerance["pattern"])
+
+    def check(self, value: Any) -> bool:
+        value = self.get_target_value(value)
+        return self.rx.search(value) is not None
+
+
+class JSONPathTolerance(CompiledTolerance):
+    keys = ("type", "target", "path", "count", "expect")
+
+    def __init__(self, tolerance: Tolerance):
+        CompiledTolerance.__init__(self, tolerance)
+        self.px = JSONPath.parse_str(tolerance["path"].strip())
+        self.count = tolerance.get("count", None)
+        self.has_expect = "expect" in tolerance
+        expect = tolerance.get("expect")
+        if self.has_expect and not isinstance(expect, list):
+            expect = [expect]
+        self.expect = expect
+
+    def check(self, value: Any) -> bool:
+        value = self.get_target_value(value)
 
         if isinstance(value, bytes):
             value = value.decode('utf-8')
@@ -318,31 +604,36 @@ def _(tolerance: dict, value: Any, configuration: Configuration = None,
             except json.decoder.JSONDecodeError:
                 pass
 
-        values = list(map(lambda m: m.current_value, px.match(value)))
+        values = list(map(lambda m: m.current_value, self.px.match(value)))
         result = len(values) > 0
-        if count_value is not None:
-            result = len(values) == count_value
+        if self.count is not None:
+            result = len(values) == self.count
 
-        expect = tolerance.get("expect")
-        if "expect" in tolerance:
-            if not isinstance(expect, list):
-                result = values == [expect]
-            else:
-                result = values == expect
+        if self.has_expect:
+            result = values == self.expect
 
         if result is False:
-            if "expect" in tolerance:
+            if self.has_expect:
                 logger.debug(
                     "jsonpath found '{}' but expected '{}'".format(
-                        str(values), str(tolerance["expect"])))
+                        str(values), str(self.tolerance["expect"])))
             else:
                 logger.debug("jsonpath found '{}'".format(str(values)))
 
         return result
-    elif tolerance_type == "range":
-        target = tolerance.get("target")
-        if target:
-            value = value.get(target, value)
+
+
+class RangeTolerance(CompiledTolerance):
+    keys = ("type", "target", "range")
+
+    def __init__(self, tolerance: Tolerance):
+        CompiledTolerance.__init__(self, tolerance)
+        the_range = tolerance["range"]
+        self.min_value = Decimal(the_range[0])
+        self.max_value = Decimal(the_range[1])
+
+    def check(self, value: Any) -> bool:
+        value = self.get_target_value(value)
 
         try:
             value = Decimal(value)
@@ -350,7 +641,39 @@ def _(tolerance: dict, value: Any, configuration: Configuration = None,
             logger.debug("range check expects a number value")
             return False
 
-        the_range = tolerance.get("range")
-        min_value = the_range[0]
-        max_value = the_range[1]
-        return Decimal(min_value) <= value <= Decimal(max_value)
+        return self.min_value <= value <= self.max_value
+
+
+def get_compiled_tolerance(tolerance: Tolerance) -> CompiledTolerance:
+    """
+    Return the compiled checker of the given dictionary tolerance, compiling
+    it when this was not done yet, for instance during the validation of
+    the experiment.
+
+    Compiled tolerances are cached in the activity index of the experiment
+    being validated or run in the current context, so they do not outlive
+    it. Without an index, the tolerance is compiled every time.
+
+    Raises :exc:`InvalidActivity` when the tolerance is invalid.
+    """
+    index = get_activity_index()
+    compiled = None
+    if index is not None:
+        compiled = index.tolerances.get(id(tolerance))
+    if compiled is not None and compiled.is_compiled_from(tolerance):
+        return compiled
+
+    tolerance_type = tolerance.get("type")
+    if tolerance_type == "regex":
+        return check_regex_pattern(tolerance)
+    elif tolerance_type == "jsonpath":
+        return check_json_path(tolerance)
+    elif tolerance_type == "range":
+        return check_range(tolerance)
+
+
+def cache_compiled_tolerance(compiled: CompiledTolerance) -> CompiledTolerance:
+    index = get_activity_index()
+    if index is not None:
+        index.tolerances[id(compiled.tolerance)] = compiled
+    return compiled
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+import contextvars
+from logzero import logger
+
+from chaoslib.types import Experiment, Journal, Run, Settings
+
+__all__ = ["JournalWriter", "assemble_journal", "get_journal_path",
+           "should_assemble_journal"]
+SECTIONS = ("run", "rollbacks")
+
+# the writer and the position of the activity in the experiment are context
+# variables so that they flow to activities run in the background, whether
+# in a pool of threads or as asyncio tasks
+current_writer = contextvars.ContextVar('journal_writer', default=None)
+current_position = contextvars.ContextVar('journal_position', default=None)
+
+
+class JournalWriter:
+    """
+    Sink that appends the journal of a running experiment to a file, as
+    JSON Lines, as soon as each of its parts is known. Each line is a record
+    with a `"type"` key:
+
+    * `"journal"`: the header of the journal, written first
+    * `"steady_state"`: the steady state hypothesis result, `"before"` or
+      `"after"` the method
+    * `"run"`: the run of an activity from the `"run"` or `"rollbacks"`
+      section, at a given position in that section
+    * `"output"`: a line printed by a process activity run with its output
+      forwarded to the journal, as it is printed
+    * `"end"`: the status and duration of the experiment, written last
+
+    Each record is flushed as soon as it is written so that a partial journal
+    survives an interrupted run. Use :func:`assemble_journal` to read it back
+    as a classic journal.
+
+    Records are written as they are: a record that cannot be serialized to
+    JSON raises a :exc:`TypeError` or a :exc:`ValueError` and is not written.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            if self._file.closed:
+                logger.debug(
+                    "Journal '{p}' is closed, dropping {t} record".format(
+                        p=self.path, t=record.get("type")))
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def get_journal_path(experiment: Experiment,
+                     settings: Settings = None) -> Optional[str]:
+    """
+    Path of the file the journal is streamed to. It is read from the
+    `runtime` section of the experiment first, then from the one of the
+    settings:
+
+    ```yaml
+    runtime:
+      journal:
+        path: ./journal.jsonl
+    ```
+
+    When not set, the journal is only kept in memory.
+    """
+    return get_journal_setting("path", experiment, settings)
+
+
+def should_assemble_journal(experiment: Experiment,
+                            settings: Settings = None) -> bool:
+    """
+    Whether the journal returned by a run streamed to a file is assembled
+    back from that file, so it has the same shape as a journal kept in
+    memory, outputs included. It is read from the `runtime` section of the
+    experiment first, then from the one of the settings:
+
+    ```yaml
+    runtime:
+      journal:
+        path: ./journal.jsonl
+        assemble: false
+    ```
+
+    Assembling reads the whole file back in memory at the end of the run.
+    When disabled, the run returns the journal it kept in memory, where the
+    runs streamed to the file do not hold their `"output"` anymore.
+    """
+    return get_journal_setting("assemble", experiment, settings) is not False
+
+
+def get_journal_setting(key: str, experiment: Experiment,
+                        settings: Settings = None) -> Any:
+    for source in (experiment, settings):
+        if not source:
+            continue
+        journal = source.get("runtime", {}).get("journal", {})
+        if journal.get(key) is not None:
+            return journal[key]
+
+
+def open_journal(journal: Journal, path: str) -> JournalWriter:
+    """
+    Start streaming the given journal to the file at `path` from within the
+    current context.
+    """
+    logger.debug("Streaming the journal to '{p}'".format(p=path))
+    writer = JournalWriter(path)
+    current_writer.set(writer)
+
+    header = dict(journal)
+    for key in SECTIONS + ("steady_states",):
+        header.pop(key, None)
+    writer.write({"type": "journal", "journal": header})
+    return writer
+
+
+def close_journal(journal: Journal, assemble: bool = True) -> Journal:
+    """
+    Write the final status of the journal and stop streaming it. Return the
+    classic journal assembled from the streamed file or, when `assemble` is
+    not set, the given journal.
+    """
+    writer = current_writer.get()
+    if not writer:
+        return journal
+
+    writer.write({
+        "type": "end",
+        "status": journal["status"],
+        "deviated": journal["deviated"],
+        "end": journal.get("end"),
+        "duration": journal.get("duration")
+    })
+    writer.close()
+    current_writer.set(None)
+    if not assemble:
+        return journal
+
+    assembled = assemble_journal(writer.path)
+    # outputs which could not be streamed were kept in memory instead
+    for when, state in journal["steady_states"].items():
+        if state is not None and assembled["steady_states"][when]:
+            restore_outputs(
+                assembled["steady_states"][when]["probes"],
+                state.get("probes", []))
+    for section in SECTIONS:
+        restore_outputs(assembled[section], journal.get(section, []))
+    return assembled
+
+
+def discard_journal():
+    """
+    Stop streaming the journal without writing its final status, the streamed
+    file is left as a partial journal.
+    """
+    writer = current_writer.get()
+    if writer:
+        writer.close()
+        current_writer.set(None)
+
+
+@contextmanager
+def journal_position(section: str, position: int):
+    """
+    Activities run within this context are recorded at the given position
+    of a section of the journal, so that their declaration order is kept
+    even when they complete out of order in the background.
+    """
+    token = current_position.set((section, position))
+    try:
+        yield
+    finally:
+        current_position.reset(token)
+
+
+def record_run(run: Run) -> Run:
+    """
+    Stream the run of a method or rollback activity. When streamed, the
+    output is only kept on disk and the returned run does not hold it
+    anymore.
+    """
+    writer = current_writer.get()
+    position = current_position.get()
+    if not writer or not position:
+        return run
+
+    section, index = position
+    record = {"type": "run", "section": section, "position": index}
+    try:
+        writer.write(dict(record, run=run))
+    except (TypeError, ValueError) as x:
+        logger.warning(
+            "Output of activity '{n}' cannot be written to the journal, it "
+            "is kept in memory instead: {x}".format(
+                n=run["activity"].get("name"), x=str(x)))
+        writer.write(dict(record, run=compact_run(run)))
+        return run
+    return compact_run(run)
+
+
+def record_output(activity_name: str, stream: str, line: str):
+    """
+    Stream a line printed by an activity on its `"stdout"` or `"stderr"`
+    stream while it is still running. Those records are not part of the
+    assembled journal.
+    """
+    writer = current_writer.get()
+    if not writer:
+        return
+
+    record = {
+        "type": "output", "activity": activity_name, "stream": stream,
+        "line": line}
+    position = current_position.get()
+    if position:
+        record["section"], record["position"] = position
+    writer.write(record)
+
+
+def record_steady_state(when: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stream a steady state hypothesis result. When streamed, the outputs of
+    its probes are only kept on disk.
+    """
+    writer = current_writer.get()
+    if not writer or state is None:
+        return state
+
+    record = {"type": "steady_state", "when": when}
+    try:
+        writer.write(dict(record, state=state))
+    except (TypeError, ValueError) as x:
+        logger.warning(
+            "Outputs of the {w} steady state probes cannot be written to the "
+            "journal, they are kept in memory instead: {x}".format(
+                w=when, x=str(x)))
+        compacted = dict(state)
+        compacted["probes"] = [
+            compact_run(r) for r in state.get("probes", [])]
+        writer.write(dict(record, state=compacted))
+        return state
+
+    state = dict(state)
+    state["probes"] = [compact_run(r) for r in state.get("probes", [])]
+    return state
+
+
+def compact_run(run: Run) -> Run:
+    run = dict(run)
+    run.pop("output", None)
+    return run
+
+
+def restore_outputs(assembled: List[Run], runs: List[Run]):
+    if len(assembled) != len(runs):
+        return
+
+    for streamed, run in zip(assembled, runs):
+        if "output" in run and "output" not in streamed:
+            streamed["output"] = run["output"]
+
+
+def assemble_journal(path: str) -> Journal:
+    """
+    Read a journal streamed as JSON Lines and assemble it back into a
+    classic journal. A journal which was not streamed to its end, for
+    instance because the run was interrupted, is assembled with what could
+    be read and its `"status"` is left to `None`.
+    """
+    journal = {}
+    steady_states = {"before": None, "after": None}
+    runs = {section: [] for section in SECTIONS}
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                record = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                # most likely the last line, cut short by an interruption
+                logger.debug(
+                    "Skipping unreadable journal record in '{p}'".format(
+                        p=path))
+                continue
+
+            record_type = record.get("type")
+            if record_type == "journal":
+                journal.update(record["journal"])
+            elif record_type == "steady_state":
+                steady_states[record["when"]] = record["state"]
+            elif record_type == "run":
+                runs[record["section"]].append(
+                    (record["position"], record["run"]))
+            elif record_type == "end":
+                record.pop("type")
+                journal.update(record)
+
+    journal.setdefault("status", None)
+    journal.setdefault("deviated", False)
+    journal["steady_states"] = steady_states
+    for section in SECTIONS:
+        journal[section] = [
+            r for (_, r) in sorted(runs[section], key=lambda r: r[0])]
+
+    return journal
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import io
+import os
 import os.path
+import tempfile
+from typing import Optional
 from urllib.parse import urlparse
 
 from chaoslib.exceptions import InvalidSource
@@ -13,6 +17,9 @@ try:
 except ImportError:
     import json
     from json.decoder import JSONDecodeError
+# the C loader, when PyYAML was built against libyaml, is much faster than
+# the pure Python one and just as safe
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 from chaoslib.control import controls
 from chaoslib.exceptions import InvalidExperiment
@@ -22,19 +29,37 @@ from chaoslib.types import Experiment, Settings
 __all__ = ["load_experiment"]
 
 
-def parse_experiment_from_file(path: str) -> Experiment:
+def parse_experiment_from_file(path: str,
+                               cache_dir: str = None) -> Experiment:
     """
     Parse the given experiment from `path` and return it.
+
+    When `cache_dir` is set, parsed YAML experiments are cached in that
+    directory, as JSON which is much faster to load, and parsed again only
+    once the file's modification time or size have changed. The file itself
+    is not read when its cached content is used.
     """
-    with io.open(path) as f:
-        p, ext = os.path.splitext(path)
-        if ext in (".yaml", ".yml"):
+    p, ext = os.path.splitext(path)
+    if ext in (".yaml", ".yml"):
+        cache_path = None
+        if cache_dir:
+            cache_path = get_parse_cache_path(path, cache_dir)
+            experiment = read_parse_cache(cache_path)
+            if experiment is not None:
+                return experiment
+
+        with io.open(path) as f:
             try:
-                return yaml.safe_load(f)
+                experiment = yaml.load(f, Loader=SafeLoader)
             except yaml.YAMLError as ye:
                 raise InvalidSource(
                     "Failed parsing YAML experiment: {}".format(str(ye)))
-        elif ext == ".json":
+
+        if cache_path:
+            write_parse_cache(cache_path, experiment)
+        return experiment
+    elif ext == ".json":
+        with io.open(path) as f:
             return json.load(f)
 
     raise InvalidExperiment(
@@ -51,7 +76,7 @@ def parse_experiment_from_http(response: requests.Response) -> Experiment:
         return response.json()
     elif 'application/x-yaml' in content_type or 'text/yaml' in content_type:
         try:
-            return yaml.safe_load(response.text)
+            return yaml.load(response.text, Loader=SafeLoader)
         except yaml.YAMLError as ye:
             raise InvalidSource(
                 "Failed parsing YAML experiment: {}".format(str(ye)))
@@ -61,7 +86,7 @@ def parse_experiment_from_http(response: requests.Response) -> Experiment:
             return json.loads(content)
         except JSONDecodeError:
             try:
-                return yaml.safe_load(content)
+                return yaml.load(content, Loader=SafeLoader)
             except yaml.YAMLError:
                 pass
 
@@ -90,10 +115,20 @@ def load_experiment(experiment_source: str,
         type: digest
         value: UIY
     ```
+
+    Parsed YAML files can be cached on disk by setting the directory to
+    cache them into:
+
+    ```yaml
+    runtime:
+      loader:
+        cache_directory: ~/.chaostoolkit/cache
+    ```
     """
     with controls(level="loader", context=experiment_source) as control:
         if os.path.exists(experiment_source):
-            parsed = parse_experiment_from_file(experiment_source)
+            parsed = parse_experiment_from_file(
+                experiment_source, get_parse_cache_dir(settings))
             control.with_state(parsed)
             return parsed
 
@@ -126,3 +161,90 @@ def load_experiment(experiment_source: str,
         parsed = parse_experiment_from_http(r)
         control.with_state(parsed)
         return parsed
+
+
+###############################################################################
+# Internals
+###############################################################################
+def get_parse_cache_dir(settings: Settings = None) -> Optional[str]:
+    if not settings:
+        return None
+
+    cache_dir = settings.get("runtime", {}).get("loader", {}).get(
+        "cache_directory")
+    if cache_dir:
+        return os.path.expanduser(cache_dir)
+
+
+def get_parse_cache_path(path: str, cache_dir: str) -> str:
+    """
+    Path to the cached parsed content of the experiment file at `path`. It
+    changes with the file's modification time or size so stale entries are
+    never read. It starts with a digest of the file's real path, shared by
+    all its entries, so older entries can be pruned.
+    """
+    stat = os.stat(path)
+    realpath = os.path.realpath(path)
+    version = "{m}:{s}".format(m=stat.st_mtime_ns, s=stat.st_size)
+    return os.path.join(cache_dir, "{p}-{v}.json".format(
+        p=hashlib.sha256(realpath.encode("utf-8")).hexdigest(),
+        v=hashlib.sha256(version.encode("utf-8")).hexdigest()[:16]))
+
+
+def read_parse_cache(cache_path: str) -> Optional[Experiment]:
+    try:
+        with io.open(cache_path, encoding="utf-8") as f:
+            experiment = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    logger.debug("Loaded parsed experiment from '{}'".format(cache_path))
+    return experiment
+
+
+def write_parse_cache(cache_path: str, experiment: Experiment):
+    # YAML supports types, such as dates or non-string keys, that JSON cannot
+    # represent faithfully so those experiments are never cached
+    try:
+        content = json.dumps(experiment)
+        faithful = json.loads(content) == experiment
+    except (TypeError, ValueError):
+        faithful = False
+    if not faithful:
+        logger.debug("Parsed experiment cannot be cached as JSON")
+        return
+
+    cache_dir, name = os.path.split(cache_path)
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                "w", dir=cache_dir, encoding="utf-8", suffix=".tmp",
+                delete=False) as f:
+            tmp_path = f.name
+            f.write(content)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        logger.debug(
+            "Failed to cache parsed experiment to '{}'".format(cache_path),
+            exc_info=True)
+        if tmp_path:
+            remove_file(tmp_path)
+        return
+
+    # entries of previous versions of the same file are never read again
+    prefix = name.split("-", 1)[0] + "-"
+    try:
+        entries = os.listdir(cache_dir)
+    except OSError:
+        return
+    for entry in entries:
+        if entry.startswith(prefix) and entry != name:
+            remove_file(os.path.join(cache_dir, entry))
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        logger.debug("Failed to remove '{}'".format(path), exc_info=True)
@@ -1,17 +1,28 @@
 # -*- coding: utf-8 -*-
+import atexit
 from datetime import datetime, timezone
 from enum import Enum
-import importlib
 import inspect
-from typing import Any, Dict
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from logzero import logger
 import requests
 
+from chaoslib.provider.http import use_http_session
+from chaoslib.provider.python import resolve_python_function
 from chaoslib.types import EventPayload, Settings
 
 __all__ = ["DiscoverFlowEvent", "InitFlowEvent", "RunFlowEvent",
-           "ValidateFlowEvent", "notify"]
+           "ValidateFlowEvent", "notify", "NotificationDispatcher",
+           "flush_notifications"]
+DEFAULT_TIMEOUT = (2, 5)
+_dispatcher = None  # type: Optional[NotificationDispatcher]
+_dispatcher_lock = threading.Lock()
+# plugins that could not be resolved, with the reason why
+_failed_plugins = {}  # type: Dict[Tuple[str, str], str]
 
 
 class FlowEvent(Enum):
@@ -102,6 +113,23 @@ def notify(settings: Settings, event: FlowEvent, payload: Any = None,
     - `"phase"`: which phase this event was raised from
     - `"error"`: if an error was passed on to the function
     - `"ts"`: a UTC timestamp of when the event was raised
+
+    Notifications can be sent from background threads rather than from the
+    caller's so that slow channels do not hold the experiment back:
+
+    ```yaml
+    runtime:
+      notifications:
+        background: true
+        max_workers: 4
+        max_queue_size: 1000
+        flush_timeout: 10
+    ```
+
+    In that case, this function returns as soon as the event is queued. When
+    the queue is full, the event is dropped. Events not sent yet are flushed
+    when the process exits, for at most `flush_timeout` seconds. See
+    :class:`NotificationDispatcher`.
     """
     if not settings:
         return
@@ -130,19 +158,170 @@ def notify(settings: Settings, event: FlowEvent, payload: Any = None,
     elif event_class is ValidateFlowEvent:
         event_payload["phase"] = "validate"
 
+    dispatcher = get_notification_dispatcher(settings)
+
     for channel in notification_channels:
         events = channel.get("events")
         if events and event.value not in events:
             continue
 
-        channel_type = channel.get("type")
-        if channel_type == "http":
-            notify_with_http(channel, event_payload)
-        elif channel_type == "plugin":
-            notify_via_plugin(channel, event_payload)
+        if dispatcher:
+            dispatcher.dispatch(channel, event_payload)
+        else:
+            send_notifications(channel, [event_payload])
+
+
+def flush_notifications(timeout: float = None) -> bool:
+    """
+    Wait for the notifications queued so far to be sent, for at most
+    `timeout` seconds. Returns `False` when some could not be sent in time.
+    """
+    dispatcher = _dispatcher
+    if not dispatcher:
+        return True
+    return dispatcher.flush(timeout)
+
+
+class NotificationDispatcher:
+    """
+    Send notifications from a pool of background threads.
 
+    Events are queued in a bounded queue and dropped, with a debug message,
+    when it is full. Each worker takes as many events as are waiting, up to
+    `batch_size`, and sends those of the same channel together. A HTTP
+    channel declaring `batch: true` then receives them as a single JSON
+    list. Other channels are still called once per event.
+    """
+    def __init__(self, max_workers: int = 4, max_queue_size: int = 1000,
+                 batch_size: int = 20):
+        self.batch_size = batch_size
+        self._queue = queue.Queue(max_queue_size)
+        self._closed = False
+        self._workers = []
+        for i in range(max_workers):
+            t = threading.Thread(
+                target=self._run, name="notification-{}".format(i),
+                daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def dispatch(self, channel: Dict[str, Any], payload: EventPayload):
+        if self._closed:
+            logger.debug("Notification dispatcher is closed, dropping event")
+            return
 
-def notify_with_http(channel: Dict[str, str], payload: EventPayload):
+        try:
+            self._queue.put_nowait((channel, payload))
+        except queue.Full:
+            logger.debug(
+                "Notification queue is full, dropping '{}' event".format(
+                    payload.get("name")))
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait for all queued events to be sent, for at most `timeout`
+        seconds. Returns `False` when some are still pending.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        q = self._queue
+        with q.all_tasks_done:
+            while q.unfinished_tasks:
+                if deadline is None:
+                    q.all_tasks_done.wait()
+                    continue
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    logger.debug(
+                        "{} notifications could not be sent in time".format(
+                            q.unfinished_tasks))
+                    return False
+                q.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float = None) -> bool:
+        """
+        Stop accepting events and flush those already queued.
+        """
+        self._closed = True
+        return self.flush(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                for channel, payloads in group_by_channel(batch):
+                    try:
+                        send_notifications(channel, payloads)
+                    except Exception:
+                        logger.debug(
+                            "failed sending notifications", exc_info=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+def get_notification_dispatcher(
+        settings: Settings) -> Optional[NotificationDispatcher]:
+    """
+    Dispatcher of background notifications, created the first time it is
+    needed, or `None` when notifications are sent from the caller's thread.
+    """
+    global _dispatcher
+
+    config = settings.get("runtime", {}).get("notifications", {})
+    if not config.get("background"):
+        return None
+
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher(
+                max_workers=config.get("max_workers", 4),
+                max_queue_size=config.get("max_queue_size", 1000),
+                batch_size=config.get("batch_size", 20))
+            flush_timeout = config.get("flush_timeout", 10)
+            atexit.register(_dispatcher.close, flush_timeout)
+    return _dispatcher
+
+
+def send_notifications(channel: Dict[str, Any],
+                       payloads: List[EventPayload]):
+    channel_type = channel.get("type")
+    if channel_type == "http":
+        if channel.get("batch") and len(payloads) > 1:
+            notify_with_http(channel, payloads)
+        else:
+            for payload in payloads:
+                notify_with_http(channel, payload)
+    elif channel_type == "plugin":
+        for payload in payloads:
+            notify_via_plugin(channel, payload)
+
+
+def group_by_channel(batch: List[Tuple[Dict[str, Any], EventPayload]]) \
+        -> List[Tuple[Dict[str, Any], List[EventPayload]]]:
+    """
+    Group the payloads of a batch per channel, keeping their order.
+    """
+    groups = []
+    for channel, payload in batch:
+        for c, payloads in groups:
+            if c is channel:
+                payloads.append(payload)
+                break
+        else:
+            groups.append((channel, [payload]))
+    return groups
+
+
+def notify_with_http(channel: Dict[str, str],
+                     payload: Union[EventPayload, List[EventPayload]]):
     """
     Call a notification endpoint over HTTP.
 
@@ -153,26 +332,38 @@ def notify_with_http(channel: Dict[str, str], payload: EventPayload):
     You may also set `forward_event_payload` to send a GET request instead of
     the default POST. In that case, the event payload will not be forwarded
     along.
+
+    When given a list of payloads, as batched by the
+    :class:`NotificationDispatcher`, they are posted as a single JSON list.
+
+    Connections to the endpoint are pooled and reused between notifications.
+    The session is checked out for the duration of the call so it is not
+    closed while a notification is still being sent.
     """
     url = channel.get("url")
     headers = channel.get("headers")
     verify_tls = channel.get("verify_tls", True)
     forward_event_payload = channel.get("forward_event_payload", True)
+    timeout = channel.get("timeout", DEFAULT_TIMEOUT)
+    if isinstance(timeout, list):
+        timeout = tuple(timeout)
 
     if url:
         try:
-            if forward_event_payload:
-                r = requests.post(
-                    url, headers=headers, verify=verify_tls, timeout=(2, 5),
-                    json=payload)
-            else:
-                r = requests.get(
-                    url, headers=headers, verify=verify_tls, timeout=(2, 5))
-
-            if r.status_code > 399:
-                logger.debug(
-                    "Notification sent to '{u}' failed with '{t}'".format(
-                        u=url, t=r.text))
+            with use_http_session(url, verify_tls) as s:
+                if forward_event_payload:
+                    r = s.post(
+                        url, headers=headers, verify=verify_tls,
+                        timeout=timeout, json=payload)
+                else:
+                    r = s.get(
+                        url, headers=headers, verify=verify_tls,
+                        timeout=timeout)
+
+                if r.status_code > 399:
+                    logger.debug(
+                        "Notification sent to '{u}' failed with '{t}'".format(
+                            u=url, t=r.text))
         except requests.exceptions.RequestException as err:
             logger.debug(
                 "failed calling notification endpoint", exc_info=err)
@@ -194,21 +385,46 @@ def notify_via_plugin(channel: Dict[str, str], payload: EventPayload):
     mod_name = channel.get("module")
     func_name = channel.get("func", "notify")
 
+    func = resolve_notification_plugin(mod_name, func_name)
+    if func:
+        try:
+            func(channel, payload)
+        except Exception as err:
+            logger.debug(
+                "failed calling notification plugin", exc_info=err)
+
+
+def resolve_notification_plugin(mod_name: str,
+                                func_name: str) -> Optional[Callable]:
+    """
+    Resolve the function of a notification plugin, or return `None` when it
+    cannot be found.
+
+    Successful resolutions are cached alongside those of Python activities.
+    Failures are cached too so that a missing plugin is not imported again
+    on every event.
+    """
+    key = (mod_name, func_name)
+    error = _failed_plugins.get(key)
+    if error:
+        logger.debug(error)
+        return None
+
     try:
-        mod = importlib.import_module(mod_name)
+        func = resolve_python_function(mod_name, func_name).func
     except ImportError:
-        logger.debug("could not find Python plugin '{mod}' "
-                     "for notification".format(mod=mod_name))
-    else:
-        funcs = inspect.getmembers(mod, inspect.isfunction)
-        for (name, f) in funcs:
-            if name == func_name:
-                try:
-                    f(channel, payload)
-                except Exception as err:
-                    logger.debug(
-                        "failed calling notification plugin", exc_info=err)
-                break
-        else:
-            logger.debug("could not find function '{f}' in plugin '{mod}' "
-                         "for notification".format(mod=mod_name, f=func_name))
+        error = "could not find Python plugin '{mod}' for notification".format(
+            mod=mod_name)
+    except AttributeError:
+        func = None
+
+    if not error and not inspect.isfunction(func):
+        error = "could not find function '{f}' in plugin '{mod}' " \
+                "for notification".format(mod=mod_name, f=func_name)
+
+    if error:
+        _failed_plugins[key] = error
+        logger.debug(error)
+        return None
+
+    return func
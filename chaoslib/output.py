@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+import hashlib
+import os
+import os.path
+import tempfile
+from typing import Any, Dict, IO, Optional
+
+from logzero import logger
+
+from chaoslib import decode_bytes
+from chaoslib.settings import get_loaded_settings
+from chaoslib.types import Activity
+
+__all__ = ["OutputSpill", "OutputTail", "get_output_limit",
+           "get_spill_directory"]
+CHUNK_SIZE = 64 * 1024
+DEFAULT_SPILL_DIRECTORY = os.path.join(
+    tempfile.gettempdir(), "chaostoolkit", "outputs")
+
+
+class OutputSpill:
+    """
+    Capture a stream of bytes, keeping at most `limit` of them in memory.
+
+    Once the stream grows over that limit, it is entirely written to a file,
+    named after the SHA-256 digest of its content, in the spill directory.
+    Only the first `limit` bytes are then kept in memory as a preview.
+
+    Use it as a context manager so the spill file is removed when the
+    capture is abandoned on an error.
+    """
+    def __init__(self, limit: int, directory: str = None):
+        self.limit = limit
+        self.directory = directory or get_spill_directory()
+        self.size = 0
+        self._preview = bytearray()
+        self._digest = hashlib.sha256()
+        self._file = None
+        self._closed = False
+
+    def __enter__(self) -> 'OutputSpill':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.discard()
+
+    @property
+    def preview(self) -> bytes:
+        return bytes(self._preview)
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def decode(self, source: str = None) -> str:
+        """
+        Decode the captured bytes. A preview may be cut in the middle of a
+        character so it is decoded leniently as UTF-8.
+        """
+        if self.spilled:
+            return self.preview.decode("utf-8", errors="replace")
+        return decode_bytes(self.preview, source=source)
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+
+        self.size = self.size + len(chunk)
+        self._digest.update(chunk)
+
+        if self._file is None:
+            room = self.limit - len(self._preview)
+            if len(chunk) <= room:
+                self._preview.extend(chunk)
+                return
+
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = tempfile.NamedTemporaryFile(
+                dir=self.directory, prefix=".spill-", delete=False)
+            self._file.write(self._preview)
+            self._preview.extend(chunk[:room])
+
+        self._file.write(chunk)
+
+    def read_from(self, f: IO[bytes]):
+        """
+        Capture the content of the given binary file, from its current
+        position.
+        """
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self.write(chunk)
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """
+        Complete the capture and return the reference to the file the stream
+        was spilled to, or `None` when it fit within the limit.
+        """
+        if self._file is None:
+            return None
+
+        self._file.close()
+        digest = self._digest.hexdigest()
+        path = os.path.join(self.directory, digest)
+        # the same content always ends up in the same file
+        os.replace(self._file.name, path)
+        self._closed = True
+        logger.debug(
+            "Output of {s} bytes is over the {l} bytes limit, spilled "
+            "to '{p}'".format(s=self.size, l=self.limit, p=path))
+        return {"path": path, "sha256": digest, "size": self.size}
+
+    def discard(self):
+        """
+        Abandon the capture and remove its spill file, unless the capture was
+        already completed.
+        """
+        if self._file is None or self._closed:
+            return
+
+        self._file.close()
+        try:
+            os.remove(self._file.name)
+        except FileNotFoundError:
+            pass
+        self._closed = True
+
+
+class OutputTail:
+    """
+    Capture a stream of bytes, keeping only its last `limit` bytes in memory
+    as a ring buffer of chunks. Earlier bytes are dropped as the stream
+    grows.
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.size = 0
+        self._kept = 0
+        self._chunks = deque()
+
+    @property
+    def dropped(self) -> int:
+        return self.size - self._kept
+
+    @property
+    def tail(self) -> bytes:
+        return b"".join(self._chunks)
+
+    def decode(self, source: str = None) -> str:
+        """
+        Decode the captured bytes. Once bytes were dropped, the tail may
+        start in the middle of a character so it is decoded leniently as
+        UTF-8.
+        """
+        if self.dropped:
+            return self.tail.decode("utf-8", errors="replace")
+        return decode_bytes(self.tail, source=source)
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+
+        self.size = self.size + len(chunk)
+        if len(chunk) >= self.limit:
+            self._chunks.clear()
+            chunk = chunk[-self.limit:]
+            self._kept = 0
+
+        self._chunks.append(chunk)
+        self._kept = self._kept + len(chunk)
+
+        while self._kept > self.limit:
+            excess = self._kept - self.limit
+            first = self._chunks.popleft()
+            if len(first) > excess:
+                self._chunks.appendleft(first[excess:])
+                self._kept = self._kept - excess
+            else:
+                self._kept = self._kept - len(first)
+
+
+def get_output_limit(activity: Activity) -> Optional[int]:
+    """
+    Maximum number of bytes of a process stream or of a HTTP response body
+    to keep in the run of the given activity. It is read from the
+    `max_output_size` property of the activity first, then from the
+    `runtime` section of the settings:
+
+    ```yaml
+    runtime:
+      output:
+        max_size: 1048576
+        spill_directory: /var/tmp/chaostoolkit
+    ```
+
+    When neither is set, outputs are kept as-is.
+    """
+    limit = activity.get("max_output_size")
+    if limit:
+        return limit
+
+    settings = get_loaded_settings() or {}
+    return settings.get("runtime", {}).get("output", {}).get("max_size")
+
+
+def get_spill_directory() -> str:
+    """
+    Directory where outputs over their limit are written to, read from the
+    `runtime.output.spill_directory` value of the settings.
+    """
+    settings = get_loaded_settings() or {}
+    directory = settings.get("runtime", {}).get("output", {}).get(
+        "spill_directory")
+    return directory or DEFAULT_SPILL_DIRECTORY
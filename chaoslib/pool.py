@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
+from typing import Any, Callable, Dict
+
+import contextvars
+from logzero import logger
+
+from chaoslib.types import Experiment, Settings
+
+__all__ = ["WorkerPool", "get_max_workers"]
+DEFAULT_MAX_WORKERS = 32
+
+
+class WorkerPool(ThreadPoolExecutor):
+    """
+    Bounded pool of threads that runs the submitted functions within the
+    context of the caller and keeps track of how long they were queued.
+
+    Once more functions are submitted than there are workers, they are queued
+    until a worker becomes available.
+    """
+    def __init__(self, max_workers: int, name: str = "background"):
+        ThreadPoolExecutor.__init__(self, max_workers)
+        self.name = name
+        self.max_workers = max_workers
+        self._metrics_lock = threading.Lock()
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.max_queued = 0
+        self.total_wait = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        # contexts do not flow to pool threads on their own, we want the
+        # function to see the same context variables as the caller
+        ctx = contextvars.copy_context()
+        submitted_at = time.time()
+
+        def run():
+            self._track_start(time.time() - submitted_at)
+            try:
+                return ctx.run(fn, *args, **kwargs)
+            finally:
+                self._track_completion()
+
+        with self._metrics_lock:
+            self.submitted = self.submitted + 1
+            queued = self.submitted - self.started
+            self.max_queued = max(self.max_queued, queued)
+
+        return ThreadPoolExecutor.submit(self, run)
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Queueing metrics of this pool.
+        """
+        with self._metrics_lock:
+            return {
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "started": self.started,
+                "completed": self.completed,
+                "queued": self.submitted - self.started,
+                "max_queued": self.max_queued,
+                "total_wait": self.total_wait,
+                "average_wait": (
+                    self.total_wait / self.started if self.started else 0.0)
+            }
+
+    def shutdown(self, wait: bool = True):
+        ThreadPoolExecutor.shutdown(self, wait=wait)
+        logger.debug(
+            "{n} pool metrics: {m}".format(n=self.name, m=self.metrics))
+
+    def _track_start(self, waited: float):
+        with self._metrics_lock:
+            self.started = self.started + 1
+            self.total_wait = self.total_wait + waited
+
+    def _track_completion(self):
+        with self._metrics_lock:
+            self.completed = self.completed + 1
+
+
+def get_max_workers(experiment: Experiment, settings: Settings = None) -> int:
+    """
+    Maximum number of threads used to run background activities. It is read
+    from the `runtime` section of the experiment first, then from the one
+    of the settings:
+
+    ```yaml
+    runtime:
+      background:
+        max_workers: 16
+    ```
+
+    Defaults to 32.
+    """
+    for source in (experiment, settings):
+        if not source:
+            continue
+        background = source.get("runtime", {}).get("background", {})
+        if background.get("max_workers"):
+            return background["max_workers"]
+    return DEFAULT_MAX_WORKERS
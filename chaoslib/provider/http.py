@@ -1,18 +1,51 @@
 # -*- coding: utf-8 -*-
-from typing import Any
+import asyncio
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, Tuple
+from urllib.parse import urlparse
 import urllib3
 
 from logzero import logger
 import requests
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
 
 from chaoslib import substitute
-from chaoslib.exceptions import ActivityFailed, InvalidActivity
-from chaoslib.types import Activity, Configuration, Secrets
+from chaoslib.deadline import get_timeout
+from chaoslib.exceptions import ActivityFailed, ActivityTimeout, \
+    InvalidActivity
+from chaoslib.output import CHUNK_SIZE, OutputSpill, get_output_limit
+from chaoslib.types import Activity, Configuration, Secrets, Settings
 
 
-__all__ = ["run_http_activity", "validate_http_activity"]
+__all__ = ["run_http_activity", "run_http_activity_async",
+           "validate_http_activity", "configure_http_sessions",
+           "open_http_sessions", "get_http_session", "use_http_session",
+           "close_http_sessions", "close_async_http_sessions"]
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# sessions are shared process-wide so that repeated calls against the same
+# endpoint can reuse their connections rather than paying a new TCP/TLS
+# handshake every time
+_sessions = {}  # type: Dict[Tuple[Any, ...], Dict[str, Any]]
+_sessions_lock = threading.Lock()
+# number of experiment runs currently using the pooled sessions
+_active_runs = 0
+_session_options = {
+    "pool_connections": 10,
+    "pool_maxsize": 10,
+    "idle_timeout": 60
+}
+# aiohttp sessions are bound to the event loop they were created in
+_async_sessions = {}  # type: Dict[Tuple[Any, ...], Any]
+
 
 def run_http_activity(activity: Activity, configuration: Configuration,
                       secrets: Secrets) -> Any:
@@ -25,13 +58,18 @@ def run_http_activity(activity: Activity, configuration: Configuration,
     Raises :exc:`ActivityFailed` when a timeout occurs for the request or when
     the endpoint returns a status in the 400 or 500 ranges.
 
+    When the output of the activity is limited, see
+    :func:`chaoslib.output.get_output_limit`, the body is streamed and only
+    that many bytes of it are returned. A body going over the limit is
+    spilled to disk and referenced in the `"spilled"` entry of the result.
+
     This should be considered as a private function.
     """
     provider = activity["provider"]
     url = substitute(provider["url"], configuration, secrets)
     method = provider.get("method", "GET").upper()
     headers = substitute(provider.get("headers", None), configuration, secrets)
-    timeout = provider.get("timeout", None)
+    timeout = get_timeout(provider.get("timeout", None))
     arguments = provider.get("arguments", None)
     verify_tls = provider.get("verify_tls", True)
     max_retries = provider.get("max_retries", 0)
@@ -42,30 +80,39 @@ def run_http_activity(activity: Activity, configuration: Configuration,
     if isinstance(timeout, list):
         timeout = tuple(timeout)
 
+    limit = get_output_limit(activity)
+    stream = bool(limit)
+
     try:
-        s = requests.Session()
-        a = requests.adapters.HTTPAdapter(max_retries=max_retries)
-        s.mount("http://", a)
-        s.mount("https://", a)
-        if method == "GET":
-            r = s.get(
-                url, params=arguments, headers=headers, timeout=timeout,
-                verify=verify_tls)
-        else:
-            if headers and headers.get("Content-Type") == "application/json":
+        with use_http_session(url, verify_tls, max_retries) as s:
+            if method == "GET":
+                r = s.get(
+                    url, params=arguments, headers=headers, timeout=timeout,
+                    verify=verify_tls, stream=stream)
+            elif headers and headers.get("Content-Type") == "application/json":
                 r = s.request(
                     method, url, json=arguments, headers=headers,
-                    timeout=timeout, verify=verify_tls)
+                    timeout=timeout, verify=verify_tls, stream=stream)
             else:
                 r = s.request(
                     method, url, data=arguments, headers=headers,
-                    timeout=timeout, verify=verify_tls)
+                    timeout=timeout, verify=verify_tls, stream=stream)
 
-        body = None
-        if r.headers.get("Content-Type") == "application/json":
-            body = r.json()
-        else:
-            body = r.text
+            body = None
+            spilled = None
+            if limit:
+                with OutputSpill(limit) as spill:
+                    try:
+                        for chunk in r.iter_content(CHUNK_SIZE):
+                            spill.write(chunk)
+                    finally:
+                        r.close()
+                    body, spilled = read_limited_body(
+                        spill, r.headers.get("Content-Type"), r.encoding)
+            elif r.headers.get("Content-Type") == "application/json":
+                body = r.json()
+            else:
+                body = r.text
 
         # kind warning to the user that this HTTP call may be invalid
         # but not during the hypothesis check because that could also be
@@ -77,16 +124,116 @@ def run_http_activity(activity: Activity, configuration: Configuration,
                 "above 400. This may indicate some error and not "
                 "what you expected. Please have a look at the logs.")
 
-        return {
+        result = {
             "status": r.status_code,
             "headers": dict(**r.headers),
             "body": body
         }
+        if spilled:
+            result["spilled"] = {"body": spilled}
+        return result
     except requests.exceptions.ConnectionError as cex:
         raise ActivityFailed("failed to connect to {u}: {x}".format(
             u=url, x=str(cex)))
     except requests.exceptions.Timeout:
-        raise ActivityFailed("activity took too long to complete")
+        raise ActivityTimeout("activity took too long to complete")
+
+
+async def run_http_activity_async(activity: Activity,
+                                  configuration: Configuration,
+                                  secrets: Secrets) -> Any:
+    """
+    Run a HTTP activity without blocking the event loop.
+
+    When the `aiohttp` package is installed, the call is made natively with
+    a session shared by all activities calling the same endpoint from the
+    current event loop. Otherwise, :func:`run_http_activity` is run in the
+    loop's default executor.
+
+    The result has the same shape as the one returned by
+    :func:`run_http_activity`.
+
+    This should be considered as a private function.
+    """
+    loop = asyncio.get_event_loop()
+    if not HAS_AIOHTTP:
+        return await loop.run_in_executor(
+            None, run_http_activity, activity, configuration, secrets)
+
+    provider = activity["provider"]
+    url = substitute(provider["url"], configuration, secrets)
+    method = provider.get("method", "GET").upper()
+    headers = substitute(provider.get("headers", None), configuration, secrets)
+    timeout = get_timeout(provider.get("timeout", None))
+    arguments = provider.get("arguments", None)
+    verify_tls = provider.get("verify_tls", True)
+    max_retries = provider.get("max_retries", 0)
+
+    if arguments and (configuration or secrets):
+        arguments = substitute(arguments, configuration, secrets)
+
+    if isinstance(timeout, (list, tuple)):
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=timeout[0], sock_read=timeout[1])
+    else:
+        timeout = aiohttp.ClientTimeout(total=timeout)
+
+    kwargs = {"headers": headers, "timeout": timeout}
+    if not verify_tls:
+        kwargs["ssl"] = False
+
+    if method == "GET":
+        if arguments:
+            kwargs["params"] = {k: str(v) for k, v in arguments.items()}
+    elif headers and headers.get("Content-Type") == "application/json":
+        kwargs["json"] = arguments
+    else:
+        kwargs["data"] = arguments
+
+    limit = get_output_limit(activity)
+    spilled = None
+
+    s = get_async_http_session(loop, url, verify_tls)
+    attempts = max_retries + 1 if isinstance(max_retries, int) else 1
+    for attempt in range(attempts):
+        try:
+            async with s.request(method, url, **kwargs) as r:
+                if limit:
+                    with OutputSpill(limit) as spill:
+                        async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                            spill.write(chunk)
+                        body, spilled = read_limited_body(
+                            spill, r.headers.get("Content-Type"), r.charset)
+                elif r.headers.get("Content-Type") == "application/json":
+                    body = await r.json()
+                else:
+                    body = await r.text()
+                status = r.status
+                response_headers = dict(r.headers)
+            break
+        except aiohttp.ClientConnectionError as cex:
+            if attempt + 1 < attempts:
+                logger.debug("Retrying connection to {u}".format(u=url))
+                continue
+            raise ActivityFailed("failed to connect to {u}: {x}".format(
+                u=url, x=str(cex)))
+        except asyncio.TimeoutError:
+            raise ActivityTimeout("activity took too long to complete")
+
+    if "tolerance" not in activity and status > 399:
+        logger.warning(
+            "This HTTP call returned a response with a HTTP status code "
+            "above 400. This may indicate some error and not "
+            "what you expected. Please have a look at the logs.")
+
+    result = {
+        "status": status,
+        "headers": response_headers,
+        "body": body
+    }
+    if spilled:
+        result["spilled"] = {"body": spilled}
+    return result
 
 
 def validate_http_activity(activity: Activity):
@@ -114,3 +261,217 @@ def validate_http_activity(activity: Activity):
     headers = provider.get("headers")
     if headers and not type(headers) == dict:
         raise InvalidActivity("a HTTP activities expect headers as a mapping")
+
+
+def configure_http_sessions(settings: Settings):
+    """
+    Configure the pooled HTTP sessions from the `runtime` section of the
+    settings. For instance:
+
+    ```yaml
+    runtime:
+      http:
+        pool_connections: 10
+        pool_maxsize: 20
+        idle_timeout: 60
+    ```
+
+    The `pool_connections` and `pool_maxsize` values are passed to the
+    underlying connection pool of each session. A session that has not been
+    used for more than `idle_timeout` seconds is closed and evicted.
+    """
+    if not settings:
+        return
+
+    http_settings = settings.get("runtime", {}).get("http", {})
+    with _sessions_lock:
+        for key in _session_options:
+            if key in http_settings:
+                _session_options[key] = http_settings[key]
+
+
+def open_http_sessions(settings: Settings):
+    """
+    Configure the pooled HTTP sessions for an experiment run about to start.
+
+    Sessions are shared by experiments run concurrently in the same process
+    and are only closed by :func:`close_http_sessions` once the last of
+    those runs is done.
+    """
+    global _active_runs
+    with _sessions_lock:
+        _active_runs = _active_runs + 1
+    configure_http_sessions(settings)
+
+
+def get_http_session(url: str, verify_tls: bool = True,
+                     max_retries: int = 0) -> requests.Session:
+    """
+    Return a session for the given `url` that is shared with any other
+    activity calling the same scheme, host and port with the same TLS
+    verification and retry policy.
+
+    Shared sessions do not keep cookies across calls so each activity still
+    starts from a clean state, only the connections are reused.
+
+    The returned session may be evicted once idle, even while still in use,
+    prefer :func:`use_http_session` to make a call with it.
+    """
+    with _sessions_lock:
+        return get_session_entry(url, verify_tls, max_retries)["session"]
+
+
+@contextmanager
+def use_http_session(url: str, verify_tls: bool = True,
+                     max_retries: int = 0) -> Iterator[requests.Session]:
+    """
+    Check out the session :func:`get_http_session` returns for the duration
+    of a call. A session is never evicted while it is checked out.
+    """
+    with _sessions_lock:
+        entry = get_session_entry(url, verify_tls, max_retries)
+        entry["users"] = entry["users"] + 1
+
+    try:
+        yield entry["session"]
+    finally:
+        with _sessions_lock:
+            entry["users"] = entry["users"] - 1
+            entry["last_used"] = time.time()
+
+
+def close_http_sessions():
+    """
+    Close all the pooled HTTP sessions and their connections, unless other
+    experiment runs opened with :func:`open_http_sessions` still use them.
+    Sessions checked out by :func:`use_http_session` are kept until idle.
+    """
+    global _active_runs
+    with _sessions_lock:
+        if _active_runs > 0:
+            _active_runs = _active_runs - 1
+        if _active_runs:
+            logger.debug(
+                "Pooled HTTP sessions are still used by {c} runs".format(
+                    c=_active_runs))
+            return
+
+        if _sessions:
+            logger.debug(
+                "Closing {c} pooled HTTP sessions".format(c=len(_sessions)))
+        for key, entry in list(_sessions.items()):
+            # sessions still checked out, for instance by a notification
+            # sent in the background, are left to be evicted once idle
+            if entry["users"]:
+                continue
+            entry["session"].close()
+            _sessions.pop(key)
+
+
+async def close_async_http_sessions():
+    """
+    Close all the aiohttp sessions created from the current event loop,
+    unless other experiment runs still use them.
+    """
+    with _sessions_lock:
+        if _active_runs:
+            return
+
+    loop = asyncio.get_event_loop()
+    for key in list(_async_sessions.keys()):
+        if key[0] == id(loop):
+            await _async_sessions.pop(key).close()
+
+
+###############################################################################
+# Internals
+###############################################################################
+def get_async_http_session(loop: asyncio.AbstractEventLoop, url: str,
+                           verify_tls: bool = True) -> Any:
+    p = urlparse(url)
+    key = (id(loop), p.scheme, p.hostname, p.port, verify_tls)
+    s = _async_sessions.get(key)
+    if s is None or s.closed:
+        logger.debug(
+            "Creating aiohttp session for {s}://{h}:{p}".format(
+                s=p.scheme, h=p.hostname, p=p.port or ""))
+        s = _async_sessions[key] = aiohttp.ClientSession(
+            cookie_jar=aiohttp.DummyCookieJar(),
+            connector=aiohttp.TCPConnector(
+                limit_per_host=_session_options["pool_maxsize"]))
+    return s
+
+
+class _NoCookiesPolicy(DefaultCookiePolicy):
+    def set_ok(self, cookie, request) -> bool:
+        return False
+
+
+def get_session_entry(url: str, verify_tls: bool,
+                      max_retries: int) -> Dict[str, Any]:
+    """
+    Pooled session entry for the given `url`, created when missing. Must be
+    called with the sessions lock held.
+    """
+    p = urlparse(url)
+    key = (p.scheme, p.hostname, p.port, verify_tls, str(max_retries))
+    now = time.time()
+    evict_idle_sessions(now)
+
+    entry = _sessions.get(key)
+    if entry is None:
+        logger.debug(
+            "Creating HTTP session for {s}://{h}:{p}".format(
+                s=p.scheme, h=p.hostname, p=p.port or ""))
+        s = requests.Session()
+        s.cookies.set_policy(_NoCookiesPolicy())
+        a = requests.adapters.HTTPAdapter(
+            pool_connections=_session_options["pool_connections"],
+            pool_maxsize=_session_options["pool_maxsize"],
+            max_retries=max_retries)
+        s.mount("http://", a)
+        s.mount("https://", a)
+        entry = _sessions[key] = {"session": s, "last_used": now, "users": 0}
+
+    entry["last_used"] = now
+    return entry
+
+
+def evict_idle_sessions(now: float):
+    """
+    Close sessions that have been idle for too long, those checked out by
+    :func:`use_http_session` are kept. Must be called with the sessions lock
+    held.
+    """
+    idle_timeout = _session_options["idle_timeout"]
+    if idle_timeout is None:
+        return
+
+    for key, entry in list(_sessions.items()):
+        if entry["users"]:
+            continue
+        if now - entry["last_used"] > idle_timeout:
+            logger.debug("Evicting idle HTTP session {k}".format(k=key))
+            entry["session"].close()
+            _sessions.pop(key)
+
+
+def read_limited_body(spill: OutputSpill, content_type: str,
+                      encoding: str = None) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Turn a captured body into the body of the result and the reference to
+    the file it was spilled to, if any. A spilled JSON body cannot be parsed
+    from its preview so it is returned as text.
+    """
+    spilled = spill.close()
+    if spilled:
+        return spill.decode(), spilled
+
+    if not encoding:
+        text = spill.decode()
+    else:
+        text = spill.preview.decode(encoding, errors="replace")
+
+    if content_type == "application/json":
+        return json.loads(text), None
+    return text, None
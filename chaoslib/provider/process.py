@@ -1,19 +1,40 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import atexit
 import itertools
+import json
 import os
 import os.path
+import selectors
 import shutil
 import subprocess
-from typing import Any
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+import contextvars
 from logzero import logger
 
 from chaoslib import decode_bytes, substitute
-from chaoslib.exceptions import ActivityFailed, InvalidActivity
+from chaoslib.deadline import get_timeout
+from chaoslib.exceptions import ActivityFailed, ActivityTimeout, \
+    InvalidActivity
+from chaoslib.journal import record_output
+from chaoslib.output import CHUNK_SIZE, OutputSpill, OutputTail, \
+    get_output_limit
+from chaoslib.settings import get_loaded_settings
 from chaoslib.types import Activity, Configuration, Secrets
 
 
-__all__ = ["run_process_activity", "validate_process_activity"]
+__all__ = ["run_process_activity", "run_process_activity_async",
+           "validate_process_activity", "get_stream_options",
+           "resolve_executable", "shutdown_process_servers"]
+STREAM_TARGETS = ("log", "journal")
+DEFAULT_STREAM_MAX_SIZE = 1024 * 1024
+_executables = {}  # type: Dict[Tuple[str, Optional[str]], str]
+_servers = {}  # type: Dict[Tuple[str, ...], ProcessServer]
+_servers_lock = threading.Lock()
 
 
 def run_process_activity(activity: Activity, configuration: Configuration,
@@ -28,26 +49,38 @@ def run_process_activity(activity: Activity, configuration: Configuration,
     timeout defined in the activity. There is no timeout by default so be
     careful when you do not explicitly provide one.
 
+    When the output of the activity is limited, see
+    :func:`chaoslib.output.get_output_limit`, only that many bytes of stdout
+    and stderr are returned and the streams going over it are spilled to
+    disk and referenced in the `"spilled"` entry of the result.
+
+    When the output of the activity is streamed, see
+    :func:`get_stream_options`, it is read as the process prints it and only
+    its tail is returned. The number of bytes dropped from the head of each
+    stream is then set in the `"truncated"` entry of the result.
+
+    When the provider declares a `"server"`, the activity is sent as a
+    request to a long-lived helper process rather than run as a new
+    process, see :class:`ProcessServer`.
+
     This should be considered as a private function.
     """
-    provider = activity["provider"]
-    timeout = provider.get("timeout", None)
-    arguments = provider.get("arguments", [])
+    arguments, shell, timeout = build_process_arguments(
+        activity, configuration, secrets)
+    path = activity["provider"]["path"]
 
-    if arguments and (configuration or secrets):
-        arguments = substitute(arguments, configuration, secrets)
+    if activity["provider"].get("server"):
+        return run_in_process_server(activity, arguments, timeout)
 
-    shell = False
-    path = shutil.which(provider["path"])
-    if isinstance(arguments, str):
-        shell = True
-        arguments = "{} {}".format(path, arguments)
-    else:
-        if isinstance(arguments, dict):
-            arguments = itertools.chain.from_iterable(arguments.items())
+    options = get_stream_options(activity)
+    if options:
+        return run_process_streaming(
+            activity, arguments, shell, timeout, options)
 
-        arguments = list([str(p) for p in arguments if p not in (None, "")])
-        arguments.insert(0, path)
+    limit = get_output_limit(activity)
+    if limit:
+        return run_process_with_limit(
+            arguments, shell, timeout, limit, source=path)
 
     try:
         logger.debug("Running: {a}".format(a=str(arguments)))
@@ -55,10 +88,10 @@ def run_process_activity(activity: Activity, configuration: Configuration,
             arguments, timeout=timeout, stdout=subprocess.PIPE,
             stderr=subprocess.PIPE, env=os.environ, shell=shell)
     except subprocess.TimeoutExpired:
-        raise ActivityFailed("process activity took too long to complete")
+        raise ActivityTimeout("process activity took too long to complete")
 
-    stdout = decode_bytes(proc.stdout)
-    stderr = decode_bytes(proc.stderr)
+    stdout = decode_bytes(proc.stdout, source=path)
+    stderr = decode_bytes(proc.stderr, source=path)
 
     return {
         "status": proc.returncode,
@@ -67,6 +100,85 @@ def run_process_activity(activity: Activity, configuration: Configuration,
     }
 
 
+async def run_process_activity_async(activity: Activity,
+                                     configuration: Configuration,
+                                     secrets: Secrets) -> Any:
+    """
+    Run a process activity as an asyncio subprocess so the event loop is not
+    blocked while waiting for it to complete.
+
+    The process is killed when it takes longer than the timeout defined in
+    the activity, in which case :exc:`ActivityFailed` is raised. Outputs
+    are limited or streamed just like with :func:`run_process_activity`.
+
+    Requests to a process server are sent from a thread of the default
+    executor of the loop, within the context of the caller.
+
+    This should be considered as a private function.
+    """
+    arguments, shell, timeout = build_process_arguments(
+        activity, configuration, secrets)
+
+    if activity["provider"].get("server"):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, contextvars.copy_context().run, run_in_process_server,
+            activity, arguments, timeout)
+
+    path = activity["provider"]["path"]
+    options = get_stream_options(activity)
+    limit = get_output_limit(activity)
+
+    logger.debug("Running: {a}".format(a=str(arguments)))
+    if shell:
+        proc = await asyncio.create_subprocess_shell(
+            arguments, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, env=os.environ)
+    else:
+        proc = await asyncio.create_subprocess_exec(
+            *arguments, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, env=os.environ)
+
+    try:
+        if options:
+            stdout, stderr = make_stream_captures(activity, options)
+            await asyncio.wait_for(asyncio.gather(
+                capture_stream(proc.stdout, stdout),
+                capture_stream(proc.stderr, stderr),
+                proc.wait()), timeout)
+        elif limit:
+            stdout = OutputSpill(limit)
+            stderr = OutputSpill(limit)
+            with stdout, stderr:
+                await asyncio.wait_for(asyncio.gather(
+                    capture_stream(proc.stdout, stdout),
+                    capture_stream(proc.stderr, stderr),
+                    proc.wait()), timeout)
+        else:
+            stdout, stderr = await asyncio.wait_for(
+                proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise ActivityTimeout("process activity took too long to complete")
+    except asyncio.CancelledError:
+        # the activity went over its deadline or the run was interrupted
+        proc.kill()
+        raise
+
+    if options:
+        return collect_streams(proc.returncode, stdout, stderr, path)
+
+    if limit:
+        return collect_outputs(proc.returncode, stdout, stderr, path)
+
+    return {
+        "status": proc.returncode,
+        "stdout": decode_bytes(stdout, source=path),
+        "stderr": decode_bytes(stderr, source=path)
+    }
+
+
 def validate_process_activity(activity: Activity):
     """
     Validate a process activity.
@@ -87,7 +199,7 @@ def validate_process_activity(activity: Activity):
     if not path:
         raise InvalidActivity("a process activity must have a path")
 
-    path = shutil.which(path)
+    path = resolve_executable(path)
     if not path:
         raise InvalidActivity(
             "path '{path}' cannot be found, in activity '{name}'".format(
@@ -97,3 +209,551 @@ def validate_process_activity(activity: Activity):
         raise InvalidActivity(
             "no access permission to '{path}', in activity '{name}'".format(
                 path=path, name=name))
+
+    stream = provider.get("stream")
+    if stream is not None:
+        validate_stream_options(stream, name)
+
+    server = provider.get("server")
+    if server is not None:
+        validate_server_options(server, provider, name)
+
+
+def resolve_executable(path: str) -> Optional[str]:
+    """
+    Resolve the path of an executable, looking it up in the `PATH` when it
+    is not a path already, or return `None` when it cannot be found.
+
+    Resolved paths are cached per value of the `PATH` so that activities
+    calling the same executable over and over do not scan it every time.
+    """
+    key = (path, os.environ.get("PATH"))
+    resolved = _executables.get(key)
+    if resolved is None:
+        resolved = shutil.which(path)
+        if resolved:
+            _executables[key] = resolved
+    return resolved
+
+
+def shutdown_process_servers():
+    """
+    Stop the helper processes serving process activities, if any. A new one
+    is started by the next activity that needs it.
+    """
+    with _servers_lock:
+        servers = list(_servers.values())
+        _servers.clear()
+
+    for server in servers:
+        server.close()
+
+
+def get_stream_options(activity: Activity) -> Optional[Dict[str, Any]]:
+    """
+    How the output of a process activity is streamed. It is read from the
+    `stream` property of its provider first, then from the `runtime` section
+    of the settings:
+
+    ```yaml
+    runtime:
+      process:
+        stream:
+          forward:
+            - log
+            - journal
+          max_size: 65536
+    ```
+
+    Either may also simply be `true`. Streamed outputs are read as the
+    process prints them. Their lines can be forwarded to the logger and to
+    the journal, when it is streamed to a file, as soon as they are printed.
+    Only the last `max_size` bytes of each stream are kept, defaulting to
+    the output limit of the activity or to 1 MiB.
+
+    Returns `None` when the output is not streamed.
+    """
+    stream = activity["provider"].get("stream")
+    if stream is None:
+        settings = get_loaded_settings() or {}
+        stream = settings.get("runtime", {}).get("process", {}).get("stream")
+
+    if not stream:
+        return None
+
+    if stream is True:
+        stream = {}
+
+    return {
+        "forward": stream.get("forward") or [],
+        "max_size": stream.get("max_size") or get_output_limit(
+            activity) or DEFAULT_STREAM_MAX_SIZE
+    }
+
+
+###############################################################################
+# Internals
+###############################################################################
+def build_process_arguments(activity: Activity, configuration: Configuration,
+                            secrets: Secrets) \
+                            -> Tuple[Union[str, List[str]], bool, Any]:
+    """
+    Build the command line of a process activity. Returns the arguments,
+    whether they must be run through the shell and the provider's timeout,
+    bounded by the deadline of the activity.
+    """
+    provider = activity["provider"]
+    timeout = get_timeout(provider.get("timeout", None))
+    arguments = provider.get("arguments", [])
+
+    if arguments and (configuration or secrets):
+        arguments = substitute(arguments, configuration, secrets)
+
+    shell = False
+    path = resolve_executable(provider["path"])
+    if isinstance(arguments, str):
+        shell = True
+        arguments = "{} {}".format(path, arguments)
+    else:
+        if isinstance(arguments, dict):
+            arguments = itertools.chain.from_iterable(arguments.items())
+
+        arguments = list([str(p) for p in arguments if p not in (None, "")])
+        arguments.insert(0, path)
+
+    return arguments, shell, timeout
+
+
+def validate_stream_options(stream: Any, name: str):
+    if isinstance(stream, bool):
+        return
+
+    if not isinstance(stream, dict):
+        raise InvalidActivity(
+            "stream of activity '{name}' must be a boolean or an "
+            "object".format(name=name))
+
+    forward = stream.get("forward") or []
+    if not isinstance(forward, list) or \
+            any(t not in STREAM_TARGETS for t in forward):
+        raise InvalidActivity(
+            "stream of activity '{name}' can only be forwarded to: "
+            "{t}".format(name=name, t=", ".join(STREAM_TARGETS)))
+
+    max_size = stream.get("max_size")
+    if max_size is not None:
+        if not isinstance(max_size, int) or max_size < 1:
+            raise InvalidActivity(
+                "stream max_size of activity '{name}' must be a positive "
+                "integer".format(name=name))
+
+
+def validate_server_options(server: Any, provider: Dict[str, Any],
+                            name: str):
+    if not isinstance(server, (bool, dict)):
+        raise InvalidActivity(
+            "server of activity '{name}' must be a boolean or an "
+            "object".format(name=name))
+
+    if isinstance(server, dict):
+        arguments = server.get("arguments", [])
+        if not isinstance(arguments, list):
+            raise InvalidActivity(
+                "server arguments of activity '{name}' must be a "
+                "list".format(name=name))
+
+    if isinstance(provider.get("arguments"), str):
+        raise InvalidActivity(
+            "arguments of activity '{name}' must be a list or an object to "
+            "be sent to a server".format(name=name))
+
+
+class ProcessServer:
+    """
+    Long-lived helper process serving the requests of the process activities
+    calling its executable, one request at a time.
+
+    Requests and responses are framed as JSON Lines over the standard input
+    and output of the helper. A request holds the arguments of the activity
+    and its timeout, in seconds, when it has one:
+
+    ```json
+    {"id": 1, "arguments": ["get", "pods"], "timeout": 10}
+    ```
+
+    The helper answers each request, in order, with the same shape as the
+    result of a process activity:
+
+    ```json
+    {"id": 1, "status": 0, "stdout": "...", "stderr": ""}
+    ```
+
+    A helper that does not answer in time, or not as expected, is killed and
+    a new one is started for the next request.
+    """
+    def __init__(self, arguments: List[str]):
+        self.arguments = arguments
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._buffer = bytearray()
+
+        logger.debug("Starting process server: {a}".format(a=str(arguments)))
+        self.proc = subprocess.Popen(
+            arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, env=os.environ)
+        os.set_blocking(self.proc.stdin.fileno(), False)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def request(self, arguments: List[str],
+                timeout: float = None) -> Dict[str, Any]:
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise ActivityTimeout(
+                "process activity took too long to complete")
+
+        try:
+            if deadline is not None:
+                # the helper only gets the time left after waiting for it
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise ActivityTimeout(
+                        "process activity took too long to complete")
+
+            request_id = next(self._ids)
+            request = {"id": request_id, "arguments": arguments}
+            if timeout is not None:
+                request["timeout"] = timeout
+
+            try:
+                self._write_line(
+                    json.dumps(request).encode("utf-8"), deadline)
+                response = json.loads(
+                    self._read_line(deadline).decode("utf-8"))
+            except ActivityFailed:
+                self.kill()
+                raise
+            except (OSError, ValueError) as x:
+                self.kill()
+                raise ActivityFailed(
+                    "process server '{p}' failed: {x}".format(
+                        p=self.arguments[0], x=str(x)))
+
+            if not isinstance(response, dict) or \
+                    response.get("id") != request_id:
+                self.kill()
+                raise ActivityFailed(
+                    "process server '{p}' answered out of order".format(
+                        p=self.arguments[0]))
+        finally:
+            self._lock.release()
+
+        return {
+            "status": response.get("status"),
+            "stdout": response.get("stdout", ""),
+            "stderr": response.get("stderr", "")
+        }
+
+    def close(self):
+        """
+        Let the helper exit on its own once its input is closed, or kill it.
+        """
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+        finally:
+            self.proc.stdout.close()
+
+    def kill(self):
+        if self.alive:
+            self.proc.kill()
+        self.proc.wait()
+
+    def _write_line(self, line: bytes, deadline: Optional[float]):
+        # a helper which stops reading its input would block a plain write
+        # once the pipe is full, the write waits for it until the deadline
+        fd = self.proc.stdin.fileno()
+        data = memoryview(line + b"\n")
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_WRITE)
+            while data:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not selector.select(remaining):
+                        raise ActivityTimeout(
+                            "process activity took too long to complete")
+                else:
+                    selector.select()
+
+                try:
+                    written = os.write(fd, data)
+                except BlockingIOError:
+                    continue
+                data = data[written:]
+
+    def _read_line(self, deadline: Optional[float]) -> bytes:
+        fd = self.proc.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while b"\n" not in self._buffer:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not selector.select(remaining):
+                        raise ActivityTimeout(
+                            "process activity took too long to complete")
+
+                chunk = os.read(fd, CHUNK_SIZE)
+                if not chunk:
+                    raise ActivityFailed(
+                        "process server '{p}' exited".format(
+                            p=self.arguments[0]))
+                self._buffer.extend(chunk)
+
+        line, _, rest = self._buffer.partition(b"\n")
+        self._buffer = rest
+        return bytes(line)
+
+
+def get_process_server(arguments: List[str]) -> ProcessServer:
+    """
+    Helper process started with the given arguments, started on first use
+    and started again when it is not running anymore.
+    """
+    key = tuple(arguments)
+    with _servers_lock:
+        server = _servers.get(key)
+        if server is None or not server.alive:
+            if server is not None:
+                server.close()
+            server = ProcessServer(arguments)
+            _servers[key] = server
+    return server
+
+
+def run_in_process_server(activity: Activity, arguments: List[str],
+                          timeout: Any) -> Dict[str, Any]:
+    """
+    Send the arguments of the activity to the helper process of its
+    executable and return its response. The helper is started with the
+    `arguments` of the `"server"` of the provider, if any.
+
+    The outputs of the response are kept within the same limits as those of
+    a streamed process, see :func:`get_stream_options`, or of the output
+    limit of the activity. Their lines are only forwarded once the response
+    is complete.
+    """
+    server = activity["provider"]["server"]
+    server_arguments = [arguments[0]]
+    if isinstance(server, dict):
+        server_arguments.extend(str(a) for a in server.get("arguments", []))
+
+    logger.debug("Sending to process server: {a}".format(a=str(arguments)))
+    response = get_process_server(server_arguments).request(
+        arguments[1:], timeout)
+
+    options = get_stream_options(activity)
+    if options:
+        stdout, stderr = make_stream_captures(activity, options)
+    else:
+        limit = get_output_limit(activity)
+        if not limit:
+            return response
+        stdout = StreamCapture("stdout", limit)
+        stderr = StreamCapture("stderr", limit)
+
+    for capture in (stdout, stderr):
+        capture.write(str(response[capture.name]).encode("utf-8"))
+    return collect_streams(
+        response["status"], stdout, stderr, activity["provider"]["path"])
+
+
+class StreamCapture:
+    """
+    Keep the tail of a process stream and, when given a `forward` function,
+    pass it each line of that stream as soon as it is complete. Lines longer
+    than a chunk are forwarded in pieces.
+    """
+    def __init__(self, name: str, limit: int,
+                 forward: Callable[[str, str], None] = None):
+        self.name = name
+        self.output = OutputTail(limit)
+        self.forward = forward
+        self._line = bytearray()
+
+    def write(self, chunk: bytes):
+        self.output.write(chunk)
+        if not self.forward:
+            return
+
+        self._line.extend(chunk)
+        lines = self._line.split(b"\n")
+        self._line = lines.pop()
+        if len(self._line) >= CHUNK_SIZE:
+            lines.append(self._line)
+            self._line = bytearray()
+
+        for line in lines:
+            self._forward(line)
+
+    def close(self):
+        if self.forward and self._line:
+            self._forward(self._line)
+            self._line = bytearray()
+
+    def _forward(self, line: bytes):
+        self.forward(
+            self.name, line.rstrip(b"\r").decode("utf-8", errors="replace"))
+
+
+def make_stream_captures(activity: Activity, options: Dict[str, Any]) \
+                         -> Tuple[StreamCapture, StreamCapture]:
+    targets = options["forward"]
+    name = activity.get("name")
+    forward = None
+
+    if targets:
+        def forward(stream: str, line: str):
+            if "log" in targets:
+                logger.info("{n} [{s}] {l}".format(n=name, s=stream, l=line))
+            if "journal" in targets:
+                record_output(name, stream, line)
+
+    limit = options["max_size"]
+    return (StreamCapture("stdout", limit, forward),
+            StreamCapture("stderr", limit, forward))
+
+
+def run_process_streaming(activity: Activity,
+                          arguments: Union[str, List[str]], shell: bool,
+                          timeout: Any, options: Dict[str, Any]) \
+                          -> Dict[str, Any]:
+    """
+    Run the process and read both its streams, as they are printed, with a
+    selector loop. The process is killed once it goes over the timeout.
+    """
+    stdout, stderr = make_stream_captures(activity, options)
+    deadline = None
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+
+    logger.debug("Running: {a}".format(a=str(arguments)))
+    proc = subprocess.Popen(
+        arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        env=os.environ, shell=shell)
+    captures = {proc.stdout: stdout, proc.stderr: stderr}
+
+    with proc, selectors.DefaultSelector() as selector:
+        try:
+            for f in captures:
+                selector.register(f, selectors.EVENT_READ)
+
+            while selector.get_map():
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(arguments, timeout)
+
+                for (key, _) in selector.select(remaining):
+                    chunk = os.read(key.fd, CHUNK_SIZE)
+                    if chunk:
+                        captures[key.fileobj].write(chunk)
+                    else:
+                        selector.unregister(key.fileobj)
+
+            if deadline is not None:
+                proc.wait(max(0, deadline - time.monotonic()))
+            else:
+                proc.wait()
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise ActivityTimeout(
+                "process activity took too long to complete")
+        except BaseException:
+            proc.kill()
+            raise
+
+    return collect_streams(
+        proc.returncode, stdout, stderr, activity["provider"]["path"])
+
+
+def run_process_with_limit(arguments: Union[str, List[str]], shell: bool,
+                           timeout: Any, limit: int,
+                           source: str = None) -> Dict[str, Any]:
+    """
+    Run the process with its streams written to temporary files, rather than
+    buffered in memory, and only keep up to `limit` bytes of each.
+    """
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        try:
+            logger.debug("Running: {a}".format(a=str(arguments)))
+            proc = subprocess.run(
+                arguments, timeout=timeout, stdout=out, stderr=err,
+                env=os.environ, shell=shell)
+        except subprocess.TimeoutExpired:
+            raise ActivityTimeout(
+                "process activity took too long to complete")
+
+        with OutputSpill(limit) as stdout, OutputSpill(limit) as stderr:
+            out.seek(0)
+            stdout.read_from(out)
+            err.seek(0)
+            stderr.read_from(err)
+            return collect_outputs(proc.returncode, stdout, stderr, source)
+
+
+async def capture_stream(stream: asyncio.StreamReader,
+                         sink: Union[OutputSpill, StreamCapture]):
+    while True:
+        chunk = await stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        sink.write(chunk)
+
+
+def collect_outputs(status: int, stdout: OutputSpill, stderr: OutputSpill,
+                    source: str = None) -> Dict[str, Any]:
+    result = {
+        "status": status,
+        "stdout": stdout.decode(source),
+        "stderr": stderr.decode(source)
+    }
+
+    spilled = {}
+    for name, spill in (("stdout", stdout), ("stderr", stderr)):
+        ref = spill.close()
+        if ref:
+            spilled[name] = ref
+    if spilled:
+        result["spilled"] = spilled
+
+    return result
+
+
+def collect_streams(status: int, stdout: StreamCapture,
+                    stderr: StreamCapture,
+                    source: str = None) -> Dict[str, Any]:
+    result = {"status": status}
+
+    truncated = {}
+    for capture in (stdout, stderr):
+        capture.close()
+        result[capture.name] = capture.output.decode(source)
+        if capture.output.dropped:
+            truncated[capture.name] = capture.output.dropped
+    if truncated:
+        result["truncated"] = truncated
+
+    return result
+
+
+atexit.register(shutdown_process_servers)
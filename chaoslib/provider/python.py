@@ -1,18 +1,47 @@
 # -*- coding: utf-8 -*-
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import functools
 import importlib
 import inspect
+import multiprocessing
+import os
+import signal
 import sys
+import threading
 import traceback
-from typing import Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import contextvars
 from logzero import logger
 
-from chaoslib import substitute
-from chaoslib.exceptions import ActivityFailed, InvalidActivity
+from chaoslib import copy_containers, substitute
+from chaoslib.deadline import check_deadline, get_timeout, \
+    wait_until_deadline
+from chaoslib.exceptions import ActivityFailed, ActivityTimeout, \
+    InvalidActivity
+from chaoslib.settings import get_loaded_settings
 from chaoslib.types import Activity, Configuration, Secrets
 
 
-__all__ = ["run_python_activity", "validate_python_activity"]
+__all__ = ["run_python_activity", "run_python_activity_async",
+           "validate_python_activity", "resolve_python_function",
+           "shutdown_process_pool"]
+EXECUTORS = ("thread", "process")
+# extra time given to a worker process to report its own timeout
+PROCESS_TIMEOUT_GRACE = 1.0
+ResolvedFunction = namedtuple(
+    "ResolvedFunction", ["module", "func", "signature", "source",
+                         "wants_configuration", "wants_secrets"])
+_resolved_functions = {}  # type: Dict[Tuple[str, str], ResolvedFunction]
+# a worker process of its own, so that it can be killed without affecting
+# any other activity, and the queue its process identifier is reported to
+IsolatedWorker = namedtuple("IsolatedWorker", ["pool", "pids"])
+_process_pool = None  # type: Optional[ProcessPoolExecutor]
+_process_pool_lock = threading.Lock()
+_isolated_workers = []  # type: List[IsolatedWorker]
 
 
 def run_python_activity(activity: Activity, configuration: Configuration,
@@ -23,42 +52,73 @@ def run_python_activity(activity: Activity, configuration: Configuration,
     A python activity is a function from any importable module. The result
     of that function is returned as the activity's output.
 
+    When the provider sets `"executor": "process"`, the function is called
+    in a worker process instead, see :func:`run_in_process`. Otherwise, the
+    function cannot be interrupted and the timeout of its activity is only
+    checked once it returns, see :func:`chaoslib.deadline.check_deadline`.
+
     This should be considered as a private function.
     """
-    provider = activity["provider"]
-    mod_path = provider["module"]
-    func_name = provider["func"]
-    mod = importlib.import_module(mod_path)
-    func = getattr(mod, func_name)
+    func, arguments = load_python_activity(activity, configuration, secrets)
+
+    if activity["provider"].get("executor") == "process":
+        return run_in_process(
+            activity, arguments,
+            get_timeout(activity["provider"].get("timeout")))
+
     try:
-        logger.debug(
-            "Activity '{}' loaded from '{}'".format(
-                activity.get("name"), inspect.getfile(func)))
-    except TypeError:
-        pass
+        result = func(**arguments)
+    except Exception as x:
+        raise ActivityFailed(
+            traceback.format_exception_only(
+                type(x), x)[0].strip()).with_traceback(
+                    sys.exc_info()[2])
 
-    arguments = provider.get("arguments", {}).copy()
+    check_deadline()
+    return result
 
-    if configuration or secrets:
-        arguments = substitute(arguments, configuration, secrets)
 
-    sig = inspect.signature(func)
-    if "secrets" in provider and "secrets" in sig.parameters:
-        arguments["secrets"] = {}
-        for s in provider["secrets"]:
-            arguments["secrets"].update(secrets.get(s, {}).copy())
+async def run_python_activity_async(activity: Activity,
+                                    configuration: Configuration,
+                                    secrets: Secrets) -> Any:
+    """
+    Run a Python activity without blocking the event loop.
 
-    if "configuration" in sig.parameters:
-        arguments["configuration"] = configuration.copy()
+    When the activity's function is a coroutine function, it is awaited
+    directly and cancelled once the timeout of its activity is over.
+    Otherwise, it is run in the loop's default executor, where it cannot be
+    interrupted, or in a worker process when the provider sets
+    `"executor": "process"`.
+
+    This should be considered as a private function.
+    """
+    func, arguments = load_python_activity(activity, configuration, secrets)
+
+    if activity["provider"].get("executor") == "process":
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, run_in_process, activity, arguments,
+            get_timeout(activity["provider"].get("timeout")))
 
     try:
-        return func(**arguments)
+        if inspect.iscoroutinefunction(func):
+            result = await wait_until_deadline(func(**arguments))
+        else:
+            # the executor does not carry the context, hence the deadline
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(None, functools.partial(
+                contextvars.copy_context().run, func, **arguments))
+    except ActivityTimeout:
+        raise
     except Exception as x:
         raise ActivityFailed(
             traceback.format_exception_only(
                 type(x), x)[0].strip()).with_traceback(
                     sys.exc_info()[2])
 
+    check_deadline()
+    return result
+
 
 def validate_python_activity(activity: Activity):
     """
@@ -70,7 +130,8 @@ def validate_python_activity(activity: Activity):
       module this process can import
     * a `func"` key which is the name of a function in that module
 
-    The `"arguments"` activity key must match the function's signature.
+    The `"arguments"` activity key must match the function's signature and
+    the optional `"executor"` key must be `"thread"` or `"process"`.
 
     In all failing cases, raises :exc:`InvalidActivity`.
 
@@ -87,60 +148,338 @@ def validate_python_activity(activity: Activity):
         raise InvalidActivity("a Python activity must have a function name")
 
     try:
-        mod = importlib.import_module(mod_name)
+        resolved = resolve_python_function(mod_name, func)
     except ImportError:
         raise InvalidActivity("could not find Python module '{mod}' "
                               "in activity '{name}'".format(
                                   mod=mod_name, name=name))
+    except AttributeError:
+        resolved = None
 
-    found_func = False
-    arguments = provider.get("arguments", {})
-    candidates = set(
-        inspect.getmembers(mod, inspect.isfunction)).union(
-            inspect.getmembers(mod, inspect.isbuiltin))
-    for (name, cb) in candidates:
-        if name == func:
-            found_func = True
-
-            # let's try to bind the activity's arguments with the function
-            # signature see if they match
-            sig = inspect.signature(cb)
-            try:
-                # config and secrets are provided through specific parameters
-                # to an activity that needs them. However, they are declared
-                # out of band of the `arguments` mapping. Here, we simply
-                # ensure the signature of the activity is valid by injecting
-                # fake `configuration` and `secrets` arguments into the mapping
-                args = arguments.copy()
-
-                if "secrets" in sig.parameters:
-                    args["secrets"] = None
-
-                if "configuration" in sig.parameters:
-                    args["configuration"] = None
-
-                sig.bind(**args)
-            except TypeError as x:
-                # I dislike this sort of lookup but not sure we can
-                # differentiate them otherwise
-                msg = str(x)
-                if "missing" in msg:
-                    arg = msg.rsplit(":", 1)[1].strip()
-                    raise InvalidActivity(
-                        "required argument {arg} is missing from "
-                        "activity '{name}'".format(arg=arg, name=name))
-                elif "unexpected" in msg:
-                    arg = msg.rsplit(" ", 1)[1].strip()
-                    raise InvalidActivity(
-                        "argument {arg} is not part of the "
-                        "function signature in activity '{name}'".format(
-                            arg=arg, name=name))
-                else:
-                    # another error? let's fail fast
-                    raise
-            break
-
-    if not found_func:
+    is_function = resolved is not None and (
+        inspect.isfunction(resolved.func) or inspect.isbuiltin(resolved.func))
+    if not is_function:
         raise InvalidActivity(
             "'{mod}' does not expose '{func}' in activity '{name}'".format(
                 mod=mod_name, func=func, name=name))
+
+    executor = provider.get("executor", "thread")
+    if executor not in EXECUTORS:
+        raise InvalidActivity(
+            "executor of activity '{name}' must be one of {e}".format(
+                name=name, e=", ".join(EXECUTORS)))
+
+    if executor == "process" and \
+            inspect.iscoroutinefunction(resolved.func):
+        raise InvalidActivity(
+            "activity '{name}' cannot run a coroutine function in a "
+            "process".format(name=name))
+
+    # let's try to bind the activity's arguments with the function
+    # signature see if they match
+    sig = resolved.signature or inspect.signature(resolved.func)
+    arguments = provider.get("arguments", {})
+    try:
+        # config and secrets are provided through specific parameters
+        # to an activity that needs them. However, they are declared
+        # out of band of the `arguments` mapping. Here, we simply
+        # ensure the signature of the activity is valid by injecting
+        # fake `configuration` and `secrets` arguments into the mapping
+        args = arguments.copy()
+
+        if resolved.wants_secrets:
+            args["secrets"] = None
+
+        if resolved.wants_configuration:
+            args["configuration"] = None
+
+        sig.bind(**args)
+    except TypeError as x:
+        # I dislike this sort of lookup but not sure we can
+        # differentiate them otherwise
+        msg = str(x)
+        if "missing" in msg:
+            arg = msg.rsplit(":", 1)[1].strip()
+            raise InvalidActivity(
+                "required argument {arg} is missing from "
+                "activity '{name}'".format(arg=arg, name=name))
+        elif "unexpected" in msg:
+            arg = msg.rsplit(" ", 1)[1].strip()
+            raise InvalidActivity(
+                "argument {arg} is not part of the "
+                "function signature in activity '{name}'".format(
+                    arg=arg, name=name))
+        else:
+            # another error? let's fail fast
+            raise
+
+
+def resolve_python_function(mod_name: str,
+                            func_name: str) -> ResolvedFunction:
+    """
+    Import the function `func_name` from the module `mod_name` and return it
+    alongside its signature and whether it expects the `configuration` and
+    `secrets` arguments.
+
+    Resolutions are cached so that activities executed many times do not
+    go through the import machinery and signature inspection every time.
+    A cached resolution is discarded when the module, or the function
+    within it, has changed since, for instance after the module was reloaded.
+
+    Raises :exc:`ImportError` when the module cannot be imported and
+    :exc:`AttributeError` when the module does not have such attribute.
+    """
+    key = (mod_name, func_name)
+    resolved = _resolved_functions.get(key)
+    if resolved is not None:
+        mod = sys.modules.get(mod_name)
+        if mod is resolved.module and \
+                mod.__dict__.get(func_name) is resolved.func:
+            return resolved
+
+    mod = importlib.import_module(mod_name)
+    func = getattr(mod, func_name)
+
+    try:
+        sig = inspect.signature(func)
+    except (TypeError, ValueError):
+        sig = None
+
+    try:
+        source = inspect.getfile(func)
+    except TypeError:
+        source = None
+
+    resolved = _resolved_functions[key] = ResolvedFunction(
+        module=mod, func=func, signature=sig, source=source,
+        wants_configuration=sig is not None and (
+            "configuration" in sig.parameters),
+        wants_secrets=sig is not None and "secrets" in sig.parameters)
+    return resolved
+
+
+def shutdown_process_pool(wait: bool = True):
+    """
+    Stop the worker processes running Python activities, if any. A new pool
+    is started by the next activity that needs one.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        pools = [w.pool for w in _isolated_workers]
+        if _process_pool is not None:
+            pools.append(_process_pool)
+        _process_pool = None
+        _isolated_workers.clear()
+
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+###############################################################################
+# Internals
+###############################################################################
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Pool of worker processes shared by all the Python activities run with
+    the `"process"` executor. Workers are kept for the lifetime of the
+    pool so each of them imports an activity's module only once. Its size
+    is read from the `runtime` section of the settings when it is started:
+
+    ```yaml
+    runtime:
+      process_pool:
+        max_workers: 4
+    ```
+
+    Defaults to the number of CPUs.
+
+    Activities with a timeout are not run in that pool but in a worker of
+    their own, see :func:`get_isolated_worker`.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            max_workers = get_process_pool_size()
+            logger.debug(
+                "Starting a pool of {m} processes for Python "
+                "activities".format(m=max_workers))
+            _process_pool = ProcessPoolExecutor(max_workers)
+        return _process_pool
+
+
+def get_process_pool_size() -> int:
+    settings = get_loaded_settings() or {}
+    return settings.get("runtime", {}).get(
+        "process_pool", {}).get("max_workers") or os.cpu_count()
+
+
+def get_isolated_worker() -> IsolatedWorker:
+    """
+    Single worker process to run an activity with a timeout in, so that it
+    can be killed on its own when it is stuck. Idle workers are kept, up to
+    the size of the process pool, and each of them imports an activity's
+    module only once too.
+    """
+    with _process_pool_lock:
+        if _isolated_workers:
+            return _isolated_workers.pop()
+
+    logger.debug("Starting a worker process for a Python activity")
+    if sys.version_info >= (3, 7):
+        pids = multiprocessing.SimpleQueue()
+        return IsolatedWorker(ProcessPoolExecutor(
+            1, initializer=report_worker_pid, initargs=(pids,)), pids)
+    return IsolatedWorker(ProcessPoolExecutor(1), None)
+
+
+def release_isolated_worker(worker: IsolatedWorker):
+    with _process_pool_lock:
+        if len(_isolated_workers) < get_process_pool_size():
+            _isolated_workers.append(worker)
+            return
+    worker.pool.shutdown(wait=False)
+
+
+def kill_isolated_worker(worker: IsolatedWorker):
+    """
+    Kill a worker stuck on its call and wait for its pool to shut down.
+
+    Workers report themselves when they start, which the pool only supports
+    from Python 3.7. Before that, stuck workers are left behind.
+    """
+    if worker.pids is None:
+        worker.pool.shutdown(wait=False)
+        return
+
+    logger.debug("Killing the worker process of a Python activity")
+    while not worker.pids.empty():
+        try:
+            os.kill(worker.pids.get(), signal.SIGTERM)
+        except OSError:
+            # the worker already exited
+            pass
+    worker.pool.shutdown(wait=True)
+
+
+def report_worker_pid(pids: multiprocessing.SimpleQueue):
+    """
+    Run within a worker process when it starts so that it can be killed when
+    it is stuck.
+    """
+    pids.put(os.getpid())
+
+
+def run_in_process(activity: Activity, arguments: Dict[str, Any],
+                   timeout: float = None) -> Any:
+    """
+    Call the function of a Python activity in a worker process of the shared
+    pool and wait for its result. The arguments, including the configuration
+    and secrets the function expects, and the result must be picklable.
+
+    The `timeout`, in seconds, is enforced within the worker. If the worker
+    does not report back shortly after it, for instance because it is stuck
+    outside of the interpreter, it is killed. Activities with a timeout run
+    in a worker of their own so no other activity is affected.
+    """
+    provider = activity["provider"]
+    worker = None
+    if timeout is None:
+        pool = get_process_pool()
+    else:
+        # even a deadline already over must bound the call
+        timeout = max(timeout, 0.001)
+        worker = get_isolated_worker()
+        pool = worker.pool
+
+    try:
+        future = pool.submit(
+            call_in_process, provider["module"], provider["func"],
+            arguments, timeout)
+        return future.result(
+            timeout + PROCESS_TIMEOUT_GRACE if timeout else None)
+    except TimeoutError:
+        if not future.cancel():
+            kill_isolated_worker(worker)
+            worker = None
+        raise ActivityTimeout("activity took too long to complete")
+    except BrokenProcessPool:
+        # a worker died abruptly, its pool cannot be used anymore
+        if worker is None:
+            shutdown_process_pool(wait=False)
+        else:
+            worker.pool.shutdown(wait=True)
+            worker = None
+        raise ActivityFailed(
+            "the worker process of the activity exited abruptly")
+    except ActivityFailed:
+        raise
+    except Exception as x:
+        raise ActivityFailed(
+            traceback.format_exception_only(type(x), x)[0].strip())
+    finally:
+        if worker is not None:
+            release_isolated_worker(worker)
+
+
+def call_in_process(mod_name: str, func_name: str,
+                    arguments: Dict[str, Any], timeout: float = None) -> Any:
+    """
+    Run within a worker process: resolve the function, which is cached for
+    the lifetime of the worker, and call it within the given timeout.
+    """
+    func = resolve_python_function(mod_name, func_name).func
+
+    use_timer = bool(timeout) and hasattr(signal, "setitimer")
+    if use_timer:
+        previous = signal.signal(signal.SIGALRM, raise_activity_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    try:
+        return func(**arguments)
+    finally:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def raise_activity_timeout(signum, frame):
+    raise ActivityTimeout("activity took too long to complete")
+
+
+def load_python_activity(activity: Activity, configuration: Configuration,
+                         secrets: Secrets) -> Tuple[Callable, Dict[str, Any]]:
+    """
+    Import the function of a Python activity and build the arguments it
+    should be called with.
+    """
+    provider = activity["provider"]
+    resolved = resolve_python_function(provider["module"], provider["func"])
+    func = resolved.func
+    if resolved.source:
+        logger.debug(
+            "Activity '{}' loaded from '{}'".format(
+                activity.get("name"), resolved.source))
+
+    if resolved.signature is None:
+        # let the original error bubble up
+        inspect.signature(func)
+
+    arguments = provider.get("arguments")
+    if arguments and (configuration or secrets):
+        # the substitution already builds new containers all the way down
+        arguments = substitute(arguments, configuration, secrets)
+    elif arguments:
+        # only containers are copied, a flat mapping is copied shallowly
+        arguments = copy_containers(arguments)
+    else:
+        arguments = {}
+
+    if "secrets" in provider and resolved.wants_secrets:
+        arguments["secrets"] = {}
+        for s in provider["secrets"]:
+            arguments["secrets"].update(secrets.get(s, {}))
+
+    if resolved.wants_configuration:
+        arguments["configuration"] = configuration.copy()
+
+    return func, arguments
@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
+import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from typing import Iterator
+from typing import Iterator, List, Union
 
 from logzero import logger
 
-from chaoslib.activity import execute_activity
+from chaoslib.activity import execute_activity, execute_activity_async
+from chaoslib.journal import journal_position
 from chaoslib.types import Configuration, Experiment, Run, Secrets
 
 
-__all__ = ["run_rollbacks"]
+__all__ = ["run_rollbacks", "run_rollbacks_async"]
 
 
 def run_rollbacks(experiment: Experiment, configuration: Configuration,
@@ -24,15 +26,49 @@ def run_rollbacks(experiment: Experiment, configuration: Configuration,
     if not rollbacks:
         logger.info("No declared rollbacks, let's move on.")
 
-    for activity in rollbacks:
+    for index, activity in enumerate(rollbacks):
         logger.info("Rollback: {t}".format(t=activity.get("name")))
 
-        if activity.get("background"):
-            logger.debug("rollback activity will run in the background")
-            yield pool.submit(execute_activity, experiment=experiment,
-                              activity=activity, configuration=configuration,
-                              secrets=secrets, dry=dry)
-        else:
-            yield execute_activity(experiment, activity,
-                                   configuration=configuration,
-                                   secrets=secrets, dry=dry)
+        with journal_position("rollbacks", index):
+            if activity.get("background"):
+                logger.debug("rollback activity will run in the background")
+                run = pool.submit(
+                    execute_activity, experiment=experiment,
+                    activity=activity, configuration=configuration,
+                    secrets=secrets, dry=dry)
+            else:
+                run = execute_activity(experiment, activity,
+                                       configuration=configuration,
+                                       secrets=secrets, dry=dry)
+        yield run
+
+
+async def run_rollbacks_async(experiment: Experiment,
+                              configuration: Configuration,
+                              secrets: Secrets, dry: bool = False) \
+                              -> List[Union[Run, asyncio.Future]]:
+    """
+    Run all rollbacks declared in the experiment in their order from within
+    an event loop. Rollbacks declared with the `background` flag are
+    returned as :class:`asyncio.Future` to be awaited by the caller.
+    """
+    rollbacks = experiment.get("rollbacks", [])
+
+    if not rollbacks:
+        logger.info("No declared rollbacks, let's move on.")
+
+    runs = []
+    for index, activity in enumerate(rollbacks):
+        logger.info("Rollback: {t}".format(t=activity.get("name")))
+
+        with journal_position("rollbacks", index):
+            if activity.get("background"):
+                logger.debug("rollback activity will run in the background")
+                runs.append(asyncio.ensure_future(execute_activity_async(
+                    experiment, activity, configuration=configuration,
+                    secrets=secrets, dry=dry)))
+            else:
+                runs.append(await execute_activity_async(
+                    experiment, activity, configuration=configuration,
+                    secrets=secrets, dry=dry))
+    return runs
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+from collections import namedtuple
 import os
-from typing import Dict
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from logzero import logger
 try:
@@ -9,10 +12,32 @@ try:
 except ImportError:
     HAS_HVAC = False
 
-from chaoslib.exceptions import InvalidExperiment
+from chaoslib.exceptions import ActivityFailed, InvalidExperiment
+from chaoslib.pool import WorkerPool
+from chaoslib.settings import get_loaded_settings
 from chaoslib.types import Configuration, Secrets
 
-__all__ = ["load_secrets", "create_vault_client"]
+__all__ = ["load_secrets", "create_vault_client", "clear_vault_cache",
+           "register_secret_backend", "resolve_secrets", "LazySecrets"]
+SECRET_BACKENDS_GROUP = "chaostoolkit.secret_backends"
+DEFAULT_VAULT_CACHE_TTL = 60
+DEFAULT_VAULT_MAX_WORKERS = 8
+# configuration values the Vault client depends on
+VAULT_CLIENT_KEYS = (
+    "vault_addr", "vault_kv_version", "vault_token", "vault_role_id",
+    "vault_role_secret", "vault_sa_role", "vault_sa_token_path",
+    "vault_k8s_mount_point")
+
+# both map their key to a tuple of their expiry time and their value
+_vault_clients = {}  # type: Dict[Tuple[Any, ...], Tuple[float, Any]]
+_vault_secrets = {}  # type: Dict[Tuple[Any, ...], Tuple[float, Any]]
+_vault_lock = threading.Lock()
+
+SecretLoader = Callable[[Dict[str, Dict[str, Any]], Configuration], Secrets]
+SecretChecker = Callable[[Configuration], None]
+SecretBackend = namedtuple("SecretBackend", ["loader", "lazy", "check"])
+_secret_backends = {}  # type: Dict[str, SecretBackend]
+_entry_points_discovered = False
 
 
 def load_secrets(secrets_info: Dict[str, Dict[str, str]],
@@ -70,27 +95,223 @@ def load_secrets(secrets_info: Dict[str, Dict[str, str]],
         }
     }
     ```
+
+    Secrets of a type other than `"env"`, such as those from Vault, are
+    loaded lazily: their target is a :class:`LazySecrets` dictionary which
+    only fetches them the first time one of its keys is looked up, usually
+    when an activity declaring that target runs. The configuration of their
+    backend, such as the Vault address and credentials, is still checked
+    right away. Failing to load them later fails the activity which looked
+    them up with :exc:`ActivityFailed`.
+
+    Other types of secrets can be supported by registering their backend
+    with :func:`register_secret_backend` or through the
+    `chaostoolkit.secret_backends` entry point group.
     """
     logger.debug("Loading secrets...")
 
-    loaders = (
-        load_inline_secrets,
-        load_secrets_from_env,
-        load_secrets_from_vault,
-    )
+    secrets = load_inline_secrets(secrets_info, configuration)
 
-    secrets = {}
-    for loader in loaders:
-        for key, value in loader(secrets_info, configuration).items():
-            if key not in secrets:
-                secrets[key] = {}
-            secrets[key].update(value)
+    checked = []
+    for (target, keys) in secrets_info.items():
+        lazy = {}
+        for (name, entries) in group_by_backend(keys).items():
+            backend = get_secret_backend(name)
+            if backend.lazy:
+                if backend.check and name not in checked:
+                    backend.check(configuration)
+                    checked.append(name)
+                lazy[name] = entries
+                continue
+
+            loaded = backend.loader({target: entries}, configuration)
+            if loaded.get(target):
+                secrets.setdefault(target, {}).update(loaded[target])
+
+        if lazy:
+            secrets[target] = LazySecrets(
+                target, secrets.get(target, {}), lazy, configuration)
 
     logger.debug("Secrets loaded")
 
     return secrets
 
 
+class LazySecrets(dict):
+    """
+    Secrets of a target, some of which are only loaded from their backend
+    the first time they are looked up.
+
+    This is a dictionary, so it can be copied, changed or serialized like
+    the secrets of any other target. Checking whether a key is declared
+    does not load anything. Looking up a key which is not loaded yet, or
+    anything going over all the secrets, loads all of them at once. Keys
+    set before that keep their value. Raises :exc:`ActivityFailed` when
+    they cannot be loaded.
+    """
+    def __init__(self, target: str, loaded: Dict[str, Any],
+                 pending: Dict[str, Dict[str, Any]],
+                 configuration: Configuration = None):
+        dict.__init__(self, loaded)
+        self.target = target
+        self._pending = dict(pending)
+        self._pending_keys = frozenset(
+            k for entries in pending.values() for k in entries)
+        self._configuration = configuration
+        self._lock = threading.Lock()
+
+    @property
+    def resolved(self) -> bool:
+        return not self._pending
+
+    def resolve(self) -> Dict[str, Any]:
+        """
+        Load the secrets not loaded yet and return all of them.
+        """
+        with self._lock:
+            for name in list(self._pending):
+                logger.debug("Loading '{t}' secrets of type '{n}'".format(
+                    t=self.target, n=name))
+                backend = get_secret_backend(name)
+                try:
+                    loaded = backend.loader(
+                        {self.target: self._pending[name]},
+                        self._configuration)
+                except ActivityFailed:
+                    raise
+                except Exception as x:
+                    raise ActivityFailed(
+                        "Failed to load '{t}' secrets of type '{n}': "
+                        "{x}".format(t=self.target, n=name, x=str(x)))
+                for (key, value) in loaded.get(self.target, {}).items():
+                    dict.setdefault(self, key, value)
+                self._pending.pop(name)
+        return dict(dict.items(self))
+
+    def copy(self) -> Dict[str, Any]:
+        return self.resolve()
+
+    def __getitem__(self, key: str) -> Any:
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        if key in self._pending_keys and not self.resolved:
+            self.resolve()
+        return dict.__getitem__(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        if dict.__contains__(self, key):
+            return True
+        return key in self._pending_keys and not self.resolved
+
+    def __iter__(self):
+        self.resolve()
+        return dict.__iter__(self)
+
+    def __len__(self) -> int:
+        self.resolve()
+        return dict.__len__(self)
+
+    def __eq__(self, other: Any) -> bool:
+        self.resolve()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other: Any) -> bool:
+        self.resolve()
+        return dict.__ne__(self, other)
+
+    def __delitem__(self, key: str):
+        self.resolve()
+        dict.__delitem__(self, key)
+
+    def keys(self):
+        self.resolve()
+        return dict.keys(self)
+
+    def values(self):
+        self.resolve()
+        return dict.values(self)
+
+    def items(self):
+        self.resolve()
+        return dict.items(self)
+
+    def pop(self, *args: Any) -> Any:
+        self.resolve()
+        return dict.pop(self, *args)
+
+    def popitem(self) -> Tuple[str, Any]:
+        self.resolve()
+        return dict.popitem(self)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self.resolve()
+        return dict.setdefault(self, key, default)
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            dict.clear(self)
+
+    def __repr__(self) -> str:
+        return "LazySecrets({t!r}, keys={k!r})".format(
+            t=self.target,
+            k=sorted(set(dict.keys(self)) | self._pending_keys))
+
+    def __reduce__(self):
+        return (self.__class__, (
+            self.target, dict(dict.items(self)), self._pending,
+            self._configuration))
+
+
+def register_secret_backend(name: str, loader: SecretLoader,
+                            lazy: bool = True, check: SecretChecker = None):
+    """
+    Register the loader of the secrets declared with `"type": name`.
+
+    The loader is called with the secrets of that type, as a mapping of
+    targets to keys, and the configuration. It returns the loaded secrets
+    with the same shape. Lazy backends are only called once their secrets
+    are looked up, their `check` function, if any, is called with the
+    configuration when the secrets are loaded instead. It should raise
+    :exc:`InvalidExperiment` when the backend cannot be used.
+    """
+    _secret_backends[name] = SecretBackend(
+        loader=loader, lazy=lazy, check=check)
+
+
+def get_secret_backend(name: str) -> Optional[SecretBackend]:
+    """
+    Return the backend registered for that type of secrets or `None`.
+    Backends declared as entry points are discovered the first time an
+    unknown type is met.
+    """
+    backend = _secret_backends.get(name)
+    if backend is None and name and not _entry_points_discovered:
+        discover_secret_backends()
+        backend = _secret_backends.get(name)
+    return backend
+
+
+def resolve_secrets(secrets: Secrets) -> Secrets:
+    """
+    Return the given secrets with the lazily loaded targets loaded, as plain
+    dictionaries.
+    """
+    if not secrets:
+        return secrets
+
+    return {
+        target: dict(keys) if isinstance(keys, LazySecrets) else keys
+        for (target, keys) in secrets.items()
+    }
+
+
 def load_inline_secrets(secrets_info: Dict[str, Dict[str, str]],
                         configuration: Configuration = None) -> Secrets:
     """
@@ -104,7 +325,7 @@ def load_inline_secrets(secrets_info: Dict[str, Dict[str, str]],
         for (key, value) in keys.items():
             if not isinstance(value, dict):
                 secrets[target][key] = value
-            elif value.get("type") not in ("env", "vault"):
+            elif get_secret_backend(value.get("type")) is None:
                 secrets[target][key] = value
 
         if not secrets[target]:
@@ -182,71 +403,102 @@ def load_secrets_from_vault(secrets_info: Dict[str, Dict[str, str]],
 
     In that case, `mykey` will be set to the value at `secret/foo/bar` under
     the Vault secret key `mypassword`.
-    """
-    secrets = {}
 
-    client = create_vault_client(configuration)
+    Identical paths are read only once and distinct paths are read
+    concurrently. The Vault client and the read secrets are kept in memory
+    for a short while so that validating then running an experiment does
+    not authenticate and read them again. This is set in the `runtime`
+    section of the settings:
+
+    ```yaml
+    runtime:
+      vault:
+        cache_ttl: 60
+        max_workers: 8
+    ```
 
+    The cache lasts 60 seconds by default, set `cache_ttl` to `0` to disable
+    it. Either way, it is dropped when the run of an experiment ends so that
+    the next run reads the secrets again.
+    """
+    vault_secrets = []
     for (target, keys) in secrets_info.items():
-        secrets[target] = {}
-
         for (key, value) in keys.items():
             if isinstance(value, dict) and value.get("type") == "vault":
-                if not HAS_HVAC:
-                    logger.error(
-                        "Install the `hvac` package to fetch secrets "
-                        "from Vault: `pip install chaostoolkit-lib[vault]`.")
-                    return {}
-
-                path = value.get("path")
-                if path is None:
-                    logger.warning(
-                        "Missing Vault secret path for '{}'".format(key))
-                    continue
-
-                # see https://github.com/chaostoolkit/chaostoolkit/issues/98
-                kv = client.secrets.kv
-                is_kv1 = kv.default_kv_version == "1"
-                if is_kv1:
-                    vault_payload = kv.v1.read_secret(
-                        path=path,
-                        mount_point=configuration.get(
-                            "vault_secrets_mount_point", "secret"))
-                else:
-                    vault_payload = kv.v2.read_secret_version(
-                        path=path,
-                        mount_point=configuration.get(
-                            "vault_secrets_mount_point", "secret"))
-
-                if not vault_payload:
-                    logger.warning(
-                        "No Vault secret found at path: {}".format(path))
-                    continue
-
-                if is_kv1:
-                    data = vault_payload.get("data")
-                else:
-                    data = vault_payload.get("data", {}).get("data")
-
-                if "key" in value:
-                    vault_key = value["key"]
-                    if vault_key not in data:
-                        logger.warning(
-                            "No Vault key '{}' at secret path '{}'".format(
-                                vault_key, path))
-                        continue
-
-                    secrets[target][key] = data.get(vault_key)
-
-                else:
-                    secrets[target][key] = data
+                vault_secrets.append((target, key, value))
 
-        if not secrets[target]:
-            secrets.pop(target)
+    if not vault_secrets:
+        return {}
+
+    if not HAS_HVAC:
+        logger.error(
+            "Install the `hvac` package to fetch secrets "
+            "from Vault: `pip install chaostoolkit-lib[vault]`.")
+        return {}
+
+    configuration = configuration or {}
+    paths = []
+    for (target, key, value) in vault_secrets:
+        path = value.get("path")
+        if path is None:
+            logger.warning(
+                "Missing Vault secret path for '{}'".format(key))
+        elif path not in paths:
+            paths.append(path)
+
+    payloads = read_vault_secrets(paths, configuration)
+
+    secrets = {}
+    for (target, key, value) in vault_secrets:
+        path = value.get("path")
+        if path is None:
+            continue
+
+        data = payloads.get(path)
+        if data is None:
+            logger.warning(
+                "No Vault secret found at path: {}".format(path))
+            continue
+
+        if "key" in value:
+            vault_key = value["key"]
+            if vault_key not in data:
+                logger.warning(
+                    "No Vault key '{}' at secret path '{}'".format(
+                        vault_key, path))
+                continue
+
+            secrets.setdefault(target, {})[key] = data.get(vault_key)
+
+        else:
+            secrets.setdefault(target, {})[key] = data
 
     return secrets
 
 
+def check_vault_configuration(configuration: Configuration = None):
+    """
+    Create the Vault client, which is cached like the secrets, so that a
+    wrong Vault configuration is reported before any secret is read.
+    """
+    if not HAS_HVAC:
+        return
+
+    ttl = get_vault_settings().get("cache_ttl", DEFAULT_VAULT_CACHE_TTL)
+    get_vault_client(configuration or {}, ttl)
+
+
+def clear_vault_cache():
+    """
+    Forget the Vault clients and secrets kept in memory.
+
+    This is called once the run of an experiment is over.
+    """
+    with _vault_lock:
+        _vault_clients.clear()
+        _vault_secrets.clear()
+
+
 ###############################################################################
 # Internals
 ###############################################################################
@@ -306,3 +558,169 @@ def create_vault_client(configuration: Configuration = None):
                     "errors: '{errors}'".format(errors=str(e)))
 
     return client
+
+
+def get_vault_settings() -> Dict[str, Any]:
+    settings = get_loaded_settings() or {}
+    return settings.get("runtime", {}).get("vault", {})
+
+
+def get_vault_client_key(configuration: Configuration) -> Tuple[Any, ...]:
+    return tuple(configuration.get(k) for k in VAULT_CLIENT_KEYS)
+
+
+def get_vault_client(configuration: Configuration, ttl: float):
+    """
+    Return a Vault client for this configuration, reusing the one created
+    less than `ttl` seconds ago if any.
+    """
+    key = get_vault_client_key(configuration)
+    client = get_cached(_vault_clients, key)
+    if client is None:
+        client = create_vault_client(configuration)
+        if ttl:
+            set_cached(_vault_clients, key, client, ttl)
+    return client
+
+
+def read_vault_secrets(paths: List[str],
+                       configuration: Configuration) -> Dict[str, Any]:
+    """
+    Read the data of the secrets at the given paths, those found in the cache
+    are not read again and the others are read concurrently.
+    """
+    vault_settings = get_vault_settings()
+    ttl = vault_settings.get("cache_ttl", DEFAULT_VAULT_CACHE_TTL)
+    max_workers = vault_settings.get(
+        "max_workers", DEFAULT_VAULT_MAX_WORKERS)
+
+    mount_point = configuration.get("vault_secrets_mount_point", "secret")
+    client_key = get_vault_client_key(configuration)
+
+    payloads = {}
+    missing = []
+    for path in paths:
+        data = get_cached(_vault_secrets, (client_key, mount_point, path))
+        if data is not None:
+            payloads[path] = data
+        else:
+            missing.append(path)
+
+    if not missing:
+        return payloads
+
+    client = get_vault_client(configuration, ttl)
+    if len(missing) == 1:
+        fetched = [read_vault_secret(client, missing[0], mount_point)]
+    else:
+        pool = WorkerPool(min(len(missing), max_workers), name="vault")
+        try:
+            fetched = list(pool.map(
+                lambda p: read_vault_secret(client, p, mount_point),
+                missing))
+        finally:
+            pool.shutdown(wait=True)
+
+    for (path, data) in zip(missing, fetched):
+        payloads[path] = data
+        if data is not None and ttl:
+            set_cached(_vault_secrets, (client_key, mount_point, path),
+                       data, ttl)
+
+    return payloads
+
+
+def read_vault_secret(client, path: str, mount_point: str) -> Optional[Any]:
+    """
+    Read the data of the secret at `path` or `None` when there is none.
+    """
+    # see https://github.com/chaostoolkit/chaostoolkit/issues/98
+    kv = client.secrets.kv
+    is_kv1 = kv.default_kv_version == "1"
+    if is_kv1:
+        vault_payload = kv.v1.read_secret(
+            path=path, mount_point=mount_point)
+    else:
+        vault_payload = kv.v2.read_secret_version(
+            path=path, mount_point=mount_point)
+
+    if not vault_payload:
+        return None
+
+    if is_kv1:
+        return vault_payload.get("data")
+    return vault_payload.get("data", {}).get("data")
+
+
+def get_cached(cache: Dict[Tuple[Any, ...], Tuple[float, Any]],
+               key: Tuple[Any, ...]) -> Optional[Any]:
+    with _vault_lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        (expires_at, value) = entry
+        if expires_at < time.monotonic():
+            cache.pop(key, None)
+            return None
+        return value
+
+
+def set_cached(cache: Dict[Tuple[Any, ...], Tuple[float, Any]],
+               key: Tuple[Any, ...], value: Any, ttl: float):
+    now = time.monotonic()
+    with _vault_lock:
+        for k in [k for (k, (e, _)) in cache.items() if e < now]:
+            cache.pop(k)
+        cache[key] = (now + ttl, value)
+
+
+def group_by_backend(keys: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Group the secrets of a target by the name of their backend, inline
+    secrets are left out.
+    """
+    groups = {}
+    for (key, value) in keys.items():
+        if isinstance(value, dict):
+            name = value.get("type")
+            if get_secret_backend(name) is not None:
+                groups.setdefault(name, {})[key] = value
+    return groups
+
+
+def discover_secret_backends():
+    """
+    Register the backends declared in the `chaostoolkit.secret_backends`
+    entry point group. Their module is only imported once they are used.
+    """
+    global _entry_points_discovered
+    _entry_points_discovered = True
+
+    try:
+        # only needed, and so imported, once backends are looked up
+        import pkg_resources
+    except ImportError:
+        logger.debug(
+            "setuptools is not installed, {k} backends cannot be "
+            "discovered".format(k="secret"))
+        return
+
+    for entry_point in pkg_resources.iter_entry_points(SECRET_BACKENDS_GROUP):
+        if entry_point.name in _secret_backends:
+            continue
+        logger.debug("Found '{n}' secret backend from '{e}'".format(
+            n=entry_point.name, e=entry_point.module_name))
+        register_secret_backend(
+            entry_point.name, make_entry_point_loader(entry_point))
+
+
+def make_entry_point_loader(entry_point) -> SecretLoader:
+    def load(secrets_info: Dict[str, Dict[str, Any]],
+             configuration: Configuration = None) -> Secrets:
+        return entry_point.load()(secrets_info, configuration)
+    return load
+
+
+register_secret_backend("env", load_secrets_from_env, lazy=False)
+register_secret_backend(
+    "vault", load_secrets_from_vault, check=check_vault_configuration)
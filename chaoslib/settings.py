@@ -26,7 +26,8 @@ def load_settings(settings_path: str = CHAOSTOOLKIT_CONFIG_PATH) -> Settings:
 
     with open(settings_path) as f:
         try:
-            settings = yaml.safe_load(f.read())
+            settings = yaml.load(
+                f.read(), Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
             loaded_settings.set(settings)
             return settings
         except yaml.YAMLError as ye:
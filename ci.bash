@@ -16,6 +16,20 @@ function run-test () {
     python3 setup.py test
 }
 
+function benchmark () {
+    echo "Comparing the benchmarks against the stored baseline"
+    python3 -m pytest benchmarks -p no:sugar --benchmark-only \
+        --benchmark-storage=benchmarks/.baselines \
+        --benchmark-compare --benchmark-compare-fail=mean:20%
+}
+
+function benchmark-save () {
+    echo "Storing a new benchmarks baseline"
+    python3 -m pytest benchmarks -p no:sugar --benchmark-only \
+        --benchmark-storage=benchmarks/.baselines \
+        --benchmark-save=baseline
+}
+
 function release () {
     echo "Releasing the package"
     python3 setup.py release
@@ -26,6 +40,11 @@ function release () {
 }
 
 function main () {
+    case "$1" in
+        benchmark) benchmark; return $? ;;
+        benchmark-save) benchmark-save; return $? ;;
+    esac
+
     lint || return 1
     build || return 1
     run-test || return 1
@@ -74,6 +74,9 @@ extras_require = {
     "jsonpath": [
         "jsonpath2>=0.2.1"
     ],
+    "async": [
+        "aiohttp>=3.5"
+    ],
     "decoders": [
         "cchardet>=2.1.4",
         "chardet>=3.0.4"
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+from chaoslib.types import Secrets
+
+received_secrets = None
+
+
+def configure_control(secrets: Secrets):
+    global received_secrets
+    received_secrets = secrets
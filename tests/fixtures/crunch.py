@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import signal
+import time
+
+from chaoslib.deadline import get_remaining_time
+
+
+def count_primes(limit: int = 20000, configuration=None, secrets=None):
+    count = 0
+    for n in range(2, limit):
+        for d in range(2, int(n ** 0.5) + 1):
+            if n % d == 0:
+                break
+        else:
+            count = count + 1
+    return {
+        "count": count, "pid": os.getpid(),
+        "configuration": configuration, "secrets": secrets
+    }
+
+
+def spin(seconds: float = 10):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+    return "done"
+
+
+def spin_until_deadline(seconds: float = 10):
+    end = time.time() + seconds
+    while time.time() < end and get_remaining_time() != 0:
+        pass
+    return "done"
+
+
+async def nap(seconds: float = 10):
+    await asyncio.sleep(seconds)
+    return "done"
+
+
+def collect(items: list, tags: dict, configuration=None):
+    items.append(len(items))
+    tags["seen"] = True
+    return {"items": items, "tags": tags}
+
+
+def fail():
+    raise ValueError("no luck")
+
+
+def stuck(seconds: float = 10):
+    # ignores the timer the worker uses to enforce the timeout
+    signal.signal(signal.SIGALRM, signal.SIG_IGN)
+    time.sleep(seconds)
+    return "done"
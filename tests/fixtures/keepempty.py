@@ -3,3 +3,7 @@
 
 def not_an_activity():
     print("boom")
+
+
+def read_configuration(configuration=None, secrets=None):
+    return configuration
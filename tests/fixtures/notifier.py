@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import time
+
 from logzero import logger
 
 __all__ = ["notify"]
@@ -10,3 +12,11 @@ def notify(settings, event_payload):
 
 def notify_other(settings, event_payload):
     logger.debug("doh")
+
+
+received = []
+
+
+def notify_slowly(settings, event_payload):
+    time.sleep(0.2)
+    received.append(event_payload)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Helper serving process activities as JSON Lines over stdin and stdout
+import json
+import os
+import sys
+import time
+
+
+def serve():
+    for line in sys.stdin:
+        request = json.loads(line)
+        arguments = request["arguments"]
+        if arguments and arguments[0] == "sleep":
+            time.sleep(float(arguments[1]))
+        elif arguments and arguments[0] == "exit":
+            return
+
+        deaf = arguments and arguments[0] == "deaf"
+
+        response = {
+            "id": request["id"],
+            "status": 0,
+            "stdout": "{p} {a}".format(p=os.getpid(), a=" ".join(arguments)),
+            "stderr": str(request.get("timeout", ""))
+        }
+        sys.stdout.write(json.dumps(response) + "\n")
+        sys.stdout.flush()
+        if deaf:
+            # answer but never read the next requests
+            time.sleep(30)
+            return
+
+
+if __name__ == "__main__":
+    serve()
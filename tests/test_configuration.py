@@ -3,7 +3,8 @@ import os
 
 import pytest
 
-from chaoslib.configuration import load_configuration
+from chaoslib.configuration import load_configuration, \
+    register_configuration_backend, _configuration_backends
 
 
 def test_should_load_configuration():
@@ -18,3 +19,19 @@ def test_should_load_configuration():
 
     assert config["token1"] == "value1"
     assert config["token2"] == "value2"
+
+
+def test_should_load_configuration_from_registered_backend():
+    register_configuration_backend(
+        "upper", lambda value: value["value"].upper())
+    try:
+        config = load_configuration({
+            "token": {
+                "type": "upper",
+                "value": "hello"
+            }
+        })
+    finally:
+        _configuration_backends.pop("upper")
+
+    assert config["token"] == "HELLO"
@@ -16,7 +16,8 @@ from chaoslib.control import initialize_controls, cleanup_controls, \
     validate_controls, controls, get_all_activities, get_context_controls, \
     initialize_global_controls, cleanup_global_controls, get_global_controls, \
     load_global_controls
-from chaoslib.control.python import validate_python_control
+from chaoslib.control.python import load_control_hook, \
+    validate_python_control
 from chaoslib.exceptions import InterruptExecution, InvalidActivity
 from chaoslib.experiment import run_experiment
 from chaoslib.loader import load_experiment
@@ -555,3 +556,36 @@ def test_controls_on_loaded_experiment():
             assert experiment["title"] == "BOOM I changed it"
         finally:
             cleanup_global_controls()
+
+
+def test_control_functions_are_resolved_once_per_experiment():
+    exp = deepcopy(experiments.ExperimentWithControls)
+    activity = exp["method"][0]
+    initialize_controls(exp)
+    try:
+        with patch("chaoslib.control.load_control_hook",
+                   wraps=load_control_hook) as load:
+            for _ in range(3):
+                with controls(level="activity", experiment=exp,
+                              context=activity) as c:
+                    c.with_state({})
+
+        # once for the "before" scope and once for the "after" one
+        assert load.call_count == 2
+        assert activity["before_activity_control"] is True
+        assert activity["after_activity_control"] is True
+    finally:
+        cleanup_controls(exp)
+
+
+def test_control_functions_are_resolved_every_time_when_not_initialized():
+    exp = deepcopy(experiments.ExperimentWithControls)
+    activity = exp["method"][0]
+    with patch("chaoslib.control.load_control_hook",
+               wraps=load_control_hook) as load:
+        for _ in range(3):
+            with controls(level="activity", experiment=exp,
+                          context=activity) as c:
+                c.with_state({})
+
+    assert load.call_count == 6
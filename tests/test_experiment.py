@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from datetime import datetime
 import json
 import os.path
@@ -6,15 +9,22 @@ import signal
 import sys
 import tempfile
 import types
+import uuid
+from unittest.mock import patch
 
 import pytest
 import requests_mock
 import yaml
 
-from chaoslib.exceptions import ActivityFailed, InvalidActivity, \
-    InvalidExperiment
+from chaoslib.caching import ActivityIndex
+from chaoslib.control import get_global_controls
+from chaoslib.exceptions import ActivityFailed, ChaosException, \
+    InvalidActivity, InvalidExperiment
 from chaoslib.experiment import ensure_experiment_is_valid, load_experiment, \
-    run_experiment, run_activities
+    run_experiment, run_experiment_async, run_activities, \
+    run_experiments, validate_experiment
+from chaoslib.journal import assemble_journal
+from chaoslib.settings import loaded_settings
 from chaoslib.types import Experiment
 
 from fixtures import config, experiments
@@ -254,3 +264,433 @@ def test_dry_run_should_not_pause_before():
     pause_before_duration = int(experiment["method"][1]["pauses"]["before"])
 
     assert experiment_run_time < pause_before_duration
+
+
+def run_async(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_can_run_experiment_asynchronously():
+    journal = run_async(run_experiment_async(experiments.ExperimentNoControls))
+    assert journal["status"] == "completed"
+    assert journal["steady_states"]["before"]["steady_state_met"] is True
+    assert journal["steady_states"]["after"]["steady_state_met"] is True
+    assert len(journal["run"]) == 1
+    assert journal["run"][0]["status"] == "succeeded"
+    assert journal["run"][0]["output"] is True
+    assert len(journal["rollbacks"]) == 1
+
+
+def test_async_journal_has_the_same_format_as_the_sync_one():
+    experiment = experiments.Experiment.copy()
+    experiment["dry"] = True
+
+    sync_journal = run_experiment(experiment)
+    async_journal = run_async(run_experiment_async(experiment))
+
+    assert sorted(async_journal.keys()) == sorted(sync_journal.keys())
+    assert async_journal["status"] == sync_journal["status"]
+    assert len(async_journal["run"]) == len(sync_journal["run"])
+    for async_run, sync_run in zip(async_journal["run"], sync_journal["run"]):
+        assert sorted(async_run.keys()) == sorted(sync_run.keys())
+        assert async_run["activity"] == sync_run["activity"]
+    assert len(async_journal["rollbacks"]) == len(sync_journal["rollbacks"])
+
+
+def test_async_process_activity_is_killed_on_timeout():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    experiment["method"] = [{
+        "type": "action",
+        "name": "sleep-for-too-long",
+        "provider": {
+            "type": "process",
+            "path": sys.executable,
+            "arguments": ["-c", "import time; time.sleep(10)"],
+            "timeout": 0.5
+        }
+    }]
+
+    start = datetime.utcnow()
+    journal = run_async(run_experiment_async(experiment))
+    end = datetime.utcnow()
+
+    assert (end - start).total_seconds() < 5
+    assert journal["run"][0]["status"] == "failed"
+    assert "took too long" in journal["run"][0]["exception"][-1]
+
+
+def test_hypothesis_probes_can_run_in_parallel():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    probe = experiment["steady-state-hypothesis"]["probes"][0]
+    probe["pauses"] = {"before": 0.5}
+    probes = []
+    for i in range(4):
+        p = deepcopy(probe)
+        p["name"] = "probe-{}".format(i)
+        probes.append(p)
+    experiment["steady-state-hypothesis"]["probes"] = probes
+    experiment["steady-state-hypothesis"]["parallel"] = True
+
+    start = datetime.utcnow()
+    journal = run_experiment(experiment)
+    end = datetime.utcnow()
+
+    assert journal["status"] == "completed"
+    # sequentially, both hypothesis would take at least 4s
+    assert (end - start).total_seconds() < 3
+    before = journal["steady_states"]["before"]
+    assert before["steady_state_met"] is True
+    assert [r["activity"]["name"] for r in before["probes"]] == [
+        "probe-0", "probe-1", "probe-2", "probe-3"]
+
+
+def test_parallel_hypothesis_reports_the_deviating_probe():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    probe = experiment["steady-state-hypothesis"]["probes"][0]
+    deviating = deepcopy(probe)
+    deviating["name"] = "deviating-probe"
+    deviating["tolerance"] = False
+    slow = deepcopy(probe)
+    slow["name"] = "slow-probe"
+    slow["pauses"] = {"before": 0.5}
+    experiment["steady-state-hypothesis"]["probes"] = [
+        deviating, slow, probe]
+    experiment["steady-state-hypothesis"]["parallel"] = True
+
+    journal = run_experiment(experiment)
+    assert journal["status"] == "failed"
+    before = journal["steady_states"]["before"]
+    assert before["steady_state_met"] is False
+    assert before["probes"][0]["activity"]["name"] == "deviating-probe"
+    assert before["probes"][0]["tolerance_met"] is False
+
+
+def test_async_hypothesis_probes_are_bounded_by_max_workers():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    probe = experiment["steady-state-hypothesis"]["probes"][0]
+    probe["pauses"] = {"before": 0.5}
+    probes = []
+    for i in range(4):
+        p = deepcopy(probe)
+        p["name"] = "probe-{}".format(i)
+        probes.append(p)
+    experiment["steady-state-hypothesis"]["probes"] = probes
+    experiment["steady-state-hypothesis"]["parallel"] = True
+
+    token = loaded_settings.set({
+        "runtime": {"hypothesis": {"max_workers": 2}}})
+    try:
+        start = datetime.utcnow()
+        journal = run_async(run_experiment_async(experiment))
+        end = datetime.utcnow()
+    finally:
+        loaded_settings.reset(token)
+
+    assert journal["status"] == "completed"
+    # two hypothesis of four probes, two at a time, pausing 0.5s each
+    assert (end - start).total_seconds() >= 2
+    before = journal["steady_states"]["before"]
+    assert [r["activity"]["name"] for r in before["probes"]] == [
+        "probe-0", "probe-1", "probe-2", "probe-3"]
+
+
+def test_both_engines_record_the_same_probes_on_deviation():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    probe = experiment["steady-state-hypothesis"]["probes"][0]
+    deviating = deepcopy(probe)
+    deviating["name"] = "deviating-probe"
+    deviating["tolerance"] = False
+    slow = deepcopy(probe)
+    slow["name"] = "slow-probe"
+    slow["pauses"] = {"before": 0.5}
+    experiment["steady-state-hypothesis"]["probes"] = [slow, deviating]
+    experiment["steady-state-hypothesis"]["parallel"] = True
+
+    journals = [
+        run_experiment(deepcopy(experiment)),
+        run_async(run_experiment_async(deepcopy(experiment)))
+    ]
+    for journal in journals:
+        before = journal["steady_states"]["before"]
+        assert before["steady_state_met"] is False
+        # the slow probe was running when the other one deviated
+        assert [r["activity"]["name"] for r in before["probes"]] == [
+            "slow-probe", "deviating-probe"]
+        assert before["probes"][0]["status"] == "succeeded"
+
+
+def test_hypothesis_parallel_flag_must_be_a_boolean():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    experiment["steady-state-hypothesis"]["parallel"] = "yes"
+
+    with pytest.raises(InvalidExperiment) as x:
+        ensure_experiment_is_valid(experiment)
+    assert "hypothesis parallel must be a boolean" in str(x.value)
+
+
+def test_journal_can_be_streamed_to_a_file():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    activity = deepcopy(experiment["method"][0])
+    activity["name"] = "background-probe"
+    activity["background"] = True
+    activity["pauses"] = {"before": 0.2}
+    experiment["method"].insert(0, activity)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "journal.jsonl")
+        journal = run_experiment(
+            experiment, settings={"runtime": {"journal": {"path": path}}})
+
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+
+    assert [r["type"] for r in records if r["type"] != "run"] == [
+        "journal", "steady_state", "steady_state", "end"]
+    assert len([r for r in records if r["type"] == "run"]) == 3
+
+    assert journal["status"] == "completed"
+    assert journal["steady_states"]["before"]["steady_state_met"] is True
+    assert journal["steady_states"]["after"]["steady_state_met"] is True
+    assert [r["activity"]["name"] for r in journal["run"]] == [
+        a["name"] for a in experiment["method"]]
+    assert all("output" in r for r in journal["run"])
+    assert len(journal["rollbacks"]) == 1
+
+
+def test_streamed_journal_has_the_shape_of_an_unstreamed_one():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    unstreamed = run_experiment(deepcopy(experiment))
+
+    with tempfile.TemporaryDirectory() as d:
+        settings = {"runtime": {"journal": {
+            "path": os.path.join(d, "journal.jsonl")}}}
+        journals = [
+            run_experiment(deepcopy(experiment), settings),
+            run_async(run_experiment_async(deepcopy(experiment), settings))]
+
+    for journal in journals:
+        assert sorted(journal.keys()) == sorted(unstreamed.keys())
+        for section in ("run", "rollbacks"):
+            assert [sorted(r.keys()) for r in journal[section]] == [
+                sorted(r.keys()) for r in unstreamed[section]]
+        for when in ("before", "after"):
+            assert [sorted(r.keys()) for r in
+                    journal["steady_states"][when]["probes"]] == [
+                sorted(r.keys()) for r in
+                unstreamed["steady_states"][when]["probes"]]
+
+
+def test_streamed_journal_can_be_left_unassembled():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "journal.jsonl")
+        journal = run_experiment(experiment, settings={
+            "runtime": {"journal": {"path": path, "assemble": False}}})
+
+        assembled = assemble_journal(path)
+
+    assert journal["status"] == assembled["status"] == "completed"
+    assert [r["activity"] for r in journal["run"]] == [
+        r["activity"] for r in assembled["run"]]
+    assert all("output" not in r for r in journal["run"])
+    assert all("output" in r for r in assembled["run"])
+
+
+@pytest.mark.parametrize("assemble", [False, True])
+def test_outputs_which_are_not_json_are_kept_as_they_are(assemble: bool):
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    experiment["method"] = [{
+        "type": "probe",
+        "name": "make-an-id",
+        "provider": {
+            "type": "python",
+            "module": "uuid",
+            "func": "uuid4"
+        }
+    }]
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "journal.jsonl")
+        journal = run_experiment(experiment, settings={
+            "runtime": {"journal": {"path": path, "assemble": assemble}}})
+
+        assembled = assemble_journal(path)
+
+    assert journal["status"] == "completed"
+    assert isinstance(journal["run"][0]["output"], uuid.UUID)
+    assert assembled["run"][0]["activity"]["name"] == "make-an-id"
+    assert "output" not in assembled["run"][0]
+
+
+def test_partial_streamed_journal_can_be_assembled():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "journal.jsonl")
+        run_experiment(
+            experiment, settings={"runtime": {"journal": {"path": path}}})
+
+        with open(path) as f:
+            lines = f.readlines()
+        # as if the run was interrupted while writing its rollbacks
+        with open(path, "w") as f:
+            f.writelines(lines[:-2])
+            f.write(lines[-2][:10])
+
+        journal = assemble_journal(path)
+
+    assert journal["status"] is None
+    assert journal["steady_states"]["after"]["steady_state_met"] is True
+    assert len(journal["run"]) == 1
+    assert journal["rollbacks"] == []
+
+
+def test_validation_returns_the_loaded_configuration_and_secrets():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    experiment["configuration"] = {"some": "value"}
+    experiment["secrets"] = {"some": {"secret": "hush"}}
+
+    context = validate_experiment(experiment)
+    assert context.experiment is experiment
+    assert context.configuration == {"some": "value"}
+    assert context.secrets == {"some": {"secret": "hush"}}
+
+
+def test_run_experiment_does_not_load_secrets_of_a_validated_experiment():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    experiment["secrets"] = {"some": {"secret": "hush"}}
+    context = validate_experiment(experiment)
+
+    with patch("chaoslib.experiment.load_secrets") as load_secrets:
+        journal = run_experiment(experiment, experiment_context=context)
+        assert journal["status"] == "completed"
+
+        journal = run_async(
+            run_experiment_async(experiment, experiment_context=context))
+        assert journal["status"] == "completed"
+
+    load_secrets.assert_not_called()
+
+
+def test_experiment_context_can_be_given_positionally():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    experiment["secrets"] = {"some": {"secret": "hush"}}
+    context = validate_experiment(experiment)
+
+    with patch("chaoslib.experiment.load_secrets") as load_secrets:
+        journal = run_experiment(experiment, {}, context)
+        assert journal["status"] == "completed"
+
+        journal = run_async(run_experiment_async(experiment, {}, context))
+        assert journal["status"] == "completed"
+
+    load_secrets.assert_not_called()
+
+
+def test_run_experiment_loads_secrets_when_context_is_for_another_one():
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    context = validate_experiment(deepcopy(experiment))
+
+    with patch("chaoslib.experiment.load_secrets") as load_secrets:
+        load_secrets.return_value = {}
+        journal = run_experiment(experiment, experiment_context=context)
+
+    assert journal["status"] == "completed"
+    load_secrets.assert_called_once_with({}, {})
+
+
+def make_experiment_referencing(name: str) -> Experiment:
+    probe = deepcopy(experiments.PythonModuleProbe)
+    probe["name"] = name
+    probe["pauses"] = {"after": 0.2}
+    experiment = deepcopy(experiments.ExperimentNoControls)
+    experiment["method"] = [probe, {"ref": name}]
+    experiment["rollbacks"] = [deepcopy(probe), {"ref": name}]
+    return experiment
+
+
+def test_rollbacks_can_reference_activities():
+    experiment = make_experiment_referencing("rollback-probe")
+    experiment["method"] = []
+    experiment["rollbacks"][0]["name"] = "only-in-rollbacks"
+    experiment["rollbacks"][1]["ref"] = "only-in-rollbacks"
+    index = ActivityIndex(experiment)
+    assert index.get("only-in-rollbacks") is experiment["rollbacks"][0]
+    assert index.referenced_by("only-in-rollbacks") == (("rollbacks", 1),)
+
+    journal = run_experiment(experiment)
+    assert [r["status"] for r in journal["rollbacks"]] == [
+        "succeeded", "succeeded"]
+
+
+def test_concurrent_runs_have_their_own_activity_index():
+    names = ["probe-{}".format(i) for i in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        journals = list(executor.map(
+            lambda n: run_experiment(make_experiment_referencing(n)), names))
+
+    for (name, journal) in zip(names, journals):
+        assert journal["status"] == "completed"
+        assert [r["activity"]["name"] for r in journal["run"]] == [
+            name, name]
+
+
+def test_validated_activity_index_is_reused_by_the_run():
+    experiment = make_experiment_referencing("validated-probe")
+    context = validate_experiment(experiment)
+    assert context.activities.get("validated-probe") is not None
+
+    with patch("chaoslib.caching.ActivityIndex") as index_class:
+        journal = run_experiment(experiment, experiment_context=context)
+
+    index_class.assert_not_called()
+    assert journal["status"] == "completed"
+
+
+@pytest.mark.parametrize("executor", ["thread", "asyncio", "process"])
+def test_run_many_experiments_concurrently(executor: str):
+    names = ["probe-{}".format(i) for i in range(3)]
+    experiments_to_run = [make_experiment_referencing(n) for n in names]
+    experiments_to_run[1]["steady-state-hypothesis"]["probes"][0][
+        "provider"]["arguments"]["path"] = "/nope"
+
+    report = run_experiments(experiments_to_run, executor=executor)
+
+    assert report["executor"] == executor
+    assert report["statuses"] == {"completed": 2, "failed": 1}
+    assert [r["status"] for r in report["runs"]] == [
+        "completed", "failed", "completed"]
+    for (name, run) in zip(names, report["runs"]):
+        if run["status"] == "completed":
+            assert [r["activity"]["name"] for r in run["journal"]["run"]] == [
+                name, name]
+
+
+def test_concurrent_experiments_have_their_own_global_controls():
+    settings = {
+        "dummy-key": "hello there",
+        "controls": {
+            "dummy": {
+                "provider": {
+                    "type": "python",
+                    "module": "fixtures.controls.dummy"
+                }
+            }
+        }
+    }
+    experiments_to_run = [
+        make_experiment_referencing("probe-{}".format(i)) for i in range(3)]
+
+    report = run_experiments(experiments_to_run, settings, max_workers=3)
+
+    assert report["statuses"] == {"completed": 3}
+    assert get_global_controls() == []
+    for experiment in experiments_to_run:
+        assert experiment["control-value"] == "hello there"
+        assert experiment["method"][0]["after_activity_control"] is True
+
+
+def test_run_experiments_requires_a_known_executor():
+    with pytest.raises(ChaosException):
+        run_experiments([], executor="fibers")
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
+import io
 import json
+import os.path
 import pytest
 import requests_mock
 import tempfile
+from unittest.mock import patch
 
 from chaoslib.exceptions import InvalidSource, InvalidExperiment
 from chaoslib.loader import load_experiment, parse_experiment_from_file
@@ -121,3 +124,66 @@ def test_http_loads_fails_when_known_type():
         )
         with pytest.raises(InvalidExperiment):
             load_experiment('http://example.com/experiment.yaml')
+
+
+def test_parsed_yaml_experiment_is_cached():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "experiment.yaml")
+        cache_dir = os.path.join(d, "cache")
+        with open(path, "w") as f:
+            f.write(experiments.YamlExperiment)
+
+        experiment = parse_experiment_from_file(path, cache_dir)
+        cached = os.listdir(cache_dir)
+        assert len(cached) == 1
+
+        with open(os.path.join(cache_dir, cached[0])) as f:
+            assert json.load(f) == experiment
+        assert parse_experiment_from_file(path, cache_dir) == experiment
+
+
+def test_parse_cache_is_skipped_once_the_file_changed():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "experiment.yaml")
+        cache_dir = os.path.join(d, "cache")
+        with open(path, "w") as f:
+            f.write(experiments.YamlExperiment)
+        parse_experiment_from_file(path, cache_dir)
+
+        with open(path, "w") as f:
+            f.write(experiments.YamlExperiment.replace(
+                "do cats live in the Internet?", "do dogs?"))
+
+        experiment = parse_experiment_from_file(path, cache_dir)
+        assert experiment["title"] == "do dogs?"
+        cached = os.listdir(cache_dir)
+        assert len(cached) == 1
+
+        with open(os.path.join(cache_dir, cached[0])) as f:
+            assert json.load(f) == experiment
+
+
+def test_experiment_file_is_not_read_when_cached():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "experiment.yaml")
+        cache_dir = os.path.join(d, "cache")
+        with open(path, "w") as f:
+            f.write(experiments.YamlExperiment)
+        experiment = parse_experiment_from_file(path, cache_dir)
+
+        with patch("chaoslib.loader.io.open", wraps=io.open) as opened:
+            assert parse_experiment_from_file(path, cache_dir) == experiment
+        assert path not in [c[0][0] for c in opened.call_args_list]
+
+
+def test_parse_cache_leaves_no_temporary_file_behind():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "experiment.yaml")
+        cache_dir = os.path.join(d, "cache")
+        with open(path, "w") as f:
+            f.write(experiments.YamlExperiment)
+
+        with patch("chaoslib.loader.os.replace", side_effect=OSError):
+            experiment = parse_experiment_from_file(path, cache_dir)
+        assert experiment["title"] == "do cats live in the Internet?"
+        assert os.listdir(cache_dir) == []
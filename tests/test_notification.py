@@ -8,9 +8,12 @@ import requests
 import requests_mock
 
 from chaoslib.notification import notify, DiscoverFlowEvent, InitFlowEvent, \
-    RunFlowEvent, ValidateFlowEvent
+    RunFlowEvent, ValidateFlowEvent, NotificationDispatcher, \
+    flush_notifications, resolve_notification_plugin
 from chaoslib.types import Experiment, EventPayload
 
+from fixtures import notifier
+
 
 def test_no_settings_is_okay():
     assert notify(None, DiscoverFlowEvent.DiscoverStarted) is None
@@ -221,3 +224,86 @@ def test_notify_via_plugin_failed_to_import_func(logger):
     logger.debug.assert_called_with(
         "could not find function '{f}' in plugin '{mod}' "
         "for notification".format(mod="fixtures.notifier", f="blah"))
+
+
+def test_notify_in_the_background():
+    notifier.received.clear()
+    settings = {
+        "runtime": {
+            "notifications": {
+                "background": True
+            }
+        },
+        "notifications": [
+            {
+                "type": "plugin",
+                "module": "fixtures.notifier",
+                "func": "notify_slowly"
+            }
+        ]
+    }
+
+    start = time.time()
+    notify(settings, RunFlowEvent.RunStarted)
+    notify(settings, RunFlowEvent.RunCompleted)
+    assert time.time() - start < 0.2
+
+    assert flush_notifications(timeout=5) is True
+    assert sorted(p["name"] for p in notifier.received) == [
+        "run-completed", "run-started"]
+
+
+def test_notification_dispatcher_drops_events_when_full():
+    notifier.received.clear()
+    channel = {
+        "type": "plugin",
+        "module": "fixtures.notifier",
+        "func": "notify_slowly"
+    }
+    dispatcher = NotificationDispatcher(
+        max_workers=1, max_queue_size=1, batch_size=1)
+    for i in range(5):
+        dispatcher.dispatch(channel, {"name": "event-{}".format(i)})
+
+    assert dispatcher.close(timeout=5) is True
+    assert len(notifier.received) < 5
+
+
+def test_notification_dispatcher_flush_has_a_deadline():
+    channel = {
+        "type": "plugin",
+        "module": "fixtures.notifier",
+        "func": "notify_slowly"
+    }
+    dispatcher = NotificationDispatcher(max_workers=1, batch_size=1)
+    for i in range(5):
+        dispatcher.dispatch(channel, {"name": "event-{}".format(i)})
+
+    assert dispatcher.flush(timeout=0.1) is False
+    assert dispatcher.flush(timeout=5) is True
+
+
+def test_notification_plugin_is_resolved_once():
+    with patch('chaoslib.provider.python.importlib') as importlib:
+        importlib.import_module.return_value = notifier
+        resolve_notification_plugin("fixtures.notifier", "notify_other")
+        func = resolve_notification_plugin(
+            "fixtures.notifier", "notify_other")
+
+    assert func is notifier.notify_other
+    assert importlib.import_module.call_count <= 1
+
+
+@patch('chaoslib.notification.logger', autospec=True)
+def test_missing_notification_plugin_is_not_imported_again(logger):
+    with patch('chaoslib.provider.python.importlib') as importlib:
+        importlib.import_module.side_effect = ImportError()
+        for _ in range(3):
+            func = resolve_notification_plugin(
+                "fixtures.notifier_missing", "notify")
+            assert func is None
+
+    assert importlib.import_module.call_count == 1
+    logger.debug.assert_called_with(
+        "could not find Python plugin '{mod}' for notification".format(
+            mod="fixtures.notifier_missing"))
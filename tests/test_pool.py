@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from copy import deepcopy
+import threading
+import time
+
+import contextvars
+
+from chaoslib.experiment import get_background_pool
+from chaoslib.pool import WorkerPool
+
+from fixtures import experiments
+
+var = contextvars.ContextVar("var", default=None)
+
+
+def test_pool_is_bounded_and_tracks_queueing():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.1)
+        with lock:
+            running.pop()
+
+    pool = WorkerPool(2)
+    futures = [pool.submit(work) for _ in range(6)]
+    for f in futures:
+        f.result()
+    pool.shutdown()
+
+    assert max(peak) <= 2
+    metrics = pool.metrics
+    assert metrics["submitted"] == 6
+    assert metrics["completed"] == 6
+    assert metrics["queued"] == 0
+    assert metrics["max_queued"] >= 4
+    assert metrics["total_wait"] > 0
+
+
+def test_pool_runs_functions_in_the_caller_context():
+    var.set("hello")
+    pool = WorkerPool(1)
+    try:
+        assert pool.submit(var.get).result() == "hello"
+    finally:
+        pool.shutdown()
+
+
+def test_background_pool_is_shared_and_bounded():
+    experiment = deepcopy(experiments.Experiment)
+    experiment["method"] = [
+        deepcopy(experiments.BackgroundPythonModuleProbe) for _ in range(10)]
+    experiment["rollbacks"] = [
+        deepcopy(experiments.BackgroundPythonModuleProbe) for _ in range(10)]
+
+    pool = get_background_pool(experiment)
+    assert pool.max_workers == 20
+    pool.shutdown()
+
+    pool = get_background_pool(
+        experiment, {"runtime": {"background": {"max_workers": 4}}})
+    assert pool.max_workers == 4
+    pool.shutdown()
+
+    experiment["runtime"] = {"background": {"max_workers": 3}}
+    pool = get_background_pool(
+        experiment, {"runtime": {"background": {"max_workers": 4}}})
+    assert pool.max_workers == 3
+    pool.shutdown()
+
+
+def test_no_background_pool_without_background_activities():
+    assert get_background_pool(experiments.ExperimentNoControls) is None
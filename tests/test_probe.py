@@ -1,15 +1,29 @@
 # -*- coding: utf-8 -*-
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import importlib
 import json
+import os.path
 import sys
 import socket
+import subprocess
+import tempfile
+import time
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from threading import Thread
 
 import pytest
 import requests_mock
 
-from chaoslib.exceptions import ActivityFailed, InvalidActivity
-from chaoslib.activity import ensure_activity_is_valid, run_activity
+from chaoslib.exceptions import ActivityFailed, ActivityTimeout, \
+    InvalidActivity
+from chaoslib.activity import ensure_activity_is_valid, execute_activity, \
+    execute_activity_async, run_activity
+from chaoslib.deadline import activity_deadline, get_timeout
+from chaoslib.provider.http import close_http_sessions, \
+    configure_http_sessions, get_http_session, use_http_session
+from chaoslib.provider.python import load_python_activity, \
+    resolve_python_function
 
 from fixtures import config, experiments, probes
 
@@ -223,3 +237,341 @@ def test_run_http_probe_can_retry():
         run_activity(probe, config.EmptyConfig, experiments.Secrets)
     except ActivityFailed:
         pytest.fail("activity should not have failed")
+
+
+def test_http_sessions_are_shared_per_endpoint():
+    try:
+        s1 = get_http_session("http://example.com/a")
+        s2 = get_http_session("http://example.com/b")
+        s3 = get_http_session("https://example.com/a")
+        s4 = get_http_session("http://example.com/a", verify_tls=False)
+        assert s1 is s2
+        assert s1 is not s3
+        assert s1 is not s4
+    finally:
+        close_http_sessions()
+
+    assert get_http_session("http://example.com/a") is not s1
+    close_http_sessions()
+
+
+def test_idle_http_sessions_are_evicted():
+    configure_http_sessions({"runtime": {"http": {"idle_timeout": 0}}})
+    try:
+        s1 = get_http_session("http://example.com")
+        time.sleep(0.01)
+        assert get_http_session("http://example.com") is not s1
+    finally:
+        configure_http_sessions({"runtime": {"http": {"idle_timeout": 60}}})
+        close_http_sessions()
+
+
+def test_http_sessions_in_use_are_not_evicted():
+    configure_http_sessions({"runtime": {"http": {"idle_timeout": 0}}})
+    try:
+        with use_http_session("http://example.com") as s1:
+            time.sleep(0.01)
+            # another call evicting idle sessions meanwhile
+            get_http_session("http://example.org")
+            assert get_http_session("http://example.com") is s1
+
+        time.sleep(0.01)
+        assert get_http_session("http://example.com") is not s1
+    finally:
+        configure_http_sessions({"runtime": {"http": {"idle_timeout": 60}}})
+        close_http_sessions()
+
+
+def test_http_sessions_in_use_are_not_closed():
+    try:
+        with use_http_session("http://example.com") as s1:
+            close_http_sessions()
+            assert get_http_session("http://example.com") is s1
+    finally:
+        close_http_sessions()
+
+    assert get_http_session("http://example.com") is not s1
+    close_http_sessions()
+
+
+def test_http_sessions_do_not_keep_cookies():
+    with requests_mock.mock() as m:
+        m.post(
+            'http://example.com', text="ok",
+            headers={"Set-Cookie": "session=12345"})
+        run_activity(probes.HTTPProbe, config.EmptyConfig, experiments.Secrets)
+        s = get_http_session("http://example.com")
+        assert len(s.cookies) == 0
+    close_http_sessions()
+
+
+def test_python_function_resolution_is_cached():
+    r1 = resolve_python_function("os.path", "exists")
+    r2 = resolve_python_function("os.path", "exists")
+    assert r1 is r2
+    assert r1.wants_configuration is False
+    assert r1.wants_secrets is False
+
+
+def test_python_function_resolution_is_invalidated_on_reload():
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, "reloadme.py"), "w") as f:
+            f.write("def probe():\n    return 1\n")
+        sys.path.insert(0, d)
+        try:
+            r1 = resolve_python_function("reloadme", "probe")
+            assert r1.func() == 1
+
+            with open(os.path.join(d, "reloadme.py"), "w") as f:
+                f.write(
+                    "def probe(configuration=None, secrets=None):\n"
+                    "    return 2\n")
+            importlib.invalidate_caches()
+            importlib.reload(r1.module)
+
+            r2 = resolve_python_function("reloadme", "probe")
+            assert r2 is not r1
+            assert r2.func() == 2
+            assert r2.wants_configuration is True
+            assert r2.wants_secrets is True
+        finally:
+            sys.path.remove(d)
+            sys.modules.pop("reloadme", None)
+
+
+def test_declared_python_arguments_are_not_altered():
+    probe = {
+        "type": "probe",
+        "name": "read-config",
+        "provider": {
+            "type": "python",
+            "module": "fixtures.keepempty",
+            "func": "read_configuration",
+            "secrets": ["ident"],
+            "arguments": {}
+        }
+    }
+
+    func, arguments = load_python_activity(
+        probe, {"name": "Jane"}, {"ident": {"token": "XYZ"}})
+
+    assert arguments == {
+        "configuration": {"name": "Jane"},
+        "secrets": {"token": "XYZ"}
+    }
+    assert probe["provider"]["arguments"] == {}
+
+
+@pytest.mark.parametrize("configuration", [{}, {"name": "Jane"}])
+def test_nested_python_arguments_are_not_altered(configuration):
+    probe = {
+        "type": "probe",
+        "name": "collect",
+        "provider": {
+            "type": "python",
+            "module": "fixtures.crunch",
+            "func": "collect",
+            "arguments": {"items": [], "tags": {}}
+        }
+    }
+
+    for _ in range(2):
+        result = run_activity(probe, configuration, {})
+        assert result == {"items": [0], "tags": {"seen": True}}
+    assert probe["provider"]["arguments"] == {"items": [], "tags": {}}
+
+
+def make_process_probe(func: str, arguments: dict = None,
+                       timeout: float = None) -> dict:
+    probe = {
+        "type": "probe",
+        "name": "crunch",
+        "provider": {
+            "type": "python",
+            "module": "fixtures.crunch",
+            "func": func,
+            "executor": "process",
+            "arguments": arguments or {}
+        }
+    }
+    if timeout:
+        probe["provider"]["timeout"] = timeout
+    return probe
+
+
+def test_python_probe_can_run_in_a_worker_process():
+    probe = make_process_probe("count_primes", {"limit": 100})
+    probe["provider"]["secrets"] = ["ident"]
+    ensure_activity_is_valid(probe)
+
+    result = run_activity(
+        probe, {"name": "Jane"}, {"ident": {"token": "XYZ"}})
+    assert result["count"] == 25
+    assert result["pid"] != os.getpid()
+    assert result["configuration"] == {"name": "Jane"}
+    assert result["secrets"] == {"token": "XYZ"}
+
+    # workers are reused from one activity to the next
+    again = run_activity(probe, {"name": "Jane"}, {"ident": {}})
+    assert again["count"] == 25
+
+
+def test_python_probe_in_a_worker_process_is_timed_out():
+    probe = make_process_probe("spin", {"seconds": 10}, timeout=0.5)
+
+    start = time.time()
+    with pytest.raises(ActivityFailed) as x:
+        run_activity(probe, {}, {})
+    assert time.time() - start < 5
+    assert "activity took too long to complete" in str(x.value)
+
+
+def test_stuck_worker_process_is_killed():
+    probe = make_process_probe("stuck", {"seconds": 30}, timeout=0.5)
+
+    start = time.time()
+    with pytest.raises(ActivityFailed) as x:
+        run_activity(probe, {}, {})
+    assert time.time() - start < 10
+    assert "activity took too long to complete" in str(x.value)
+
+    # a new pool is started for the next activity
+    probe = make_process_probe("count_primes", {"limit": 100})
+    assert run_activity(probe, {}, {})["count"] == 25
+
+
+def test_stuck_worker_process_does_not_fail_other_activities():
+    stuck = make_process_probe("stuck", {"seconds": 30}, timeout=0.5)
+    spinning = make_process_probe("spin", {"seconds": 3})
+
+    with ThreadPoolExecutor(2) as executor:
+        running = executor.submit(run_activity, spinning, {}, {})
+        with pytest.raises(ActivityTimeout):
+            run_activity(stuck, {}, {})
+        assert running.result(10) == "done"
+
+
+def test_interpreter_exits_after_running_in_a_worker_process():
+    script = "\n".join([
+        "from chaoslib.activity import run_activity",
+        "probe = {'type': 'probe', 'name': 'crunch', 'provider': {",
+        "    'type': 'python', 'module': 'fixtures.crunch',",
+        "    'func': 'count_primes', 'executor': 'process',",
+        "    'arguments': {'limit': 100}}}",
+        "print(run_activity(probe, {}, {})['count'])"
+    ])
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(__file__)] + sys.path)
+
+    proc = subprocess.run(
+        [sys.executable, "-c", script], stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, env=env, timeout=30)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == b"25"
+    assert b"Error" not in proc.stderr
+
+
+def test_python_probe_failing_in_a_worker_process():
+    probe = make_process_probe("fail")
+
+    with pytest.raises(ActivityFailed) as x:
+        run_activity(probe, {}, {})
+    assert "ValueError: no luck" in str(x.value)
+
+
+def make_thread_probe(func: str, arguments: dict = None,
+                      timeout: float = None) -> dict:
+    probe = make_process_probe(func, arguments)
+    probe["provider"].pop("executor")
+    probe["timeout"] = timeout
+    return probe
+
+
+def test_python_probe_returning_late_is_timed_out():
+    probe = make_thread_probe("spin", {"seconds": 0.5}, timeout=0.2)
+
+    run = execute_activity({}, probe, {}, {})
+    assert run["status"] == "failed"
+    assert run["timed_out"] is True
+    assert "activity took too long to complete" in run["exception"][-1]
+
+
+def test_python_probe_can_stop_at_its_deadline():
+    probe = make_thread_probe("spin_until_deadline", timeout=0.5)
+
+    start = time.time()
+    run = execute_activity({}, probe, {}, {})
+    assert time.time() - start < 5
+    assert run["timed_out"] is True
+
+
+def test_python_probe_within_its_timeout_succeeds():
+    probe = make_thread_probe("spin", {"seconds": 0.1}, timeout=5)
+
+    run = execute_activity({}, probe, {}, {})
+    assert run["status"] == "succeeded"
+    assert run["output"] == "done"
+    assert "timed_out" not in run
+
+
+def test_python_probe_in_a_worker_process_honours_activity_timeout():
+    probe = make_process_probe("spin", {"seconds": 10}, timeout=30)
+    probe["timeout"] = 0.5
+
+    start = time.time()
+    run = execute_activity({}, probe, {}, {})
+    assert time.time() - start < 5
+    assert run["timed_out"] is True
+
+    # the pool recovers from its killed workers
+    probe = make_process_probe("count_primes", {"limit": 100})
+    assert run_activity(probe, {}, {})["count"] == 25
+
+
+def run_async(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_python_coroutine_probe_is_cancelled_by_the_async_engine():
+    probe = make_thread_probe("nap", {"seconds": 10}, timeout=0.5)
+
+    start = time.time()
+    run = run_async(execute_activity_async({}, probe, {}, {}))
+    assert time.time() - start < 5
+    assert run["timed_out"] is True
+
+
+def test_python_probe_sees_its_deadline_in_the_async_engine():
+    probe = make_thread_probe("spin_until_deadline", timeout=0.5)
+
+    start = time.time()
+    run = run_async(execute_activity_async({}, probe, {}, {}))
+    assert time.time() - start < 5
+    assert run["timed_out"] is True
+
+
+def test_provider_timeouts_are_bounded_by_the_activity_deadline():
+    assert get_timeout(30) == 30
+    assert get_timeout(None) is None
+
+    with activity_deadline(2):
+        assert get_timeout(30) <= 2
+        assert get_timeout(1) == 1
+        assert get_timeout(None) <= 2
+        connect, read = get_timeout((1, 30))
+        assert connect == 1
+        assert read <= 2
+
+
+def test_python_probe_executor_must_be_known():
+    probe = make_process_probe("fail")
+    probe["provider"]["executor"] = "gpu"
+
+    with pytest.raises(InvalidActivity) as x:
+        ensure_activity_is_valid(probe)
+    assert "executor of activity 'crunch' must be one of" in str(x.value)
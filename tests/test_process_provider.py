@@ -1,6 +1,27 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import hashlib
+import json
 import os.path
-from chaoslib.provider.process import run_process_activity
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+import chaoslib
+from chaoslib import decode_bytes
+from chaoslib.activity import ensure_activity_is_valid
+from chaoslib.exceptions import ActivityFailed, ActivityTimeout, \
+    InvalidActivity
+from chaoslib.journal import JournalWriter, current_writer
+from chaoslib.output import OutputSpill
+from chaoslib.provider import process
+from chaoslib.provider.process import resolve_executable, \
+    run_process_activity, run_process_activity_async, \
+    shutdown_process_servers
+from chaoslib.settings import loaded_settings
 
 settings_dir = os.path.join(os.path.dirname(__file__), "fixtures")
 
@@ -19,3 +40,418 @@ def test_process_not_utf8_cannot_fail():
     if result['status'] == 0:
         assert result['stderr'] == u''
         assert result['stdout'] == u'é'
+
+
+def test_process_output_over_the_limit_is_spilled_to_disk():
+    with tempfile.TemporaryDirectory() as d:
+        token = loaded_settings.set({
+            "runtime": {"output": {"spill_directory": d}}})
+        try:
+            result = run_process_activity({
+                "max_output_size": 10,
+                "provider": {
+                    "type": "process",
+                    "path": sys.executable,
+                    "arguments": ["-c", "print('a' * 1000)"]
+                }
+            }, None, None)
+        finally:
+            loaded_settings.reset(token)
+
+        assert result["status"] == 0
+        assert result["stdout"] == "a" * 10
+        assert result["stderr"] == ""
+
+        spilled = result["spilled"]["stdout"]
+        assert "stderr" not in result["spilled"]
+        assert spilled["size"] == 1001
+        assert os.path.dirname(spilled["path"]) == d
+        with open(spilled["path"], "rb") as f:
+            content = f.read()
+        assert content == b"a" * 1000 + b"\n"
+        assert spilled["sha256"] == hashlib.sha256(content).hexdigest()
+
+
+def test_process_output_within_the_limit_is_kept():
+    result = run_process_activity({
+        "max_output_size": 1024,
+        "provider": {
+            "type": "process",
+            "path": sys.executable,
+            "arguments": ["-c", "print('hello')"]
+        }
+    }, None, None)
+
+    assert result["stdout"].strip() == "hello"
+    assert "spilled" not in result
+
+
+def test_abandoned_spill_file_is_removed():
+    with tempfile.TemporaryDirectory() as d:
+        with pytest.raises(IOError):
+            with OutputSpill(10, d) as spill:
+                spill.write(b"a" * 100)
+                raise IOError("connection reset")
+
+        assert spill.spilled
+        assert os.listdir(d) == []
+
+
+def test_spill_file_of_a_timed_out_process_is_removed():
+    with tempfile.TemporaryDirectory() as d:
+        token = loaded_settings.set({
+            "runtime": {"output": {"spill_directory": d}}})
+        loop = asyncio.new_event_loop()
+        try:
+            with pytest.raises(ActivityTimeout):
+                loop.run_until_complete(run_process_activity_async({
+                    "max_output_size": 10,
+                    "provider": {
+                        "type": "process",
+                        "path": sys.executable,
+                        "arguments": [
+                            "-u", "-c",
+                            "import time; print('a' * 1000); time.sleep(10)"],
+                        "timeout": 1
+                    }
+                }, None, None))
+        finally:
+            loop.close()
+            loaded_settings.reset(token)
+
+        assert os.listdir(d) == []
+
+
+def test_max_output_size_must_be_a_positive_integer():
+    with pytest.raises(InvalidActivity) as x:
+        ensure_activity_is_valid({
+            "type": "probe",
+            "name": "a-probe",
+            "max_output_size": 0,
+            "provider": {
+                "type": "process",
+                "path": sys.executable
+            }
+        })
+    assert "max_output_size must be a positive integer" in str(x.value)
+
+
+def make_streamed_activity(code: str, stream: dict = None) -> dict:
+    return {
+        "name": "printer",
+        "provider": {
+            "type": "process",
+            "path": sys.executable,
+            "arguments": ["-u", "-c", code],
+            "stream": stream or True
+        }
+    }
+
+
+def test_streamed_process_output_keeps_its_tail():
+    result = run_process_activity(make_streamed_activity(
+        "import sys; print('a' * 100 + 'b' * 10); "
+        "sys.stderr.write('oops')", {"max_size": 11}), None, None)
+
+    assert result["status"] == 0
+    assert result["stdout"] == "b" * 10 + "\n"
+    assert result["stderr"] == "oops"
+    assert result["truncated"] == {"stdout": 100}
+
+
+def test_streamed_process_output_within_its_size_is_kept():
+    result = run_process_activity(make_streamed_activity(
+        "print('hello')"), None, None)
+
+    assert result["stdout"] == "hello\n"
+    assert "truncated" not in result
+
+
+def test_streamed_process_lines_are_forwarded_to_the_journal():
+    activity = make_streamed_activity(
+        "import sys; print('one'); print('two'); sys.stderr.write('three')",
+        {"forward": ["journal"]})
+
+    with tempfile.TemporaryDirectory() as d:
+        writer = JournalWriter(os.path.join(d, "journal.jsonl"))
+        token = current_writer.set(writer)
+        try:
+            run_process_activity(activity, None, None)
+        finally:
+            current_writer.reset(token)
+            writer.close()
+
+        with open(writer.path) as f:
+            records = [json.loads(line) for line in f]
+
+    assert all(r["type"] == "output" for r in records)
+    assert all(r["activity"] == "printer" for r in records)
+    lines = [(r["stream"], r["line"]) for r in records]
+    assert [l for l in lines if l[0] == "stdout"] == [
+        ("stdout", "one"), ("stdout", "two")]
+    assert ("stderr", "three") in lines
+
+
+def test_streamed_process_is_timed_out():
+    activity = make_streamed_activity(
+        "import time; print('started'); time.sleep(10)")
+    activity["provider"]["timeout"] = 0.5
+
+    with pytest.raises(ActivityTimeout):
+        run_process_activity(activity, None, None)
+
+
+def test_streamed_process_output_with_the_async_engine():
+    activity = make_streamed_activity(
+        "print('a' * 100 + 'b' * 10)", {"max_size": 11})
+
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(
+            run_process_activity_async(activity, None, None))
+    finally:
+        loop.close()
+
+    assert result["stdout"] == "b" * 10 + "\n"
+    assert result["truncated"] == {"stdout": 100}
+
+
+def test_streamed_process_output_can_be_enabled_from_settings():
+    activity = make_streamed_activity("print('a' * 100)")
+    activity["provider"].pop("stream")
+
+    token = loaded_settings.set({
+        "runtime": {"process": {"stream": {"max_size": 10}}}})
+    try:
+        result = run_process_activity(activity, None, None)
+    finally:
+        loaded_settings.reset(token)
+
+    assert result["truncated"] == {"stdout": 91}
+
+
+def test_stream_can_only_be_forwarded_to_known_targets():
+    activity = make_streamed_activity("", {"forward": ["slack"]})
+    activity["type"] = "action"
+
+    with pytest.raises(InvalidActivity) as x:
+        ensure_activity_is_valid(activity)
+    assert "stream of activity 'printer' can only be forwarded to" in \
+        str(x.value)
+
+
+def test_utf8_bytes_are_decoded_without_detection(monkeypatch):
+    def detect_encoding(data: bytes):
+        raise AssertionError("encoding should not be detected")
+    monkeypatch.setattr(chaoslib, "detect_encoding", detect_encoding)
+
+    assert decode_bytes("é".encode("utf-8") * 100000) == "é" * 100000
+
+
+def test_detected_encoding_is_remembered_per_source(monkeypatch):
+    samples = []
+
+    def detect_encoding(data: bytes):
+        samples.append(len(data))
+        return "latin-1"
+    monkeypatch.setattr(chaoslib, "detect_encoding", detect_encoding)
+    monkeypatch.setattr(chaoslib, "_detected_encodings", {})
+
+    data = "é".encode("latin-1") * (chaoslib.DETECTION_SAMPLE_SIZE * 2)
+    assert decode_bytes(data, source="/bin/tool") == "é" * len(data)
+    assert samples == [chaoslib.DETECTION_SAMPLE_SIZE]
+
+    assert decode_bytes(b"caf\xe9", source="/bin/tool") == "café"
+    assert len(samples) == 1
+
+    assert decode_bytes(b"caf\xe9", source="/bin/other") == "café"
+    assert len(samples) == 2
+
+
+def test_large_payloads_are_only_detected_on_a_sample(monkeypatch):
+    samples = []
+
+    def detect_encoding(data: bytes):
+        samples.append(len(data))
+        return "ascii"
+    monkeypatch.setattr(chaoslib, "detect_encoding", detect_encoding)
+    monkeypatch.setattr(chaoslib, "_detected_encodings", {})
+
+    size = chaoslib.DETECTION_SAMPLE_SIZE * 16
+    data = b"a" * size + b"caf\xe9"
+    decoded = decode_bytes(data, source="/bin/tool")
+
+    assert decoded == "a" * size + "caf\ufffd"
+    assert samples == [chaoslib.DETECTION_SAMPLE_SIZE]
+    assert "/bin/tool" not in chaoslib._detected_encodings
+
+
+def make_served_activity(*arguments: str, timeout: float = None) -> dict:
+    activity = {
+        "type": "probe",
+        "name": "served",
+        "provider": {
+            "type": "process",
+            "path": sys.executable,
+            "arguments": list(arguments),
+            "server": {
+                "arguments": [os.path.join(settings_dir, "process_server.py")]
+            }
+        }
+    }
+    if timeout:
+        activity["provider"]["timeout"] = timeout
+    return activity
+
+
+@pytest.fixture
+def process_servers():
+    yield
+    shutdown_process_servers()
+
+
+def test_executable_paths_are_resolved_once(monkeypatch):
+    calls = []
+
+    def which(path: str):
+        calls.append(path)
+        return "/usr/local/bin/tool"
+    monkeypatch.setattr(process.shutil, "which", which)
+    monkeypatch.setattr(process, "_executables", {})
+
+    assert resolve_executable("tool") == "/usr/local/bin/tool"
+    assert resolve_executable("tool") == "/usr/local/bin/tool"
+    assert calls == ["tool"]
+
+    monkeypatch.setenv("PATH", "/opt/bin")
+    assert resolve_executable("tool") == "/usr/local/bin/tool"
+    assert calls == ["tool", "tool"]
+
+
+def test_missing_executable_paths_are_not_cached(monkeypatch):
+    monkeypatch.setattr(process, "_executables", {})
+    monkeypatch.setattr(process.shutil, "which", lambda path: None)
+    assert resolve_executable("tool") is None
+
+    monkeypatch.setattr(process.shutil, "which", lambda path: "/bin/tool")
+    assert resolve_executable("tool") == "/bin/tool"
+
+
+def test_process_server_serves_many_activities(process_servers):
+    activity = make_served_activity("get", "pods")
+    ensure_activity_is_valid(activity)
+
+    first = run_process_activity(activity, None, None)
+    pid, arguments = first["stdout"].split(" ", 1)
+    assert first["status"] == 0
+    assert arguments == "get pods"
+    assert int(pid) != os.getpid()
+
+    second = run_process_activity(
+        make_served_activity("get", "nodes"), None, None)
+    assert second["stdout"] == "{p} get nodes".format(p=pid)
+
+
+def test_process_server_is_restarted_after_a_timeout(process_servers):
+    pid = run_process_activity(
+        make_served_activity("ping"), None, None)["stdout"].split()[0]
+
+    with pytest.raises(ActivityTimeout):
+        run_process_activity(
+            make_served_activity("sleep", "10", timeout=0.5), None, None)
+
+    again = run_process_activity(make_served_activity("ping"), None, None)
+    assert again["stdout"].split()[0] != pid
+
+
+def test_process_server_not_reading_times_out(process_servers):
+    deaf = run_process_activity(make_served_activity("deaf"), None, None)
+
+    started = time.monotonic()
+    with pytest.raises(ActivityTimeout):
+        run_process_activity(
+            make_served_activity("a" * 1024 * 1024, timeout=0.5), None, None)
+    assert time.monotonic() - started < 5
+
+    again = run_process_activity(make_served_activity("ping"), None, None)
+    assert again["stdout"].split()[0] != deaf["stdout"].split()[0]
+
+
+def test_process_server_exiting_fails_the_activity(process_servers):
+    with pytest.raises(ActivityFailed) as x:
+        run_process_activity(make_served_activity("exit"), None, None)
+    assert "exited" in str(x.value)
+
+    result = run_process_activity(make_served_activity("ping"), None, None)
+    assert result["status"] == 0
+
+
+def test_process_server_with_the_async_engine(process_servers):
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(run_process_activity_async(
+            make_served_activity("get", "pods"), None, None))
+    finally:
+        loop.close()
+
+    assert result["stdout"].endswith(" get pods")
+
+
+def test_process_server_timeout_excludes_the_wait_for_it(process_servers):
+    run_process_activity(make_served_activity("ping"), None, None)
+
+    busy = threading.Thread(target=run_process_activity, args=(
+        make_served_activity("sleep", "1"), None, None))
+    busy.start()
+    try:
+        time.sleep(0.2)
+        result = run_process_activity(
+            make_served_activity("ping", timeout=5), None, None)
+    finally:
+        busy.join()
+
+    assert float(result["stderr"]) < 4.5
+
+
+def test_process_server_outputs_are_limited(process_servers):
+    activity = make_served_activity("a" * 100)
+    activity["max_output_size"] = 10
+
+    result = run_process_activity(activity, None, None)
+    assert result["stdout"] == "a" * 10
+    assert result["truncated"]["stdout"] > 90
+    assert "stderr" not in result["truncated"]
+
+
+def test_process_server_lines_are_forwarded_to_the_journal(process_servers):
+    activity = make_served_activity("get", "pods")
+    activity["provider"]["stream"] = {"forward": ["journal"]}
+
+    with tempfile.TemporaryDirectory() as d:
+        writer = JournalWriter(os.path.join(d, "journal.jsonl"))
+        token = current_writer.set(writer)
+        loop = asyncio.new_event_loop()
+        try:
+            result = loop.run_until_complete(
+                run_process_activity_async(activity, None, None))
+        finally:
+            loop.close()
+            current_writer.reset(token)
+            writer.close()
+
+        with open(writer.path) as f:
+            records = [json.loads(line) for line in f]
+
+    assert "truncated" not in result
+    assert [(r["activity"], r["stream"], r["line"]) for r in records] == [
+        ("served", "stdout", result["stdout"])]
+
+
+def test_process_server_arguments_cannot_be_a_string():
+    activity = make_served_activity()
+    activity["provider"]["arguments"] = "get pods"
+
+    with pytest.raises(InvalidActivity) as x:
+        ensure_activity_is_valid(activity)
+    assert "must be a list or an object to be sent to a server" in \
+        str(x.value)
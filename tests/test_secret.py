@@ -1,15 +1,68 @@
 # -*- coding: utf-8 -*-
+import json
 import os
+import pickle
+import threading
+import time
 
 from hvac.exceptions import InvalidRequest
 import pytest
-from chaoslib.exceptions import InvalidExperiment
+from chaoslib.control.python import initialize_control
+from chaoslib.exceptions import ActivityFailed, InvalidExperiment
+from chaoslib.experiment import run_experiment
 from chaoslib.secret import load_secrets, load_secrets_from_vault, \
-    create_vault_client
+    create_vault_client, clear_vault_cache, register_secret_backend, \
+    resolve_secrets, LazySecrets, _secret_backends
+from chaoslib.settings import loaded_settings
 from fixtures import config
+from fixtures.controls import dummy_with_secrets
 from unittest.mock import ANY, MagicMock, patch, mock_open
 
 
+@pytest.fixture(autouse=True)
+def empty_vault_cache():
+    clear_vault_cache()
+    yield
+    clear_vault_cache()
+
+
+class FakeVaultKV2:
+    """
+    Stand-in for the KV version 2 secrets engine of a Vault server, it takes
+    a little while to respond and keeps track of what was read.
+    """
+    def __init__(self, store, latency=0.1):
+        self.store = store
+        self.latency = latency
+        self.reads = []
+        self.max_concurrent_reads = 0
+        self._concurrent_reads = 0
+        self._lock = threading.Lock()
+
+    def read_secret_version(self, path, mount_point="secret"):
+        with self._lock:
+            self.reads.append(path)
+            self._concurrent_reads = self._concurrent_reads + 1
+            self.max_concurrent_reads = max(
+                self.max_concurrent_reads, self._concurrent_reads)
+        try:
+            time.sleep(self.latency)
+            if path not in self.store:
+                return None
+            return {"data": {"data": self.store[path], "metadata": {}}}
+        finally:
+            with self._lock:
+                self._concurrent_reads = self._concurrent_reads - 1
+
+
+def make_fake_vault_client(hvac, store):
+    kv2 = FakeVaultKV2(store)
+    fake_client = MagicMock()
+    fake_client.secrets.kv.v2 = kv2
+    hvac.Client.return_value = fake_client
+    return kv2
+
+
 def test_should_load_environment():
     os.environ["KUBE_API_URL"] = "http://1.2.3.4"
     secrets = load_secrets({
@@ -23,6 +76,96 @@ def test_should_load_environment():
     assert secrets["kubernetes"]["api_server_url"] == "http://1.2.3.4"
 
 
+@pytest.fixture
+def counting_backend():
+    calls = []
+
+    def load(secrets_info, configuration=None):
+        calls.append(secrets_info)
+        return {
+            target: {k: v["value"] for (k, v) in keys.items()}
+            for (target, keys) in secrets_info.items()
+        }
+
+    register_secret_backend("counting", load)
+    yield calls
+    _secret_backends.pop("counting")
+
+
+def test_should_load_lazily_from_registered_backend(counting_backend):
+    secrets = load_secrets({
+        "kubernetes": {
+            "username": "jane",
+            "token": {"type": "counting", "value": "xyz"}
+        },
+        "aws": {
+            "key": {"type": "counting", "value": "abc"}
+        }
+    }, config.EmptyConfig)
+
+    assert counting_backend == []
+    assert isinstance(secrets["kubernetes"], LazySecrets)
+    assert "token" in secrets["kubernetes"]
+    assert secrets["kubernetes"]["username"] == "jane"
+    assert counting_backend == []
+
+    assert secrets["kubernetes"]["token"] == "xyz"
+    assert dict(secrets["kubernetes"]) == {"username": "jane", "token": "xyz"}
+    assert counting_backend == [
+        {"kubernetes": {"token": {"type": "counting", "value": "xyz"}}}]
+
+
+def test_lazy_secrets_behave_like_dicts(counting_backend):
+    secrets = load_secrets({
+        "kubernetes": {
+            "username": "jane",
+            "token": {"type": "counting", "value": "xyz"}
+        }
+    }, config.EmptyConfig)
+    k8s = secrets["kubernetes"]
+
+    assert isinstance(k8s, dict)
+    assert counting_backend == []
+
+    copied = k8s.copy()
+    assert copied == {"username": "jane", "token": "xyz"}
+    copied["token"] = "abc"
+    assert k8s["token"] == "xyz"
+
+    k8s["namespace"] = "default"
+    del k8s["username"]
+    assert k8s == {"token": "xyz", "namespace": "default"}
+    assert json.loads(json.dumps(secrets)) == {
+        "kubernetes": {"token": "xyz", "namespace": "default"}}
+    assert len(counting_backend) == 1
+
+
+def test_lazy_secrets_keep_keys_set_before_they_are_loaded(counting_backend):
+    secrets = load_secrets({
+        "kubernetes": {"token": {"type": "counting", "value": "xyz"}}
+    }, config.EmptyConfig)
+
+    secrets["kubernetes"]["token"] = "overridden"
+    assert secrets["kubernetes"]["token"] == "overridden"
+    assert dict(secrets["kubernetes"]) == {"token": "overridden"}
+    assert len(counting_backend) == 1
+
+
+def test_lazy_secrets_are_still_lazy_once_unpickled(counting_backend):
+    secrets = load_secrets({
+        "kubernetes": {
+            "username": "jane",
+            "token": {"type": "counting", "value": "xyz"}
+        }
+    }, config.EmptyConfig)
+
+    k8s = pickle.loads(pickle.dumps(secrets["kubernetes"]))
+    assert counting_backend == []
+    assert isinstance(k8s, LazySecrets)
+    assert k8s["token"] == "xyz"
+    assert len(counting_backend) == 1
+
+
 def test_should_load_inline():
     secrets = load_secrets({
         "kubernetes": {
@@ -49,6 +192,96 @@ def test_should_merge_properly():
     assert secrets["kubernetes"]["api_server_url"] == "http://1.2.3.4"
 
 
+@pytest.fixture
+def failing_backend():
+    def load(secrets_info, configuration=None):
+        raise ConnectionError("backend is down")
+
+    register_secret_backend("failing", load)
+    yield
+    _secret_backends.pop("failing")
+
+
+def test_lazy_secrets_failing_to_load_fail_the_activity(failing_backend):
+    secrets = load_secrets({
+        "aws": {"key": {"type": "failing"}}
+    }, config.EmptyConfig)
+
+    with pytest.raises(ActivityFailed) as x:
+        secrets["aws"]["key"]
+    assert "Failed to load 'aws' secrets of type 'failing'" in str(x.value)
+    assert "backend is down" in str(x.value)
+
+
+def test_lazy_secrets_failing_to_load_do_not_abort_the_run(failing_backend):
+    journal = run_experiment({
+        "title": "secrets cannot be loaded",
+        "description": "n/a",
+        "secrets": {"aws": {"key": {"type": "failing"}}},
+        "method": [{
+            "type": "probe",
+            "name": "crunch",
+            "provider": {
+                "type": "python",
+                "module": "fixtures.crunch",
+                "func": "count_primes",
+                "arguments": {"limit": 10},
+                "secrets": ["aws"]
+            }
+        }]
+    })
+
+    run = journal["run"][0]
+    assert run["status"] == "failed"
+    assert "backend is down" in run["exception"][-1]
+
+
+def test_lazy_secrets_can_be_resolved_into_dicts(counting_backend):
+    secrets = resolve_secrets(load_secrets({
+        "kubernetes": {
+            "username": "jane",
+            "token": {"type": "counting", "value": "xyz"}
+        }
+    }, config.EmptyConfig))
+
+    assert type(secrets["kubernetes"]) is dict
+    assert secrets == {"kubernetes": {"username": "jane", "token": "xyz"}}
+
+
+def test_controls_receive_loaded_secrets(counting_backend):
+    secrets = load_secrets({
+        "kubernetes": {"token": {"type": "counting", "value": "xyz"}}
+    }, config.EmptyConfig)
+
+    initialize_control({
+        "name": "dummy",
+        "provider": {
+            "type": "python",
+            "module": "fixtures.controls.dummy_with_secrets"
+        }
+    }, {}, config.EmptyConfig, secrets)
+
+    received = dummy_with_secrets.received_secrets
+    assert type(received["kubernetes"]) is dict
+    assert received == {"kubernetes": {"token": "xyz"}}
+
+
+@patch('chaoslib.secret.hvac')
+def test_wrong_vault_configuration_is_reported_on_load(hvac):
+    fake_client = MagicMock()
+    fake_client.auth_approle.side_effect = InvalidRequest()
+    hvac.Client.return_value = fake_client
+
+    with pytest.raises(InvalidExperiment):
+        load_secrets({
+            "k8s": {"login": {"type": "vault", "path": "foo/stuff"}}
+        }, {
+            'vault_addr': 'http://someaddr.com',
+            'vault_role_id': 'mighty_id',
+            'vault_role_secret': 'expired'
+        })
+
+
 @patch('chaoslib.secret.hvac')
 def test_should_auth_with_approle(hvac):
     config = {
@@ -251,3 +484,134 @@ def test_read_secrets_from_vault_with_kv_version_2(hvac):
 
     secrets = load_secrets_from_vault(secrets_info, config)
     assert secrets["k8s"]["a-secret"] == "bar"
+
+
+@patch('chaoslib.secret.hvac')
+def test_read_same_vault_path_only_once(hvac):
+    config = {
+        'vault_addr': 'http://someaddr.com',
+        'vault_token': 'not_awesome_token'
+    }
+    kv2 = make_fake_vault_client(hvac, {
+        "foo/stuff": {"login": "jane", "password": "shhh"}
+    })
+
+    secrets_info = {
+        "k8s": {
+            "login": {"type": "vault", "path": "foo/stuff", "key": "login"},
+            "password": {
+                "type": "vault", "path": "foo/stuff", "key": "password"}
+        },
+        "aws": {
+            "all": {"type": "vault", "path": "foo/stuff"}
+        }
+    }
+
+    secrets = load_secrets_from_vault(secrets_info, config)
+    assert secrets == {
+        "k8s": {"login": "jane", "password": "shhh"},
+        "aws": {"all": {"login": "jane", "password": "shhh"}}
+    }
+    assert kv2.reads == ["foo/stuff"]
+
+
+@patch('chaoslib.secret.hvac')
+def test_read_distinct_vault_paths_concurrently(hvac):
+    config = {
+        'vault_addr': 'http://someaddr.com',
+        'vault_token': 'not_awesome_token'
+    }
+    store = {"app/{}".format(i): {"value": i} for i in range(10)}
+    kv2 = make_fake_vault_client(hvac, store)
+
+    secrets_info = {
+        "app": {
+            "secret-{}".format(i): {
+                "type": "vault", "path": "app/{}".format(i), "key": "value"}
+            for i in range(10)
+        }
+    }
+
+    start = time.time()
+    secrets = load_secrets_from_vault(secrets_info, config)
+    assert time.time() - start < 0.1 * 10
+    assert secrets["app"] == {"secret-{}".format(i): i for i in range(10)}
+    assert sorted(kv2.reads) == sorted(store.keys())
+    assert kv2.max_concurrent_reads > 1
+
+
+@patch('chaoslib.secret.hvac')
+def test_vault_client_and_secrets_are_cached(hvac):
+    config = {
+        'vault_addr': 'http://someaddr.com',
+        'vault_role_id': 'mighty_id',
+        'vault_role_secret': 'secret_secret'
+    }
+    kv2 = make_fake_vault_client(hvac, {"foo/stuff": {"login": "jane"}})
+    hvac.Client.return_value.auth_approle.return_value = {
+        'auth': {'client_token': 'a_token'}
+    }
+    secrets_info = {
+        "k8s": {"login": {"type": "vault", "path": "foo/stuff"}}
+    }
+
+    load_secrets_from_vault(secrets_info, config)
+    secrets = load_secrets_from_vault(secrets_info, config)
+    assert secrets == {"k8s": {"login": {"login": "jane"}}}
+    assert hvac.Client.call_count == 1
+    assert hvac.Client.return_value.auth_approle.call_count == 1
+    assert kv2.reads == ["foo/stuff"]
+
+
+@patch('chaoslib.secret.hvac')
+def test_vault_cache_does_not_outlive_the_run(hvac):
+    kv2 = make_fake_vault_client(hvac, {"foo/stuff": {"login": "jane"}})
+    experiment = {
+        "title": "vault secrets are read again by the next run",
+        "description": "n/a",
+        "configuration": {
+            "vault_addr": "http://someaddr.com",
+            "vault_token": "not_awesome_token"
+        },
+        "secrets": {
+            "k8s": {"login": {"type": "vault", "path": "foo/stuff"}}
+        },
+        "method": [{
+            "type": "probe",
+            "name": "crunch",
+            "provider": {
+                "type": "python",
+                "module": "fixtures.crunch",
+                "func": "count_primes",
+                "arguments": {"limit": 10},
+                "secrets": ["k8s"]
+            }
+        }]
+    }
+
+    run_experiment(experiment)
+    run_experiment(experiment)
+    assert hvac.Client.call_count == 2
+    assert kv2.reads == ["foo/stuff", "foo/stuff"]
+
+
+@patch('chaoslib.secret.hvac')
+def test_vault_cache_can_be_disabled(hvac):
+    config = {
+        'vault_addr': 'http://someaddr.com',
+        'vault_token': 'not_awesome_token'
+    }
+    kv2 = make_fake_vault_client(hvac, {"foo/stuff": {"login": "jane"}})
+    secrets_info = {
+        "k8s": {"login": {"type": "vault", "path": "foo/stuff"}}
+    }
+
+    token = loaded_settings.set({"runtime": {"vault": {"cache_ttl": 0}}})
+    try:
+        load_secrets_from_vault(secrets_info, config)
+        load_secrets_from_vault(secrets_info, config)
+    finally:
+        loaded_settings.reset(token)
+
+    assert hvac.Client.call_count == 2
+    assert kv2.reads == ["foo/stuff", "foo/stuff"]
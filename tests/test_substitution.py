@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from chaoslib import substitute
+from chaoslib import copy_containers, get_template, substitute
 
 from fixtures import config
 
@@ -48,3 +48,41 @@ def test_do_not_fail_when_key_is_missing():
     new_args = substitute(args, config.SomeConfig, None)
     
     assert new_args["message"] == "hello ${firstname}"
+
+
+def test_strings_without_placeholder_are_left_untouched():
+    data = "hello there, nothing to see"
+    assert substitute(data, config.SomeConfig, None) is data
+    assert substitute("costs $$5", config.SomeConfig, None) == "costs $5"
+
+
+def test_templates_are_reused():
+    get_template.cache_clear()
+    for _ in range(3):
+        assert substitute(
+            {"message": "hello ${name}"}, config.SomeConfig, None) == {
+                "message": "hello Jane"}
+    info = get_template.cache_info()
+    assert info.misses == 1
+    assert info.hits == 2
+
+
+def test_empty_containers_are_copied():
+    args = {"tags": {}, "items": [], "nested": {"more": []}}
+    new_args = substitute(args, config.SomeConfig, None)
+
+    new_args["tags"]["team"] = "sre"
+    new_args["items"].append(1)
+    new_args["nested"]["more"].append(2)
+    assert args == {"tags": {}, "items": [], "nested": {"more": []}}
+
+
+def test_only_containers_are_copied():
+    token = object()
+    args = {"items": [{"name": "a"}], "token": token, "name": "b"}
+    new_args = copy_containers(args)
+
+    assert new_args == args
+    assert new_args["items"] is not args["items"]
+    assert new_args["items"][0] is not args["items"][0]
+    assert new_args["token"] is token
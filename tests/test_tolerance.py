@@ -2,8 +2,10 @@
 import pytest
 import sys
 
+from chaoslib.caching import activity_index
 from chaoslib.exceptions import InvalidActivity
-from chaoslib.hypothesis import ensure_hypothesis_tolerance_is_valid, \
+from chaoslib.hypothesis import CompiledTolerance, \
+    ensure_hypothesis_tolerance_is_valid, get_compiled_tolerance, \
     within_tolerance
 
 
@@ -577,3 +579,50 @@ def test_tolerance_with_a_probe():
         },
         "body": "7"
     }) is True
+
+
+def test_tolerance_regex_is_compiled_once():
+    t = {
+        "type": "regex",
+        "pattern": "[0-9]{2}"
+    }
+    with activity_index({}):
+        ensure_hypothesis_tolerance_is_valid(t)
+        compiled = get_compiled_tolerance(t)
+        assert within_tolerance(t, value="you are number 87") is True
+        assert within_tolerance(t, value="you are number 8") is False
+        assert get_compiled_tolerance(t) is compiled
+
+
+def test_tolerance_is_recompiled_when_changed():
+    t = {
+        "type": "range",
+        "range": [6, 8]
+    }
+    with activity_index({}):
+        ensure_hypothesis_tolerance_is_valid(t)
+        compiled = get_compiled_tolerance(t)
+        assert within_tolerance(t, value=9) is False
+
+        t["range"][1] = 10
+        assert get_compiled_tolerance(t) is not compiled
+        assert within_tolerance(t, value=9) is True
+
+
+def test_compiled_tolerances_do_not_outlive_their_run():
+    t = {
+        "type": "range",
+        "range": [6, 8]
+    }
+    with activity_index({}) as index:
+        compiled = get_compiled_tolerance(t)
+        assert index.tolerances == {id(t): compiled}
+
+    assert get_compiled_tolerance(t) is not compiled
+    with activity_index({}):
+        assert get_compiled_tolerance(t) is not compiled
+
+
+def test_compiled_tolerances_must_implement_their_check():
+    with pytest.raises(TypeError):
+        CompiledTolerance({"type": "range", "range": [0, 1]})